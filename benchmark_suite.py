@@ -0,0 +1,335 @@
+"""
+风险场模型性能基准测试套件
+Benchmark Suite for Risk Field Model
+
+真实调用模型测量：
+- 场景：各性能模式（fast/balanced/accurate）× 车辆数 × 道路长度 × 计算引擎
+- 单个核：gaussian_3d_torus_functions 中的 arclen_calc、a_calc、sigma_calc、z_calc，
+  以及 field_straight、field_turn、torus_field_batch
+每项报告墙钟时间、每秒网格点数和峰值内存，结果可保存为JSON基线，与之后的运行比较回归。
+
+用法：
+    python benchmark_suite.py --quick --output baseline.json
+    python benchmark_suite.py --baseline baseline.json --output current.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from risk_field_model import RiskFieldModel
+
+
+class BenchmarkSuite:
+    """
+    性能基准测试
+
+    计时运行不开启tracemalloc；峰值内存在额外的一次运行中用tracemalloc测量
+    （numpy数组分配会计入tracemalloc）。场景时间为静态背景层缓存后的稳态单帧时间，
+    cold_time 为新建模型后第一帧（含背景层计算）的时间。
+    """
+
+    MODES = ('fast', 'balanced', 'accurate')
+    KERNELS = ('arclen_calc', 'a_calc', 'sigma_calc', 'z_calc',
+               'field_straight', 'field_turn', 'torus_field_batch')
+
+    def __init__(self, modes=MODES, vehicle_counts=(1, 10, 50, 100, 200),
+                 road_lengths=(100.0, 420.0), engines=('batched',), kernels=KERNELS,
+                 repeats=3, seed=0, model_options=None, profile=False):
+        """
+        Parameters:
+        modes: 性能模式列表
+        vehicle_counts: 动态车辆数列表
+        road_lengths: 道路长度列表 [m]（对应X_length）
+        engines: 计算引擎列表
+        kernels: 单核测试列表（KERNELS的子集）
+        repeats: 每项计时重复次数（报告中位数和最小值）
+        seed: 随机车辆的种子
+        model_options: 传给RiskFieldModel的其他参数（如 {"dtype": "float32"}）
+        profile: 是否在计时之外额外运行一次分阶段计时（结果中的stages：各阶段秒数）
+        """
+        unknown = set(kernels) - set(self.KERNELS)
+        if unknown:
+            raise ValueError(f"未知的核: {sorted(unknown)}")
+        self.modes = tuple(modes)
+        self.vehicle_counts = tuple(vehicle_counts)
+        self.road_lengths = tuple(road_lengths)
+        self.engines = tuple(engines)
+        self.kernels = tuple(kernels)
+        self.repeats = max(1, int(repeats))
+        self.seed = seed
+        self.model_options = dict(model_options or {})
+        self.profile = profile
+
+    def make_model(self, mode, road_length=100.0, engine=None):
+        """创建指定模式和道路长度的模型"""
+        options = dict(self.model_options)
+        if engine is not None:
+            options['engine'] = engine
+        model = RiskFieldModel(mode, **options)
+        model.X_length = float(road_length)
+        model.create_spatial_grid()
+        return model
+
+    def make_vehicles(self, n, road_length):
+        """n辆随机车辆 [id, x, y, speed]，位于两条车道中心，速度15~30 m/s（同一参数下结果可复现）"""
+        rng = np.random.RandomState(self.seed + n)
+        vehicles = np.empty((n, 4))
+        vehicles[:, 0] = np.arange(n)
+        vehicles[:, 1] = rng.uniform(0, road_length, n)
+        vehicles[:, 2] = rng.choice([2.0, 5.5], n)
+        vehicles[:, 3] = rng.uniform(15, 30, n)
+        return vehicles
+
+    def _measure(self, fn):
+        """返回 (时间中位数, 最小时间, 峰值内存字节数)"""
+        times = []
+        for _ in range(self.repeats):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return float(np.median(times)), float(min(times)), int(peak)
+
+    def run_scenes(self, verbose=False):
+        """场景基准，返回结果字典列表"""
+        results = []
+        for mode in self.modes:
+            for road_length in self.road_lengths:
+                for engine in self.engines:
+                    model = self.make_model(mode, road_length, engine)
+                    cells = int(model.X_en.size)
+                    for n in self.vehicle_counts:
+                        vehicles = self.make_vehicles(n, road_length)
+
+                        model.clear_static_cache()
+                        start = time.perf_counter()
+                        model.calculate_scene_risk_field(vehicles)
+                        cold_time = time.perf_counter() - start
+
+                        wall_time, min_time, peak = self._measure(
+                            lambda: model.calculate_scene_risk_field(vehicles))
+                        result = {
+                            'kind': 'scene',
+                            'mode': mode,
+                            'engine': engine,
+                            'road_length': float(road_length),
+                            'vehicles': int(n),
+                            'grid_shape': list(model.X_en.shape),
+                            'cells': cells,
+                            'wall_time': wall_time,
+                            'min_time': min_time,
+                            'cold_time': cold_time,
+                            'cells_per_s': cells / wall_time if wall_time > 0 else 0.0,
+                            'vehicle_cells_per_s': cells * n / wall_time if wall_time > 0 else 0.0,
+                            'peak_bytes': peak
+                        }
+                        if self.profile:
+                            profiler = model.enable_profiling()
+                            model.calculate_scene_risk_field(vehicles)
+                            model.disable_profiling()
+                            result['stages'] = {name: entry['time']
+                                                for name, entry in profiler.last_scene.items()}
+                        results.append(result)
+                        if verbose:
+                            self._print_result(result)
+        return results
+
+    def _kernel_calls(self, model):
+        """单核测试的可调用对象（输入按field_straight的直行车辆预先计算）"""
+        funcs = model.gaussian_3d_torus_functions()
+        vehicle = [1, model.X_length / 2, 4.0, 20.0, model.m_obj, model.beta_obj,
+                   model.L_obj, model.K_obj, model.delta_max]
+        terms = model._vehicle_terms(model.vehicle_param_array([vehicle]), 0.001)
+        x, y = terms['x'][0], terms['y'][0]
+        delta, R, xc, yc = terms['delta'][0], terms['R'][0], terms['xc'][0], terms['yc'][0]
+        dla, mexp1, mexp2 = terms['dla'][0], terms['mexp1'][0], terms['mexp2'][0]
+        X, Y = model.X_en, model.Y_en
+
+        arc_len = funcs['arclen_calc'](X, Y, x, y, delta, xc, yc, R)
+        a = funcs['a_calc'](arc_len, model.par1, dla)
+        sigma1 = funcs['sigma_calc'](arc_len, mexp1, model.cexp)
+        sigma2 = funcs['sigma_calc'](arc_len, mexp2, model.cexp)
+        params = model.vehicle_param_array([vehicle])
+
+        return {
+            'arclen_calc': lambda: funcs['arclen_calc'](X, Y, x, y, delta, xc, yc, R),
+            'a_calc': lambda: funcs['a_calc'](arc_len, model.par1, dla),
+            'sigma_calc': lambda: funcs['sigma_calc'](arc_len, mexp1, model.cexp),
+            'z_calc': lambda: funcs['z_calc'](X, Y, xc, yc, R, a, sigma1, sigma2),
+            'field_straight': lambda: model.field_straight(vehicle),
+            'field_turn': lambda: model.field_turn(vehicle),
+            'torus_field_batch': lambda: model.torus_field_batch(params, model.x_en[None, :],
+                                                                 model.y_en[:, None])
+        }
+
+    def run_kernels(self, verbose=False):
+        """单核基准（每个性能模式、第一个道路长度），返回结果字典列表"""
+        results = []
+        road_length = self.road_lengths[0] if self.road_lengths else 100.0
+        for mode in self.modes:
+            model = self.make_model(mode, road_length)
+            cells = int(model.X_en.size)
+            calls = self._kernel_calls(model)
+            for name in self.kernels:
+                wall_time, min_time, peak = self._measure(calls[name])
+                result = {
+                    'kind': 'kernel',
+                    'kernel': name,
+                    'mode': mode,
+                    'road_length': float(road_length),
+                    'grid_shape': list(model.X_en.shape),
+                    'cells': cells,
+                    'wall_time': wall_time,
+                    'min_time': min_time,
+                    'cells_per_s': cells / wall_time if wall_time > 0 else 0.0,
+                    'peak_bytes': peak
+                }
+                results.append(result)
+                if verbose:
+                    self._print_result(result)
+        return results
+
+    @staticmethod
+    def environment():
+        """运行环境信息（写入基线，便于判断结果是否可比）"""
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'cpu_count': os.cpu_count()
+        }
+
+    def run(self, verbose=False):
+        """运行全部基准，返回 {'meta', 'scenes', 'kernels'}"""
+        return {
+            'meta': {
+                'environment': self.environment(),
+                'repeats': self.repeats,
+                'seed': self.seed,
+                'model_options': self.model_options
+            },
+            'scenes': self.run_scenes(verbose),
+            'kernels': self.run_kernels(verbose) if self.kernels else []
+        }
+
+    @staticmethod
+    def _print_result(result):
+        if result['kind'] == 'scene':
+            label = (f"{result['mode']:<9}{result['engine']:<9}L={result['road_length']:<6g}"
+                     f"N={result['vehicles']:<4}")
+        else:
+            label = f"{result['mode']:<9}{result['kernel']:<22}"
+        print(f"   {label} {result['wall_time'] * 1e3:9.2f} ms  "
+              f"{result['cells_per_s'] / 1e6:8.2f} M点/秒  峰值内存 {result['peak_bytes'] / 2 ** 20:7.1f} MB")
+        if 'stages' in result:
+            stages = sorted(result['stages'].items(), key=lambda item: item[1], reverse=True)
+            print("      " + "  ".join(f"{name} {seconds * 1e3:.2f}" for name, seconds in stages
+                                        if not name.startswith('scene')) + " [ms]")
+
+    @staticmethod
+    def save(results, path):
+        """保存为JSON基线"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _result_key(result):
+        if result['kind'] == 'scene':
+            return ('scene', result['mode'], result['engine'], result['road_length'], result['vehicles'])
+        return ('kernel', result['mode'], result['kernel'], result['road_length'])
+
+    @classmethod
+    def compare(cls, baseline, current, tolerance=0.10):
+        """
+        比较两次运行结果，返回每个共有测试项的变化列表（按耗时比例从大到小）
+
+        Parameters:
+        baseline, current: run() 的结果（或load读取的基线）
+        tolerance: 时间比例超过 1 + tolerance 视为回归
+
+        Returns:
+        [{'key', 'baseline_time', 'current_time', 'ratio', 'regression'}, ...]
+        """
+        base = {cls._result_key(r): r for r in baseline['scenes'] + baseline['kernels']}
+        changes = []
+        for result in current['scenes'] + current['kernels']:
+            key = cls._result_key(result)
+            if key not in base:
+                continue
+            # 用最小时间比较，受系统调度等噪声的影响小于中位数
+            ratio = result['min_time'] / max(base[key]['min_time'], 1e-12)
+            changes.append({
+                'key': list(key),
+                'baseline_time': base[key]['min_time'],
+                'current_time': result['min_time'],
+                'ratio': ratio,
+                'regression': ratio > 1 + tolerance
+            })
+        changes.sort(key=lambda change: change['ratio'], reverse=True)
+        return changes
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="风险场模型性能基准测试")
+    parser.add_argument('--modes', nargs='+', default=list(BenchmarkSuite.MODES))
+    parser.add_argument('--vehicles', nargs='+', type=int, default=[1, 10, 50, 100, 200])
+    parser.add_argument('--road-lengths', nargs='+', type=float, default=[100.0, 420.0])
+    parser.add_argument('--engines', nargs='+', default=['batched'])
+    parser.add_argument('--kernels', nargs='*', default=list(BenchmarkSuite.KERNELS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--quick', action='store_true',
+                        help="快速检查：fast/balanced模式、1和10辆车、100 m道路、重复1次")
+    parser.add_argument('--output', help="保存结果的JSON路径")
+    parser.add_argument('--baseline', help="与之比较的JSON基线")
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    parser.add_argument('--profile', action='store_true', help="场景测试附带分阶段计时")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.modes, args.vehicles, args.road_lengths, args.repeats = ['fast', 'balanced'], [1, 10], [100.0], 1
+
+    suite = BenchmarkSuite(args.modes, args.vehicles, args.road_lengths, args.engines,
+                           args.kernels, args.repeats, profile=args.profile)
+    print("🔧 风险场模型性能基准测试")
+    print("-" * 60)
+    results = suite.run(verbose=True)
+
+    if args.output:
+        suite.save(results, args.output)
+        print(f"💾 结果已保存: {args.output}")
+
+    if args.baseline:
+        changes = suite.compare(suite.load(args.baseline), results, args.tolerance)
+        regressions = [change for change in changes if change['regression']]
+        print(f"\n📊 与基线比较: {len(changes)} 项，{len(regressions)} 项回归（阈值 +{args.tolerance:.0%}）")
+        for change in regressions:
+            print(f"   🔴 {change['key']}: {change['baseline_time'] * 1e3:.2f} ms -> "
+                  f"{change['current_time'] * 1e3:.2f} ms ({change['ratio']:.2f}×)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,7 @@ Data Processing Module for Risk Field Model
 import numpy as np
 import os
 import json
+import hashlib
 
 class DataProcessor:
     """数据处理类，用于加载和预处理车辆数据"""
@@ -14,21 +15,34 @@ class DataProcessor:
         self.vehicle_data = None
         self.scenario_data = None
         
-    def load_matlab_input_data(self, file_path):
+        # 帧索引（build_frame_index构建）
+        self._frame_index_data = None
+        self._frame_ids = None
+        self._frame_offsets = None
+        self._frame_layout = None
+        
+    def load_matlab_input_data(self, file_path, use_cache=True, mmap=True):
         """
         加载MATLAB格式的输入数据（对应input_data.txt）
+        
+        整个文件一次性向量化解析（跳过以%开头的注释行），并在旁边写入二进制缓存
+        <file>.npy 与 <file>.cache.json；之后源文件修改时间和大小不变时直接映射缓存，
+        修改时间变化但内容哈希相同时同样复用缓存。
+        
+        Parameters:
+        file_path: 数据文件路径
+        use_cache: 是否读写二进制缓存
+        mmap: 读取缓存时是否使用内存映射（写时复制，修改不会写回缓存）
         """
         try:
             if os.path.exists(file_path):
-                data = []
-                with open(file_path, 'r') as f:
-                    for line in f:
-                        if line.strip() and not line.strip().startswith('%'):
-                            # 解析每行数据
-                            values = [float(x) for x in line.strip().split()]
-                            data.append(values)
+                data = self._load_input_cache(file_path, mmap) if use_cache else None
+                if data is None:
+                    data = np.loadtxt(file_path, comments='%', ndmin=2)
+                    if use_cache:
+                        self._write_input_cache(file_path, data)
                 
-                self.vehicle_data = np.array(data)
+                self.vehicle_data = data
                 print(f"✅ 成功加载数据文件: {file_path}")
                 print(f"   数据形状: {self.vehicle_data.shape}")
                 return self.vehicle_data
@@ -40,6 +54,67 @@ class DataProcessor:
             print(f"❌ 加载数据文件失败: {e}")
             return self.create_default_scenario()
     
+    @staticmethod
+    def _input_cache_paths(file_path):
+        """二进制缓存文件与元数据文件路径"""
+        return file_path + '.npy', file_path + '.cache.json'
+    
+    @staticmethod
+    def _file_digest(file_path):
+        """计算文件内容的sha256"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def _load_input_cache(self, file_path, mmap=True):
+        """源文件未变化时返回缓存数据，否则返回None"""
+        cache_path, meta_path = self._input_cache_paths(file_path)
+        if not (os.path.exists(cache_path) and os.path.exists(meta_path)):
+            return None
+        
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            stat = os.stat(file_path)
+            if meta.get('size') != stat.st_size:
+                return None
+            if meta.get('mtime_ns') != stat.st_mtime_ns:
+                # 修改时间变化：内容哈希相同则刷新元数据并复用缓存
+                if meta.get('sha256') != self._file_digest(file_path):
+                    return None
+                meta['mtime_ns'] = stat.st_mtime_ns
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+            
+            data = np.load(cache_path, mmap_mode='c' if mmap else None)
+            print(f"⚡ 使用二进制缓存: {cache_path}")
+            return data
+        except Exception as e:
+            print(f"⚠️  读取缓存失败，重新解析: {e}")
+            return None
+    
+    def _write_input_cache(self, file_path, data):
+        """写入二进制缓存（先写临时文件再替换，避免留下不完整的缓存）"""
+        cache_path, meta_path = self._input_cache_paths(file_path)
+        try:
+            stat = os.stat(file_path)
+            meta = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': self._file_digest(file_path),
+                'shape': list(data.shape)
+            }
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, data)
+            os.replace(tmp_path, cache_path)
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        except Exception as e:
+            print(f"⚠️  写入缓存失败: {e}")
+    
     def create_default_scenario(self):
         """
         创建默认测试场景
@@ -60,33 +135,79 @@ class DataProcessor:
         print(f"   创建了 {len(default_vehicles)} 辆车的场景")
         return self.vehicle_data
     
+    def build_frame_index(self):
+        """
+        按帧号对vehicle_data排序并记录每帧的起止偏移，之后每帧的车辆都是零拷贝切片
+        
+        排序后的数据按 [id, x, y, speed] 排列（即calculate_scene_risk_field所需格式），
+        vehicle_data被替换后会在下次取帧时自动重建。
+        """
+        data = self.vehicle_data
+        self._frame_index_data = data
+        if data is None or data.ndim != 2 or data.shape[1] < 4 or len(data) == 0:
+            self._frame_ids = np.empty(0)
+            self._frame_offsets = np.zeros(1, dtype=np.int64)
+            self._frame_layout = np.empty((0, 4))
+            return
+        
+        # 速度列：有第5列时取第5列（km/h），否则取第4列
+        speed_col = 4 if data.shape[1] > 4 else 3
+        layout_cols = [0, 1, 2, speed_col]
+        
+        if data.shape[1] > 10:
+            # 假设最后一列是frame_id，稳定排序保持同帧内原有顺序
+            frames = data[:, -1]
+            order = np.argsort(frames, kind='stable')
+            sorted_frames = frames[order]
+            self._frame_ids, starts = np.unique(sorted_frames, return_index=True)
+            self._frame_offsets = np.append(starts, len(data)).astype(np.int64)
+            self._frame_layout = np.ascontiguousarray(data[order][:, layout_cols])
+        else:
+            # 没有frame信息时所有车辆视为同一帧
+            self._frame_ids = None
+            self._frame_offsets = np.array([0, len(data)], dtype=np.int64)
+            self._frame_layout = np.ascontiguousarray(data[:, layout_cols])
+    
+    def _ensure_frame_index(self):
+        """vehicle_data变化后重建帧索引"""
+        if self._frame_layout is None or self._frame_index_data is not self.vehicle_data:
+            self.build_frame_index()
+    
+    def frames(self):
+        """返回数据中出现的所有帧号（已排序）"""
+        self._ensure_frame_index()
+        if self._frame_ids is None:
+            return np.array([])
+        return self._frame_ids
+    
+    def frame_vehicles(self, frame_id):
+        """
+        返回指定帧车辆的 (n, 4) 数组视图 [id, x, y, speed]，可直接传给calculate_scene_risk_field
+        
+        通过帧索引二分查找，不扫描整个vehicle_data；帧不存在时返回空数组
+        """
+        self._ensure_frame_index()
+        if self._frame_ids is None:
+            return self._frame_layout
+        
+        pos = np.searchsorted(self._frame_ids, frame_id)
+        if pos >= len(self._frame_ids) or self._frame_ids[pos] != frame_id:
+            return self._frame_layout[:0]
+        return self._frame_layout[self._frame_offsets[pos]:self._frame_offsets[pos + 1]]
+    
     def extract_vehicles_by_frame(self, frame_id):
         """
         提取指定帧的车辆数据（对应MATLAB中的帧提取逻辑）
+        
+        返回 [[id, x, y, speed], ...] 列表；需要数组格式时使用frame_vehicles
         """
         if self.vehicle_data is None:
             return []
         
-        # 查找指定帧的车辆（假设最后一列是frame_id）
-        if self.vehicle_data.shape[1] > 10:
-            frame_vehicles = self.vehicle_data[self.vehicle_data[:, -1] == frame_id]
-        else:
-            # 如果没有frame信息，返回所有车辆
-            frame_vehicles = self.vehicle_data
-        
-        # 转换为所需格式 [id, x, y, speed]
-        vehicles_for_risk_calc = []
-        for vehicle in frame_vehicles:
-            if len(vehicle) >= 4:
-                vehicle_info = [
-                    int(vehicle[0]),  # vehicle_id
-                    float(vehicle[1]),  # x position
-                    float(vehicle[2]),  # y position
-                    float(vehicle[4]) if len(vehicle) > 4 else float(vehicle[3])  # speed
-                ]
-                vehicles_for_risk_calc.append(vehicle_info)
-        
-        return vehicles_for_risk_calc
+        return [
+            [int(vehicle[0]), vehicle[1], vehicle[2], vehicle[3]]
+            for vehicle in self.frame_vehicles(frame_id).tolist()
+        ]
     
     def create_highway_scenario(self, num_vehicles=10, road_length=100):
         """
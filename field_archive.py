@@ -0,0 +1,324 @@
+"""
+压缩的量化风险场归档 - 16位量化 + 帧间差分 + 分块压缩
+Quantized Field Archive for Risk Field Model
+
+每帧风险场按该帧最大值量化为16位整数：q = round(F / scale)，scale = max(F) / 65535，
+重建误差不超过 scale / 2（相对该帧峰值约 7.6e-6），低于阈值的0仍为0。
+连续 block_frames 帧组成一个块：块内第一帧为关键帧，其余帧保存与前一帧量化值的差（按2^16取模，
+可逆），再沿x方向差分；差分结果按高低字节分开后用标准压缩算法（zlib或lzma）压缩。
+随机读取只需解压一个块。
+
+文件结构：
+    "RFQA" + 版本号 | 各块压缩数据 | JSON索引（网格、模型参数、各块位置、各帧帧号/scale/误差） | 索引位置(uint64)
+"""
+
+import json
+import lzma
+import os
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b"RFQA0001"
+QMAX = 65535
+DELTAS = ("none", "time", "x", "time+x")
+CODECS = ("zlib", "lzma")
+
+
+def _compress(data, codec, level):
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    return lzma.compress(data, preset=level)
+
+
+def _decompress(data, codec):
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return lzma.decompress(data)
+
+
+def quantize(F_total):
+    """按帧最大值量化为uint16，返回 (q, scale, 最大绝对误差)"""
+    F_total = np.asarray(F_total, dtype=np.float64)
+    peak = float(F_total.max()) if F_total.size else 0.0
+    scale = peak / QMAX if peak > 0 else 1.0
+    q = np.rint(F_total / scale).astype(np.uint16)
+    error = float(np.abs(q * scale - F_total).max()) if F_total.size else 0.0
+    return q, scale, error
+
+
+def encode_block(Q, delta="time+x"):
+    """
+    (n, ny, nx) 的uint16量化帧差分后按字节分离，返回字节串（未压缩）
+
+    差分都按uint16取模计算，decode_block用累加还原
+    """
+    D = np.array(Q, dtype=np.uint16)
+    if delta in ("time", "time+x"):
+        D[1:] = Q[1:] - Q[:-1]
+    if delta in ("x", "time+x"):
+        D[:, :, 1:] -= D[:, :, :-1].copy()
+    # 高低字节分开存放，差分后高字节大多为0或0xFF，压缩率更高
+    return D.view(np.uint8).reshape(-1, 2).T.tobytes()
+
+
+def decode_block(data, shape, delta="time+x"):
+    """encode_block的逆过程，返回 (n, ny, nx) 的uint16量化帧"""
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(2, -1)
+    D = np.empty(planes.shape[1] * 2, dtype=np.uint8)
+    D[0::2] = planes[0]
+    D[1::2] = planes[1]
+    Q = D.view(np.uint16).reshape(shape)
+    if delta in ("x", "time+x"):
+        Q = np.cumsum(Q, axis=2, dtype=np.uint16)
+    if delta in ("time", "time+x"):
+        Q = np.cumsum(Q, axis=0, dtype=np.uint16)
+    return Q
+
+
+class FieldArchiveWriter:
+    """
+    逐帧追加写入量化归档（每个录制缓存一个块的量化帧，写满后压缩写入文件）
+
+    写完后调用close()（或使用with语句）写入索引；report() 给出压缩率和最大重建误差。
+    """
+
+    def __init__(self, path, model, block_frames=16, delta="time+x", codec="zlib", level=6):
+        """
+        Parameters:
+        path: 归档文件路径（已存在时覆盖）
+        model: RiskFieldModel实例（记录其网格和get_config参数）
+        block_frames: 每块帧数（随机读取一帧最多解压一个块）
+        delta: 差分方式，"none"、"time"、"x" 或 "time+x"（默认）
+        codec: 压缩算法，"zlib"（默认）或 "lzma"
+        level: 压缩级别（zlib 1~9，lzma 0~9）
+        """
+        if delta not in DELTAS:
+            raise ValueError(f"未知的差分方式: {delta}")
+        if codec not in CODECS:
+            raise ValueError(f"未知的压缩算法: {codec}")
+        self.path = path
+        self.shape = (len(model.y_en), len(model.x_en))
+        self.block_frames = int(block_frames)
+        self.delta = delta
+        self.codec = codec
+        self.level = level
+        self.metadata = {
+            'shape': list(self.shape),
+            'delta_en': float(model.delta_en),
+            'x0': float(model.x_en[0]),
+            'y0': float(model.y_en[0]),
+            'dtype': np.dtype(model.dtype).name,
+            'block_frames': self.block_frames,
+            'delta': delta,
+            'codec': codec,
+            'model': model.get_config()
+        }
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._blocks = []
+        self._recordings = {}
+        self._pending = {}
+        self.raw_bytes = 0
+
+    def append(self, recording_id, frame_id, F_total):
+        """
+        追加一帧（帧号在同一录制内必须严格递增）
+
+        Parameters:
+        recording_id: 录制编号（int或str）
+        frame_id: 帧号
+        F_total: (ny, nx) 风险场
+        """
+        F_total = np.asarray(F_total)
+        if F_total.shape != self.shape:
+            raise ValueError(f"风险场形状 {F_total.shape} 与归档网格 {self.shape} 不一致")
+        key = str(recording_id)
+        recording = self._recordings.setdefault(key, {'frames': [], 'scales': [], 'errors': [], 'peaks': []})
+        if recording['frames'] and int(frame_id) <= recording['frames'][-1]:
+            raise ValueError(f"录制 {key} 的帧号必须递增: {frame_id} <= {recording['frames'][-1]}")
+
+        q, scale, error = quantize(F_total)
+        recording['frames'].append(int(frame_id))
+        recording['scales'].append(scale)
+        recording['errors'].append(error)
+        recording['peaks'].append(float(F_total.max(initial=0)))
+        self.raw_bytes += F_total.nbytes
+
+        pending = self._pending.setdefault(key, [])
+        pending.append(q)
+        if len(pending) == self.block_frames:
+            self._write_block(key)
+
+    def append_results(self, recording_id, results):
+        """追加流式管线的结果（outputs包含 field 或 sparse），返回写入的帧数"""
+        count = 0
+        for result in results:
+            if 'field' in result:
+                F_total = result['field']
+            elif 'sparse' in result:
+                F_total = result['sparse'].to_dense()
+            else:
+                raise ValueError("结果中没有field或sparse输出")
+            self.append(recording_id, result['frame'], F_total)
+            count += 1
+        return count
+
+    def _write_block(self, key):
+        """压缩并写入录制key缓存的帧"""
+        pending = self._pending.pop(key, [])
+        if not pending:
+            return
+        data = _compress(encode_block(np.stack(pending), self.delta), self.codec, self.level)
+        start = len(self._recordings[key]['frames']) - len(pending)
+        self._blocks.append({
+            'recording': key,
+            'start': start,
+            'frames': len(pending),
+            'offset': self._file.tell(),
+            'length': len(data)
+        })
+        self._file.write(data)
+
+    def report(self):
+        """压缩统计：帧数、原始字节数、压缩后字节数、压缩率、最大绝对/相对重建误差"""
+        errors = [e for r in self._recordings.values() for e in r['errors']]
+        relative = [e / p for r in self._recordings.values()
+                    for e, p in zip(r['errors'], r['peaks']) if p > 0]
+        compressed = sum(block['length'] for block in self._blocks)
+        return {
+            'frames': len(errors),
+            'raw_bytes': int(self.raw_bytes),
+            'compressed_bytes': int(compressed),
+            'ratio': self.raw_bytes / compressed if compressed else 0.0,
+            'max_abs_error': max(errors, default=0.0),
+            'max_rel_error': max(relative, default=0.0)
+        }
+
+    def close(self):
+        """写入未满的块和索引，返回report()"""
+        if self._file.closed:
+            return self.report()
+        for key in list(self._pending):
+            self._write_block(key)
+        index = dict(self.metadata, recordings=self._recordings, blocks=self._blocks)
+        index_offset = self._file.tell()
+        self._file.write(json.dumps(index, ensure_ascii=False).encode('utf-8'))
+        self._file.write(struct.pack('<Q', index_offset))
+        self._file.close()
+        return self.report()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class FieldArchive:
+    """
+    读取量化归档
+
+    read_frame() 只读取并解压帧所在的块；最近解压的块会被缓存，顺序读取同一块内的帧不再解压。
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+        path: FieldArchiveWriter写入的归档文件
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是风险场归档: {path}")
+            f.seek(-8, os.SEEK_END)
+            index_offset = struct.unpack('<Q', f.read(8))[0]
+            f.seek(index_offset)
+            index = json.loads(f.read(os.path.getsize(path) - 8 - index_offset).decode('utf-8'))
+        self.metadata = index
+        self.shape = tuple(index['shape'])
+        self.dtype = np.dtype(index['dtype'])
+        self.block_frames = index['block_frames']
+        d = index['delta_en']
+        self.x_en = (index['x0'] + d * np.arange(self.shape[1])).astype(self.dtype)
+        self.y_en = (index['y0'] + d * np.arange(self.shape[0])).astype(self.dtype)
+        self._recordings = {
+            key: {name: np.asarray(values) for name, values in recording.items()}
+            for key, recording in index['recordings'].items()
+        }
+        self._blocks = {}
+        for block in index['blocks']:
+            self._blocks.setdefault(block['recording'], []).append(block)
+        self._cache = None
+
+    @property
+    def model_config(self):
+        """写入时模型的get_config参数"""
+        return self.metadata['model']
+
+    def recordings(self):
+        return list(self._recordings)
+
+    def frames(self, recording_id):
+        """录制中保存的帧号（递增）"""
+        key = str(recording_id)
+        if key not in self._recordings:
+            raise KeyError(f"归档中没有录制: {recording_id}")
+        return self._recordings[key]['frames']
+
+    def max_error(self, recording_id=None):
+        """最大绝对重建误差（recording_id为None时为全部录制）"""
+        keys = self._recordings if recording_id is None else [str(recording_id)]
+        return max((float(self._recordings[key]['errors'].max(initial=0)) for key in keys), default=0.0)
+
+    def _block_frames(self, key, block):
+        """解压一个块，返回量化帧 (n, ny, nx)"""
+        cache_key = (key, block['offset'])
+        if self._cache is not None and self._cache[0] == cache_key:
+            return self._cache[1]
+        with open(self.path, 'rb') as f:
+            f.seek(block['offset'])
+            data = _decompress(f.read(block['length']), self.metadata['codec'])
+        Q = decode_block(data, (block['frames'],) + self.shape, self.metadata['delta'])
+        self._cache = (cache_key, Q)
+        return Q
+
+    def _dequantize(self, q, scale, rows, cols):
+        return (q[rows, cols] * scale).astype(self.dtype)
+
+    def read_frame(self, recording_id, frame_id, rows=slice(None), cols=slice(None)):
+        """解压单帧（帧不存在时抛出KeyError）"""
+        key = str(recording_id)
+        frames = self.frames(key)
+        position = int(np.searchsorted(frames, frame_id))
+        if position >= len(frames) or frames[position] != frame_id:
+            raise KeyError(f"录制 {recording_id} 中没有帧 {frame_id}")
+        block = self._blocks[key][position // self.block_frames]
+        q = self._block_frames(key, block)[position - block['start']]
+        return self._dequantize(q, self._recordings[key]['scales'][position], rows, cols)
+
+    def iter_frames(self, recording_id, start=None, stop=None, rows=slice(None), cols=slice(None)):
+        """按块顺序解压帧号在 [start, stop) 内的帧，逐帧生成 (帧号, 风险场)"""
+        key = str(recording_id)
+        frames = self.frames(key)
+        scales = self._recordings[key]['scales']
+        p0 = 0 if start is None else int(np.searchsorted(frames, start, side='left'))
+        p1 = len(frames) if stop is None else int(np.searchsorted(frames, stop, side='left'))
+        for block in self._blocks[key]:
+            b0, b1 = block['start'], block['start'] + block['frames']
+            if b1 <= p0 or b0 >= p1:
+                continue
+            Q = self._block_frames(key, block)
+            for position in range(max(p0, b0), min(p1, b1)):
+                yield frames[position], self._dequantize(Q[position - b0], scales[position], rows, cols)
+
+    def read(self, recording_id, start=None, stop=None, rows=slice(None), cols=slice(None)):
+        """解压帧号在 [start, stop) 内的帧，返回 (帧号数组, (n, 行数, 列数) 数组)"""
+        items = list(self.iter_frames(recording_id, start, stop, rows, cols))
+        frames = np.array([frame for frame, _ in items], dtype=np.int64)
+        if not items:
+            r0, r1, _ = rows.indices(self.shape[0])
+            c0, c1, _ = cols.indices(self.shape[1])
+            return frames, np.empty((0, max(r1 - r0, 0), max(c1 - c0, 0)), dtype=self.dtype)
+        return frames, np.stack([field for _, field in items])
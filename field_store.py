@@ -0,0 +1,327 @@
+"""
+分块、内存映射的风险场存储 - 按 (录制, 帧) 保存逐帧风险场
+Field Store for Risk Field Model
+
+目录结构：
+    store/
+        store.json                  # 元数据：网格形状与坐标、间距、数据类型、分块大小、模型参数、各录制帧数
+        rec_<id>/frames.npy         # 该录制已写入的帧号（严格递增）
+        rec_<id>/f<块号>_c<列块号>.npy  # (chunk_frames, ny, 列块宽度) 的 .npy 分块
+
+每个分块是标准的 .npy 文件，读取时用 np.load(mmap_mode='r') 内存映射，
+只有帧范围和列范围相交的分块、且只有实际切片到的页会被读入；
+写入端逐帧追加到当前分块的内存映射中，内存占用与录制长度无关。
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+FORMAT = "risk-field-store"
+VERSION = 1
+METADATA_FILE = "store.json"
+
+
+def _recording_dir(path, recording_id):
+    return os.path.join(path, f"rec_{recording_id}")
+
+
+def _chunk_path(path, recording_id, chunk, tile):
+    return os.path.join(_recording_dir(path, recording_id), f"f{chunk:06d}_c{tile:04d}.npy")
+
+
+def _load_metadata(path):
+    with open(os.path.join(path, METADATA_FILE), 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    if metadata.get('format') != FORMAT:
+        raise ValueError(f"不是风险场存储: {path}")
+    return metadata
+
+
+class FieldStoreWriter:
+    """
+    逐帧追加写入风险场存储
+
+    目录中已有存储时继续追加（网格必须一致）。写完后调用close()（或使用with语句），
+    未写满的最后一个分块会截断为实际帧数。
+    """
+
+    def __init__(self, path, model, chunk_frames=64, chunk_cols=512, dtype=None, overwrite=False):
+        """
+        Parameters:
+        path: 存储目录
+        model: RiskFieldModel实例（记录其网格和get_config参数）
+        chunk_frames: 每个分块的帧数
+        chunk_cols: 每个分块的列数（沿x方向分块，读取空间窗口时只读相交的列块）
+        dtype: 存储的数据类型，默认与模型一致（如 "float32" 可减半存储）
+        overwrite: 删除已有存储后重新创建
+        """
+        self.path = path
+        if overwrite and os.path.exists(path):
+            shutil.rmtree(path)
+
+        grid = {
+            'shape': [len(model.y_en), len(model.x_en)],
+            'delta_en': float(model.delta_en),
+            'x0': float(model.x_en[0]),
+            'y0': float(model.y_en[0])
+        }
+        if os.path.exists(os.path.join(path, METADATA_FILE)):
+            self.metadata = _load_metadata(path)
+            existing = {key: self.metadata[key] for key in grid}
+            if existing != grid:
+                raise ValueError(f"存储的网格 {existing} 与模型网格 {grid} 不一致")
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.metadata = {
+                'format': FORMAT,
+                'version': VERSION,
+                **grid,
+                'dtype': np.dtype(dtype or model.dtype).name,
+                'chunk_frames': int(chunk_frames),
+                'chunk_cols': int(min(chunk_cols, grid['shape'][1])),
+                'model': model.get_config(),
+                'recordings': {}
+            }
+            self._write_metadata()
+
+        self.dtype = np.dtype(self.metadata['dtype'])
+        self.chunk_frames = self.metadata['chunk_frames']
+        self.chunk_cols = self.metadata['chunk_cols']
+        self.shape = tuple(self.metadata['shape'])
+        self._frames = {}
+        self._open = {}
+
+    def _write_metadata(self):
+        tmp = os.path.join(self.path, METADATA_FILE + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, os.path.join(self.path, METADATA_FILE))
+
+    def _tiles(self):
+        nx = self.shape[1]
+        return [(c0, min(c0 + self.chunk_cols, nx)) for c0 in range(0, nx, self.chunk_cols)]
+
+    def _frame_list(self, recording_id):
+        key = str(recording_id)
+        if key not in self._frames:
+            frames_path = os.path.join(_recording_dir(self.path, key), "frames.npy")
+            self._frames[key] = list(np.load(frames_path)) if os.path.exists(frames_path) else []
+            os.makedirs(_recording_dir(self.path, key), exist_ok=True)
+        return self._frames[key]
+
+    def _chunk_arrays(self, key, chunk):
+        """打开（必要时创建或扩展为完整大小的）分块内存映射"""
+        opened = self._open.get(key)
+        if opened is not None and opened[0] == chunk:
+            return opened[1]
+        if opened is not None:
+            for array in opened[1]:
+                array.flush()
+
+        arrays = []
+        for tile, (c0, c1) in enumerate(self._tiles()):
+            chunk_path = _chunk_path(self.path, key, chunk, tile)
+            shape = (self.chunk_frames, self.shape[0], c1 - c0)
+            existing = None
+            if os.path.exists(chunk_path):
+                existing = np.load(chunk_path, mmap_mode='r')
+                if existing.shape == shape:
+                    arrays.append(np.lib.format.open_memmap(chunk_path, mode='r+'))
+                    continue
+                # 上次关闭时截断的最后一个分块：读出后按完整大小重建
+                existing = np.array(existing)
+            array = np.lib.format.open_memmap(chunk_path, mode='w+', dtype=self.dtype, shape=shape)
+            if existing is not None:
+                array[:len(existing)] = existing
+            arrays.append(array)
+        self._open[key] = (chunk, arrays)
+        return arrays
+
+    def append(self, recording_id, frame_id, F_total):
+        """
+        追加一帧（帧号在同一录制内必须严格递增）
+
+        Parameters:
+        recording_id: 录制编号（int或str）
+        frame_id: 帧号
+        F_total: (ny, nx) 风险场
+        """
+        F_total = np.asarray(F_total)
+        if F_total.shape != self.shape:
+            raise ValueError(f"风险场形状 {F_total.shape} 与存储网格 {self.shape} 不一致")
+        key = str(recording_id)
+        frames = self._frame_list(key)
+        if frames and int(frame_id) <= frames[-1]:
+            raise ValueError(f"录制 {key} 的帧号必须递增: {frame_id} <= {frames[-1]}")
+
+        chunk, offset = divmod(len(frames), self.chunk_frames)
+        for array, (c0, c1) in zip(self._chunk_arrays(key, chunk), self._tiles()):
+            array[offset] = F_total[:, c0:c1]
+        frames.append(int(frame_id))
+
+    def append_results(self, recording_id, results):
+        """
+        追加流式管线的结果（RiskFieldPipeline / stream_risk_fields，outputs包含 field 或 sparse），
+        返回写入的帧数
+        """
+        count = 0
+        for result in results:
+            if 'field' in result:
+                F_total = result['field']
+            elif 'sparse' in result:
+                F_total = result['sparse'].to_dense()
+            else:
+                raise ValueError("结果中没有field或sparse输出")
+            self.append(recording_id, result['frame'], F_total)
+            count += 1
+        return count
+
+    def flush(self):
+        """把已写入的帧和帧号索引写入磁盘"""
+        for key, frames in self._frames.items():
+            np.save(os.path.join(_recording_dir(self.path, key), "frames.npy"),
+                    np.asarray(frames, dtype=np.int64))
+            self.metadata['recordings'][key] = {'frames': len(frames)}
+        for _, arrays in self._open.values():
+            for array in arrays:
+                array.flush()
+        self._write_metadata()
+
+    def close(self):
+        """写入索引，并把各录制未写满的最后一个分块截断为实际帧数"""
+        self.flush()
+        truncated = []
+        for key, (chunk, arrays) in self._open.items():
+            filled = len(self._frames[key]) - chunk * self.chunk_frames
+            if filled < self.chunk_frames:
+                truncated.append((key, chunk, [np.array(array[:filled]) for array in arrays]))
+        # 先释放内存映射再覆盖文件
+        self._open = {}
+        for key, chunk, tiles in truncated:
+            for tile, data in enumerate(tiles):
+                np.save(_chunk_path(self.path, key, chunk, tile), data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class FieldStore:
+    """
+    只读访问风险场存储
+
+    read() 按帧范围和行、列范围切片，只打开相交的分块；分块的内存映射会被缓存复用。
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+        path: 存储目录（由FieldStoreWriter创建）
+        """
+        self.path = path
+        self.metadata = _load_metadata(path)
+        self.shape = tuple(self.metadata['shape'])
+        self.dtype = np.dtype(self.metadata['dtype'])
+        self.chunk_frames = self.metadata['chunk_frames']
+        self.chunk_cols = self.metadata['chunk_cols']
+        d = self.metadata['delta_en']
+        self.x_en = (self.metadata['x0'] + d * np.arange(self.shape[1])).astype(self.dtype)
+        self.y_en = (self.metadata['y0'] + d * np.arange(self.shape[0])).astype(self.dtype)
+        self._frames = {}
+        self._chunks = {}
+
+    @property
+    def model_config(self):
+        """写入时模型的get_config参数（可传给RiskFieldModel.from_config）"""
+        return self.metadata['model']
+
+    def recordings(self):
+        return list(self.metadata['recordings'])
+
+    def frames(self, recording_id):
+        """录制中已保存的帧号（递增）"""
+        key = str(recording_id)
+        if key not in self._frames:
+            if key not in self.metadata['recordings']:
+                raise KeyError(f"存储中没有录制: {recording_id}")
+            frames = np.load(os.path.join(_recording_dir(self.path, key), "frames.npy"))
+            self._frames[key] = frames[:self.metadata['recordings'][key]['frames']]
+        return self._frames[key]
+
+    def _chunk(self, key, chunk, tile):
+        cache_key = (key, chunk, tile)
+        array = self._chunks.get(cache_key)
+        if array is None:
+            array = np.load(_chunk_path(self.path, key, chunk, tile), mmap_mode='r')
+            self._chunks[cache_key] = array
+        return array
+
+    def window(self, x_min, x_max, y_min, y_max):
+        """世界坐标范围转换为 (rows, cols) 切片（与RiskFieldModel._window_slices相同）"""
+        c0 = np.searchsorted(self.x_en, x_min, side='left')
+        c1 = np.searchsorted(self.x_en, x_max, side='right')
+        r0 = np.searchsorted(self.y_en, y_min, side='left')
+        r1 = np.searchsorted(self.y_en, y_max, side='right')
+        return slice(r0, r1), slice(c0, c1)
+
+    def read(self, recording_id, start=None, stop=None, rows=slice(None), cols=slice(None)):
+        """
+        读取帧号在 [start, stop) 内的风险场，返回 (帧号数组, (n, 行数, 列数) 数组)
+
+        Parameters:
+        recording_id: 录制编号
+        start, stop: 帧号范围，None表示不限
+        rows, cols: 行、列切片（步长为1），可由window()生成
+        """
+        key = str(recording_id)
+        frames = self.frames(key)
+        p0, p1 = self._positions(frames, start, stop)
+        return frames[p0:p1], self._read_positions(key, p0, p1, rows, cols)
+
+    @staticmethod
+    def _positions(frames, start, stop):
+        """帧号范围 [start, stop) 对应的存储位置范围"""
+        p0 = 0 if start is None else int(np.searchsorted(frames, start, side='left'))
+        p1 = len(frames) if stop is None else int(np.searchsorted(frames, stop, side='left'))
+        return p0, max(p0, p1)
+
+    def _read_positions(self, key, p0, p1, rows, cols):
+        """读取存储位置 [p0, p1) 的帧"""
+        r0, r1, _ = rows.indices(self.shape[0])
+        c0, c1, _ = cols.indices(self.shape[1])
+        r1, c1 = max(r1, r0), max(c1, c0)
+        out = np.empty((p1 - p0, r1 - r0, c1 - c0), dtype=self.dtype)
+        if out.size == 0:
+            return out
+
+        cf, cc = self.chunk_frames, self.chunk_cols
+        for chunk in range(p0 // cf, (p1 - 1) // cf + 1):
+            f0, f1 = max(p0, chunk * cf), min(p1, (chunk + 1) * cf)
+            for tile in range(c0 // cc, (c1 - 1) // cc + 1):
+                t0, t1 = max(c0, tile * cc), min(c1, (tile + 1) * cc)
+                block = self._chunk(key, chunk, tile)
+                out[f0 - p0:f1 - p0, :, t0 - c0:t1 - c0] = \
+                    block[f0 - chunk * cf:f1 - chunk * cf, r0:r1, t0 - tile * cc:t1 - tile * cc]
+        return out
+
+    def read_frame(self, recording_id, frame_id, rows=slice(None), cols=slice(None)):
+        """读取单帧，帧不存在时抛出KeyError"""
+        frames, fields = self.read(recording_id, frame_id, frame_id + 1, rows, cols)
+        if len(frames) == 0 or frames[0] != frame_id:
+            raise KeyError(f"录制 {recording_id} 中没有帧 {frame_id}")
+        return fields[0]
+
+    def iter_frames(self, recording_id, start=None, stop=None, rows=slice(None), cols=slice(None)):
+        """按分块逐帧生成 (帧号, 风险场)，每次只读入一个分块的帧范围"""
+        key = str(recording_id)
+        frames = self.frames(key)
+        p0, p1 = self._positions(frames, start, stop)
+        while p0 < p1:
+            q1 = min(p1, (p0 // self.chunk_frames + 1) * self.chunk_frames)
+            yield from zip(frames[p0:q1], self._read_positions(key, p0, q1, rows, cols))
+            p0 = q1
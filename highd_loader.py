@@ -0,0 +1,235 @@
+"""
+highD数据集加载模块 - 流式读取轨迹数据并转换为风险场模型输入
+highD Dataset Loader for Risk Field Model
+
+只读取风险场模型需要的列（列投影），按块流式读取 XX_tracks.csv，
+直接转换为 calculate_scene_risk_field 所需的 [id, x, y, speed] 数组，并可选写入列式缓存。
+"""
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+
+class HighDRecording:
+    """
+    一个highD录制的风险场输入数据（按帧排序的列式数组）
+
+    vehicles 为 (rows, 4) 数组 [id, x, y, speed]，frame_ids 为出现的帧号，
+    第i帧的车辆是 vehicles[offsets[i]:offsets[i + 1]]（零拷贝切片）
+    """
+
+    def __init__(self, recording_id, frame_ids, offsets, vehicles, meta=None):
+        self.recording_id = recording_id
+        self.frame_ids = frame_ids
+        self.offsets = offsets
+        self.vehicles = vehicles
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.frame_ids)
+
+    def frames(self):
+        """返回所有帧号（已排序）"""
+        return self.frame_ids
+
+    def frame_vehicles(self, frame_id):
+        """返回指定帧车辆的 (n, 4) 数组视图 [id, x, y, speed]；帧不存在时返回空数组"""
+        pos = np.searchsorted(self.frame_ids, frame_id)
+        if pos >= len(self.frame_ids) or self.frame_ids[pos] != frame_id:
+            return self.vehicles[:0]
+        return self.vehicles[self.offsets[pos]:self.offsets[pos + 1]]
+
+    def iter_frames(self):
+        """按帧顺序生成 (frame_id, vehicles) """
+        for i, frame_id in enumerate(self.frame_ids):
+            yield int(frame_id), self.vehicles[self.offsets[i]:self.offsets[i + 1]]
+
+
+class HighDDataLoader:
+    """
+    highD数据集加载器
+
+    - 只读取 TRACK_COLUMNS 中的列
+    - 按 chunksize 行分块读取，内存只保留紧凑的列式结果
+    - 坐标转换为车辆包围盒中心，速度为合速度 [m/s]
+      （风险场模型把大于50的速度视为km/h，高速公路数据中m/s速度不会超过该值）
+    - cache_dir 不为空时把转换结果写为 .npy 列式缓存，源文件不变时直接内存映射
+    """
+
+    TRACK_COLUMNS = ['frame', 'id', 'x', 'y', 'width', 'height', 'xVelocity', 'yVelocity']
+    META_COLUMNS = ['id', 'initialFrame', 'finalFrame', 'class', 'drivingDirection',
+                    'minTHW', 'numLaneChanges']
+
+    def __init__(self, dataset_path, chunksize=200000, cache_dir=None):
+        """
+        Parameters:
+        dataset_path: highD数据集根目录（包含data/子目录）或data目录本身
+        chunksize: 每块读取的行数
+        cache_dir: 列式缓存目录，None表示不使用缓存
+        """
+        data_dir = os.path.join(dataset_path, 'data')
+        self.data_dir = data_dir if os.path.isdir(data_dir) else dataset_path
+        self.chunksize = chunksize
+        self.cache_dir = cache_dir
+
+    def recording_path(self, recording_id, kind='tracks'):
+        """录制文件路径，kind为 tracks / tracksMeta / recordingMeta"""
+        return os.path.join(self.data_dir, f"{int(recording_id):02d}_{kind}.csv")
+
+    def recording_ids(self):
+        """数据目录中所有录制编号"""
+        ids = []
+        for name in os.listdir(self.data_dir):
+            if name.endswith('_tracks.csv') and name[:-len('_tracks.csv')].isdigit():
+                ids.append(int(name[:-len('_tracks.csv')]))
+        return sorted(ids)
+
+    def convert_to_risk_field_format(self, raw_data, driving_direction=None):
+        """
+        将tracks数据（DataFrame或其分块）转换为风险场模型格式
+
+        Parameters:
+        raw_data: 包含 TRACK_COLUMNS 的DataFrame
+        driving_direction: 只保留指定行驶方向（1: x负方向, 2: x正方向），None保留全部
+
+        Returns:
+        (frames, vehicles)：frames 为 (n,) 帧号，vehicles 为 (n, 4) [id, x, y, speed]
+        """
+        x_velocity = raw_data['xVelocity'].to_numpy(dtype=float)
+        y_velocity = raw_data['yVelocity'].to_numpy(dtype=float)
+
+        keep = slice(None)
+        if driving_direction == 1:
+            keep = x_velocity < 0
+        elif driving_direction == 2:
+            keep = x_velocity > 0
+
+        vehicles = np.empty((len(raw_data), 4))
+        vehicles[:, 0] = raw_data['id'].to_numpy(dtype=float)
+        # highD的x, y为包围盒左上角，转换为车辆中心
+        vehicles[:, 1] = raw_data['x'].to_numpy(dtype=float) + raw_data['width'].to_numpy(dtype=float) / 2
+        vehicles[:, 2] = raw_data['y'].to_numpy(dtype=float) + raw_data['height'].to_numpy(dtype=float) / 2
+        vehicles[:, 3] = np.hypot(x_velocity, y_velocity)
+        frames = raw_data['frame'].to_numpy(dtype=np.int64)
+
+        return frames[keep], vehicles[keep]
+
+    def iter_track_chunks(self, recording_id, driving_direction=None):
+        """按块流式读取tracks文件，生成 (frames, vehicles)"""
+        reader = pd.read_csv(self.recording_path(recording_id), usecols=self.TRACK_COLUMNS,
+                             chunksize=self.chunksize)
+        for chunk in reader:
+            yield self.convert_to_risk_field_format(chunk, driving_direction)
+
+    def load_recording(self, recording_id, driving_direction=None, use_cache=True):
+        """
+        加载一个录制，返回按帧排序的 HighDRecording
+
+        Parameters:
+        recording_id: 录制编号（对应 XX_tracks.csv）
+        driving_direction: 只保留指定行驶方向，None保留全部
+        use_cache: cache_dir不为空时是否读写列式缓存
+        """
+        cache_path = None
+        if self.cache_dir and use_cache:
+            suffix = f"_dir{driving_direction}" if driving_direction else ""
+            cache_path = os.path.join(self.cache_dir, f"{int(recording_id):02d}_risk{suffix}")
+            recording = self._load_cache(recording_id, cache_path)
+            if recording is not None:
+                return recording
+
+        frame_parts, vehicle_parts = [], []
+        for frames, vehicles in self.iter_track_chunks(recording_id, driving_direction):
+            frame_parts.append(frames)
+            vehicle_parts.append(vehicles)
+
+        frames = np.concatenate(frame_parts) if frame_parts else np.empty(0, dtype=np.int64)
+        vehicles = np.concatenate(vehicle_parts) if vehicle_parts else np.empty((0, 4))
+        del frame_parts, vehicle_parts
+
+        # tracks文件按车辆排序，这里改为按帧排序并记录每帧偏移
+        order = np.argsort(frames, kind='stable')
+        frames = frames[order]
+        vehicles = vehicles[order]
+        frame_ids, starts = np.unique(frames, return_index=True)
+        offsets = np.append(starts, len(frames)).astype(np.int64)
+
+        meta = self.load_tracks_meta(recording_id)
+        recording = HighDRecording(int(recording_id), frame_ids, offsets, vehicles, meta)
+        if cache_path:
+            self._write_cache(recording, cache_path)
+        return recording
+
+    def load_tracks_meta(self, recording_id):
+        """读取tracksMeta中与场景提取相关的列；文件不存在时返回None"""
+        path = self.recording_path(recording_id, 'tracksMeta')
+        if not os.path.exists(path):
+            return None
+        return pd.read_csv(path, usecols=lambda column: column in self.META_COLUMNS)
+
+    def extract_scenarios(self, recording_id, scenario_type, thw_threshold=1.0):
+        """
+        根据tracksMeta提取特定类型的驾驶场景
+
+        Parameters:
+        scenario_type: "lane_change"（发生换道）或 "close_following"（最小车头时距小于阈值）
+        thw_threshold: close_following的车头时距阈值 [s]
+
+        Returns:
+        [{'id', 'initial_frame', 'final_frame'}, ...]
+        """
+        meta = self.load_tracks_meta(recording_id)
+        if meta is None:
+            return []
+
+        if scenario_type == "lane_change":
+            selected = meta[meta['numLaneChanges'] > 0]
+        elif scenario_type == "close_following":
+            selected = meta[(meta['minTHW'] > 0) & (meta['minTHW'] < thw_threshold)]
+        else:
+            raise ValueError(f"未知的场景类型: {scenario_type}")
+
+        return [
+            {'id': int(row.id), 'initial_frame': int(row.initialFrame), 'final_frame': int(row.finalFrame)}
+            for row in selected.itertuples()
+        ]
+
+    def _source_signature(self, recording_id):
+        stat = os.stat(self.recording_path(recording_id))
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _load_cache(self, recording_id, cache_path):
+        """源文件未变化时从列式缓存加载，否则返回None"""
+        meta_path = os.path.join(cache_path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('source') != self._source_signature(recording_id):
+                return None
+            arrays = {
+                name: np.load(os.path.join(cache_path, f"{name}.npy"), mmap_mode='r')
+                for name in ('frame_ids', 'offsets', 'vehicles')
+            }
+        except Exception as e:
+            print(f"⚠️  读取highD缓存失败，重新加载: {e}")
+            return None
+
+        return HighDRecording(int(recording_id), arrays['frame_ids'], arrays['offsets'],
+                              arrays['vehicles'], self.load_tracks_meta(recording_id))
+
+    def _write_cache(self, recording, cache_path):
+        """把转换结果写为 .npy 列式缓存"""
+        try:
+            os.makedirs(cache_path, exist_ok=True)
+            for name in ('frame_ids', 'offsets', 'vehicles'):
+                np.save(os.path.join(cache_path, f"{name}.npy"), getattr(recording, name))
+            with open(os.path.join(cache_path, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({'source': self._source_signature(recording.recording_id),
+                           'rows': int(len(recording.vehicles))}, f)
+        except Exception as e:
+            print(f"⚠️  写入highD缓存失败: {e}")
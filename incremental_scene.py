@@ -0,0 +1,127 @@
+"""
+增量场景风险场 - 帧间只更新发生变化的车辆
+Incremental Scene for Risk Field Model
+
+相邻帧之间大部分车辆只移动几分米，整场景重算浪费大量计算。
+IncrementalScene 记录每辆车上一帧在其支撑窗口内的贡献，
+车辆进入、离开或移动时只减去旧贡献、加上新贡献，并定期整体重建以限制浮点漂移。
+"""
+
+import numpy as np
+
+
+class IncrementalScene:
+    """
+    有状态的场景风险场（按车辆id增量更新动态车辆层 F_others）
+
+    - 每辆车的贡献只在其 support_box 窗口内计算（与windowed引擎一致）
+    - x、y、速度的变化都不超过move_tol时视为未变化，沿用旧贡献
+    - 每 rebuild_interval 帧用保存的各车贡献重新求和一次，消除累计的加减误差
+    """
+
+    def __init__(self, model, rebuild_interval=250, move_tol=0.0):
+        """
+        Parameters:
+        model: RiskFieldModel实例，提供网格、参数和固定背景层
+        rebuild_interval: 整体重建的帧间隔
+        move_tol: 判断车辆状态变化的阈值（x、y [m] 与速度使用同一阈值）
+        """
+        self.model = model
+        self.rebuild_interval = rebuild_interval
+        self.move_tol = move_tol
+        self.reset()
+
+    def reset(self):
+        """清空所有车辆"""
+        self.F_others = np.zeros_like(self.model.X_en)
+        self._contributions = {}
+        self._param_key = self.model._field_param_key()
+        self.frames_since_rebuild = 0
+        self.last_stats = {'added': 0, 'removed': 0, 'moved': 0, 'unchanged': 0}
+
+    def _contribution(self, params):
+        """计算单辆车的窗口贡献，返回 (params, rows, cols, patch)"""
+        model = self.model
+        boxes = model.support_box(params[None, :])
+        rows, cols = model._window_slices(*(bound[0] for bound in boxes))
+        return params, rows, cols, model.window_patch(params, rows, cols)
+
+    def _apply(self, contribution, sign):
+        _, rows, cols, patch = contribution
+        if patch is None:
+            return
+        if sign > 0:
+            self.F_others[rows, cols] += patch
+        else:
+            self.F_others[rows, cols] -= patch
+
+    def rebuild(self):
+        """用保存的各车贡献重新求和，消除累计的浮点误差"""
+        self.F_others[...] = 0
+        for contribution in self._contributions.values():
+            self._apply(contribution, 1)
+        self.frames_since_rebuild = 0
+
+    def update(self, vehicles_data):
+        """
+        用新一帧的车辆更新场景，返回与calculate_scene_risk_field相同的
+        (F_total, F_ego_total, F_others, F_turn_total)
+
+        F_others 是场景内部的累加数组，下次update时会被原地修改，需要保留时请复制。
+
+        Parameters:
+        vehicles_data: 车辆列表或 (n, 4) 数组 [id, x, y, speed]，id用于跨帧匹配车辆，
+                       同一帧内不能重复（重复时抛出ValueError）
+        """
+        model = self.model
+        prof = model.profiler
+        start = prof.now() if prof is not None else 0.0
+        if model._field_param_key() != self._param_key:
+            # 模型参数或网格变化后旧贡献全部失效
+            vehicles_before = {vid: c[0] for vid, c in self._contributions.items()}
+            self.reset()
+            self._contributions = {vid: self._contribution(p) for vid, p in vehicles_before.items()}
+            self.rebuild()
+
+        params = model.vehicle_param_array(vehicles_data)
+        ids, counts = np.unique(params[:, 0].astype(int), return_counts=True)
+        if np.any(counts > 1):
+            raise ValueError(f"同一帧中车辆id重复: {ids[counts > 1].tolist()}")
+        current = {int(row[0]): row for row in params}
+        stats = {'added': 0, 'removed': 0, 'moved': 0, 'unchanged': 0}
+
+        for vid in list(self._contributions):
+            if vid not in current:
+                self._apply(self._contributions.pop(vid), -1)
+                stats['removed'] += 1
+
+        for vid, row in current.items():
+            old = self._contributions.get(vid)
+            if old is not None:
+                if np.all(np.abs(old[0][1:4] - row[1:4]) <= self.move_tol):
+                    stats['unchanged'] += 1
+                    continue
+                self._apply(old, -1)
+                stats['moved'] += 1
+            else:
+                stats['added'] += 1
+            contribution = self._contribution(row)
+            self._contributions[vid] = contribution
+            self._apply(contribution, 1)
+
+        self.frames_since_rebuild += 1
+        if self.frames_since_rebuild >= self.rebuild_interval:
+            self.rebuild()
+        self.last_stats = stats
+
+        engine = "windowed" if model.engine == "loop" else model.engine
+        F_ego_total, F_turn_total = model.static_risk_layers(engine)
+        F_total = F_ego_total + self.F_others
+        F_total += F_turn_total
+        F_total[F_total < 0.001] = 0
+        if prof is not None:
+            # 与calculate_scene_risk_field相同，每帧结束时生成一份分阶段统计
+            prof.mark('scene', start, F_total.size)
+            prof.end_scene()
+
+        return F_total, F_ego_total, self.F_others, F_turn_total
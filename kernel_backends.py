@@ -0,0 +1,126 @@
+"""
+风险场核计算后端 - NumPy（默认）与可选的Numba融合核
+Kernel Backends for Risk Field Model
+
+NumPy后端把环面风险场拆成十几个逐元素运算，每个运算都要完整扫描一遍网格，
+速度受内存带宽限制。Numba后端把单个网格点上的全部计算（弧长、a、sigma、高斯值）
+以及对所有车辆的累加融合到一个并行循环中，每个网格点只读写一次。
+Numba未安装时只能使用NumPy后端。
+"""
+
+import math
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+BACKENDS = ("numpy", "numba")
+
+# 每辆车参数表 (N, 12) 的列顺序
+TERM_COLUMNS = ('x', 'y', 'xc', 'yc', 'ux', 'uy', 'mag_u', 'R', 'sign_delta', 'dla', 'mexp1', 'mexp2')
+
+
+def check_backend(backend):
+    """检查后端名称是否有效、依赖是否已安装"""
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的计算后端: {backend}")
+    if backend == "numba" and not NUMBA_AVAILABLE:
+        raise ImportError("numba后端需要安装numba: pip install numba")
+
+
+def available_backends():
+    """返回当前环境可用的后端"""
+    return tuple(backend for backend in BACKENDS if backend != "numba" or NUMBA_AVAILABLE)
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def _cell_risk(X, Y, T, k, par1, cexp, stable):
+        """第k辆车在 (X, Y) 处的风险值（与RiskFieldModel.torus_field_batch逐项对应，NaN记为0）"""
+        x, y, xc, yc = T[k, 0], T[k, 1], T[k, 2], T[k, 3]
+        ux, uy, mag_u, R = T[k, 4], T[k, 5], T[k, 6], T[k, 7]
+        sign_delta, dla, mexp1, mexp2 = T[k, 8], T[k, 9], T[k, 10], T[k, 11]
+
+        if stable:
+            # 车辆相对坐标形式（float32模型使用，同torus_field_batch）
+            dx = X - x
+            dy = Y - y
+            ud = ux * dx + uy * dy
+            q = 2 * ud + dx * dx + dy * dy
+            R2 = R * R
+            ring = q / (math.sqrt(R2 + q) + R)
+            theta = math.atan2(sign_delta * (ux * dy - dx * uy), R2 + ud)
+        else:
+            dxc = X - xc
+            dyc = Y - yc
+            dist_R = math.sqrt(dxc * dxc + dyc * dyc)
+            costheta = (ux * dxc + uy * dyc) / (mag_u * dist_R)
+            costheta = min(max(costheta, -1.0), 1.0)
+            cross = ux * dyc - dxc * uy
+            sign_theta = 1.0 if cross > 0 else (-1.0 if cross < 0 else 0.0)
+            theta = sign_delta * sign_theta * math.acos(costheta)
+            ring = dist_R - R
+
+        if theta < 0:
+            theta += 2 * math.pi
+        arc_len = R * theta
+        # a_calc：弧长不小于dla（或为NaN）时为0，弧长为0时取一半
+        if not arc_len < dla:
+            return 0.0
+        a = par1 * (arc_len - dla) ** 2
+        if arc_len == 0:
+            a *= 0.5
+
+        sigma = (mexp1 if ring < 0 else mexp2) * arc_len + cexp
+        z = a * math.exp(-(ring * ring) / (2 * sigma * sigma))
+        return z if z > 0 else 0.0
+
+    @njit(parallel=True, cache=True)
+    def _grid_accumulate(xs, ys, T, par1, cexp, stable, out):
+        """out[j, i] += Σ_k 第k辆车在 (xs[i], ys[j]) 处的风险值（按行并行）"""
+        for j in prange(ys.shape[0]):
+            for i in range(xs.shape[0]):
+                total = 0.0
+                for k in range(T.shape[0]):
+                    total += _cell_risk(xs[i], ys[j], T, k, par1, cexp, stable)
+                out[j, i] += total
+
+    @njit(parallel=True, cache=True)
+    def _points_accumulate(px, py, T, par1, cexp, stable, out):
+        """out[p] += Σ_k 第k辆车在 (px[p], py[p]) 处的风险值"""
+        for p in prange(px.shape[0]):
+            total = 0.0
+            for k in range(T.shape[0]):
+                total += _cell_risk(px[p], py[p], T, k, par1, cexp, stable)
+            out[p] += total
+
+
+def numba_accumulate(terms, X, Y, out, par1, cexp, stable):
+    """
+    用Numba融合核把所有车辆的风险场累加到out
+
+    支持两种坐标形式：网格轴 X (1, nx)、Y (ny, 1)（out为 (ny, nx)），或点列 X、Y、out均为 (K,)。
+    其他形状返回False，由调用方改用NumPy后端。
+
+    Parameters:
+    terms: (N, 12) 每辆车参数表，列顺序见TERM_COLUMNS
+    stable: 是否使用车辆相对坐标形式（float32模型）
+    """
+    X = np.asarray(X)
+    Y = np.asarray(Y)
+    terms = np.ascontiguousarray(terms, dtype=np.float64)
+    if X.ndim == 2 and Y.ndim == 2 and X.shape[0] == 1 and Y.shape[1] == 1 \
+            and out.shape == (Y.shape[0], X.shape[1]):
+        _grid_accumulate(X[0].astype(np.float64), Y[:, 0].astype(np.float64), terms,
+                         float(par1), float(cexp), bool(stable), out)
+        return True
+    if X.ndim == 1 and X.shape == Y.shape == out.shape:
+        _points_accumulate(X.astype(np.float64), Y.astype(np.float64), terms,
+                           float(par1), float(cexp), bool(stable), out)
+        return True
+    return False
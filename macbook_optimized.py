@@ -100,69 +100,29 @@ def quick_demo_for_macbook():
 
 def performance_benchmark():
     """
-    简单的性能基准测试
+    性能基准测试（真实调用模型，详细测试见 benchmark_suite.py）
     """
     print("\n🔧 MacBook Air 性能基准测试")
     print("-"*40)
     
     try:
-        import time
         import sys
-        sys.path.append('.')
-        
-        from risk_field_model import RiskFieldModel
+        import os
+        sys.path.append(os.path.dirname(os.path.abspath(__file__)))
         
-        # 测试不同网格精度的性能
-        test_configs = [
-            ("超快速", 0.5),
-            ("快速", 0.2), 
-            ("平衡", 0.1),
-            ("精确", 0.05)
-        ]
+        from benchmark_suite import BenchmarkSuite
         
-        vehicles = [[1, 50, 4, 60]]  # 单车测试
+        # 各性能模式下的单车场景（稳态单帧，背景层已缓存）
+        suite = BenchmarkSuite(vehicle_counts=(1,), road_lengths=(100.0,), kernels=(), repeats=3)
         
-        for name, delta in test_configs:
-            print(f"\n测试 {name} 模式 (网格={delta}m):")
-            
-            # 手动设置参数进行测试
-            class TestModel:
-                def __init__(self, delta_en):
-                    self.delta_en = delta_en
-                    self.X_length = 100.0
-                    self.Y_length = 8.25
-                    # 简化的参数设置
-                    self.m_obj = 1500
-                    self.beta_obj = 0
-                    self.L_obj = 2.5
-                    self.K_obj = 0.2
-                    self.delta_max = 40
-                    self.Sr = 54
-                    self.par1 = 0.4
-                    self.mcexp = 0.3
-                    self.cexp = 2.55
-                    self.kexp1 = 2
-                    self.kexp2 = 2
-                    self.tla = 2.75
-                    self.create_spatial_grid()
-                
-                def create_spatial_grid(self):
-                    import numpy as np
-                    x = np.arange(0, self.X_length + self.delta_en, self.delta_en)
-                    y = np.arange(0, self.Y_length + self.delta_en, self.delta_en)
-                    self.X_en, self.Y_en = np.meshgrid(x, y)
-            
-            model = TestModel(delta)
-            grid_points = model.X_en.shape[0] * model.X_en.shape[1]
+        for result in suite.run_scenes():
+            print(f"\n测试 {result['mode']} 模式 (网格={result['grid_shape'][0]}×{result['grid_shape'][1]}):")
+            calc_time = result['wall_time']
             
-            start_time = time.time()
-            # 简单的计算模拟（避免复杂依赖）
-            time.sleep(grid_points / 100000)  # 模拟计算时间
-            calc_time = time.time() - start_time
-            
-            print(f"   网格点数: {grid_points}")
-            print(f"   预估时间: {calc_time:.2f}秒")
-            print(f"   内存估算: {grid_points * 8 / 1024 / 1024:.1f}MB")
+            print(f"   网格点数: {result['cells']}")
+            print(f"   单帧时间: {calc_time:.3f}秒（首帧含背景层 {result['cold_time']:.3f}秒）")
+            print(f"   计算速度: {result['cells_per_s']:.0f} 点/秒")
+            print(f"   峰值内存: {result['peak_bytes'] / 1024 / 1024:.1f}MB")
             
             if calc_time < 1:
                 print("   🟢 速度很快，适合实时使用")
@@ -170,6 +130,8 @@ def performance_benchmark():
                 print("   🟡 速度适中，适合开发测试")  
             else:
                 print("   🔴 速度较慢，建议降低精度")
+        
+        print("\n   完整基准（多车辆数、道路长度、单个核、JSON基线）: python benchmark_suite.py")
     
     except Exception as e:
         print(f"基准测试出错: {e}")
@@ -0,0 +1,119 @@
+"""
+内存预算 - 按字节上限确定核每次计算的网格点数
+Memory Budget for Risk Field Model
+
+场景风险场的峰值内存 = 网格大小的常驻数组（坐标网格、背景层缓存、输出）
+                     + 每个线程中核的临时数组（每次计算的 车辆数 × 网格点数 × 每点字节数）。
+straight_kernel="template" 时还有模板库（FieldTemplateBank）缓存的模板。
+RiskFieldModel(max_memory="512MB") 根据网格和数据类型估算常驻数组，模板库最多占用剩余预算的一半，
+其余分给核的临时数组，
+得到每次核计算允许的最大 (车辆数 × 网格点数)；batched引擎的分批、tiled引擎的分块都不超过该值，
+单辆车的计算仍超过时沿x方向分列计算。
+预算只覆盖模型的数组，不含Python解释器和库本身；loop引擎（参考实现）不受预算控制。
+"""
+
+import os
+import re
+
+import numpy as np
+
+_UNITS = {
+    '': 1, 'b': 1,
+    'k': 10 ** 3, 'kb': 10 ** 3, 'm': 10 ** 6, 'mb': 10 ** 6, 'g': 10 ** 9, 'gb': 10 ** 9,
+    'kib': 2 ** 10, 'mib': 2 ** 20, 'gib': 2 ** 30
+}
+
+# 预算中留给车辆参数表、包围盒等小数组的比例
+HEADROOM = 0.9
+
+
+def parse_memory_size(value):
+    """
+    把 "512MB"、"1.5GiB"、"64k" 或字节数转换为整数字节数
+
+    十进制单位（KB/MB/GB）按1000进位，二进制单位（KiB/MiB/GiB）按1024进位
+    """
+    if isinstance(value, (int, np.integer)):
+        size = int(value)
+    else:
+        match = re.fullmatch(r'\s*([0-9]*\.?[0-9]+)\s*([a-zA-Z]*)\s*', str(value))
+        if match is None or match.group(2).lower() not in _UNITS:
+            raise ValueError(f"无法解析的内存大小: {value}")
+        size = int(float(match.group(1)) * _UNITS[match.group(2).lower()])
+    if size <= 0:
+        raise ValueError(f"内存大小必须为正数: {value}")
+    return size
+
+
+def kernel_bytes_per_cell(model):
+    """核计算中每个 (车辆, 网格点) 的临时数组字节数（实测值取整后的上限）"""
+    itemsize = np.dtype(model.dtype).itemsize
+    if model.backend != "numpy":
+        # 融合核逐点计算，没有网格大小的临时数组
+        return 0
+    if model.use_workspace:
+        # ring、theta、tmp、z 与掩码（kexp1 != kexp2 时另有den2），工作区容量按2的幂取整最多翻倍
+        per_cell = 4 * itemsize + 1 + (itemsize if model.kexp1 != model.kexp2 else 0)
+        return 2 * per_cell
+    # torus_field_batch 同时存在的临时数组约14个
+    return 15 * itemsize
+
+
+def resident_bytes_per_cell(model):
+    """每个网格点的常驻数组字节数：坐标网格、两个背景层、F_others与F_total、阈值掩码（及工作区的求和缓冲）"""
+    itemsize = np.dtype(model.dtype).itemsize
+    grids = 4 + (2 if model.dense_grid else 0)
+    if model.use_workspace:
+        # 求和缓冲只在一批多于一辆车（网格不大于block_cells的一半）时出现；掩码容量最多翻倍
+        return (grids + 1) * itemsize + 2
+    return grids * itemsize + 1
+
+
+def plan_memory(model, max_memory):
+    """
+    根据预算确定核每次计算的最大 (车辆数 × 网格点数)
+
+    Parameters:
+    model: RiskFieldModel实例（使用其网格、dtype、引擎、后端与线程数）
+    max_memory: 字节数
+
+    Returns:
+    dict: budget, resident_bytes, template_bytes, threads, kernel_bytes_per_cell, block_cells,
+    estimated_peak（template_bytes为模板库容量上限，放不下的速度桶由模板库改用圆弧核计算）
+    """
+    cells = int(np.prod(model.X_en.shape))
+    ny = model.X_en.shape[0]
+    resident = cells * resident_bytes_per_cell(model)
+    threads = (model.n_threads or os.cpu_count() or 1) if model.engine == "tiled" else 1
+    per_cell = kernel_bytes_per_cell(model)
+    available = max_memory * HEADROOM - resident
+    template_bytes = 0
+    if model.straight_kernel == "template":
+        template_bytes = int(min(model.template_bank.requested_bytes(), max(available, 0) // 2))
+        available -= template_bytes
+    if per_cell == 0:
+        block_cells = cells
+    else:
+        block_cells = int(available // (threads * per_cell))
+    if available <= 0 or block_cells < ny:
+        needed = resident + template_bytes + threads * per_cell * ny
+        raise ValueError(f"内存预算 {max_memory / 2 ** 20:.1f} MiB 不足：当前网格 {model.X_en.shape} "
+                         f"至少需要约 {needed / HEADROOM / 2 ** 20:.1f} MiB"
+                         f"（可改用 dtype=\"float32\"、dense_grid=False 或更粗的网格）")
+    # 每次核计算最多为 max(batch_cell_budget, 单车整网格或单块) 个点，且不超过block_cells；
+    # 模板库新建模板时按整个模板（最大可达整张网格）计算
+    if model.engine == "tiled" and template_bytes == 0:
+        tile_cells = (int(model.tile_size) * ny if model.tile_size
+                      else max(ny, min(model.tile_cell_budget, block_cells)))
+        call_cells = max(model.batch_cell_budget, tile_cells)
+    else:
+        call_cells = max(model.batch_cell_budget, cells)
+    return {
+        'budget': int(max_memory),
+        'resident_bytes': int(resident),
+        'template_bytes': template_bytes,
+        'threads': threads,
+        'kernel_bytes_per_cell': per_cell,
+        'block_cells': block_cells,
+        'estimated_peak': int(resident + template_bytes + threads * per_cell * min(block_cells, call_cells))
+    }
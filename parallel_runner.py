@@ -0,0 +1,301 @@
+"""
+多进程并行风险场计算 - 按帧范围或按录制分片到进程池
+Parallel Runner for Risk Field Model
+
+每个工作进程只在启动时根据模型配置创建一次模型和网格（以及帧源），
+之后按任务处理帧块或整段录制，结果按提交顺序合并返回。
+shared_memory=True 时坐标网格和输出风险场放在共享内存中，工作进程直接挂载，不再复制。
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from risk_field_model import RiskFieldModel
+from streaming_pipeline import RiskFieldPipeline
+
+
+# 工作进程内的全局状态（由_init_worker创建）
+_worker_state = {}
+
+
+def _attach_shared(name):
+    """挂载已有的共享内存块（由创建者负责释放）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 没有track参数；进程池子进程与父进程共用同一个resource_tracker，
+        # 重复登记会被合并，释放仍由父进程的unlink完成
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedGridBuffers:
+    """
+    共享内存中的坐标网格与输出槽
+
+    父进程创建 X_en、Y_en 以及 (n_slots, ny, nx) 的输出槽，工作进程通过 spec() 挂载，
+    把 F_total 直接写入分配给它的槽，父进程不需要反序列化任何网格数组。
+    """
+
+    def __init__(self, model, n_slots):
+        self.shape = model.X_en.shape
+        self.dtype = np.dtype(model.X_en.dtype)
+        self.n_slots = n_slots
+        self._blocks = []
+        self.X_en = self._create(model.X_en.shape, model.X_en)
+        self.Y_en = self._create(model.Y_en.shape, model.Y_en)
+        self.fields = self._create((n_slots,) + self.shape)
+
+    def _create(self, shape, data=None):
+        size = max(int(np.prod(shape)) * self.dtype.itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self._blocks.append(block)
+        array = np.ndarray(shape, dtype=self.dtype, buffer=block.buf)
+        if data is not None:
+            array[...] = data
+        return array
+
+    def spec(self):
+        """传给工作进程的共享内存描述"""
+        names = [block.name for block in self._blocks]
+        return {'names': names, 'shape': self.shape, 'n_slots': self.n_slots,
+                'dtype': self.dtype.str}
+
+    @staticmethod
+    def attach(spec):
+        """在工作进程中挂载，返回 (blocks, X_en, Y_en, fields)"""
+        blocks = [_attach_shared(name) for name in spec['names']]
+        shape = tuple(spec['shape'])
+        dtype = np.dtype(spec['dtype'])
+        X_en = np.ndarray(shape, dtype=dtype, buffer=blocks[0].buf)
+        Y_en = np.ndarray(shape, dtype=dtype, buffer=blocks[1].buf)
+        fields = np.ndarray((spec['n_slots'],) + shape, dtype=dtype, buffer=blocks[2].buf)
+        return blocks, X_en, Y_en, fields
+
+    def close(self):
+        """释放共享内存（只由创建者调用）"""
+        self.X_en = self.Y_en = self.fields = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _init_worker(model_config, outputs, probes, source, source_factory, shared_spec=None):
+    """工作进程初始化：创建模型、网格和帧源各一次（共享内存模式下挂载网格）"""
+    if shared_spec is not None:
+        blocks, X_en, Y_en, fields = SharedGridBuffers.attach(shared_spec)
+        model = RiskFieldModel()
+        for name, value in model_config.items():
+            setattr(model, name, value)
+        model.use_grid(X_en, Y_en)
+        _worker_state['shared_blocks'] = blocks
+        _worker_state['fields'] = fields
+    else:
+        model = RiskFieldModel.from_config(model_config)
+    if source is None and source_factory is not None:
+        source = source_factory()
+    _worker_state['model'] = model
+    _worker_state['outputs'] = outputs
+    _worker_state['probes'] = probes
+    _worker_state['pipeline'] = (
+        RiskFieldPipeline(model, source, outputs, probes) if source is not None else None
+    )
+
+
+def _run_frame_chunk(frame_ids, slot_start=None):
+    """处理一块帧；slot_start不为空时F_total写入共享输出槽，结果只返回槽号"""
+    pipeline = _worker_state['pipeline']
+    if slot_start is None:
+        return [pipeline.process_frame(frame_id) for frame_id in frame_ids]
+
+    fields = _worker_state['fields']
+    results = []
+    for k, frame_id in enumerate(frame_ids):
+        result = pipeline.process_frame(frame_id, out=fields[slot_start + k])
+        if 'field' in result:
+            result['field'] = slot_start + k
+        results.append(result)
+    return results
+
+
+def _run_recording(loader, recording_id, frames):
+    """处理一整段录制"""
+    recording = loader.load_recording(recording_id)
+    pipeline = RiskFieldPipeline(_worker_state['model'], recording, _worker_state['outputs'],
+                                 _worker_state['probes'], frames)
+    results = []
+    for result in pipeline:
+        result['recording'] = recording_id
+        results.append(result)
+    return results
+
+
+class ParallelRiskRunner:
+    """
+    进程池并行执行器
+
+    - run_frames: 把一个帧源的帧按frames_per_task分块分发给各进程
+    - run_recordings: 每个任务处理一段完整录制
+    结果按顺序生成；同时在途的任务不超过 max_inflight 个，避免结果堆积在内存中。
+
+    共享内存模式下结果中的field默认是输出槽的副本。copy_fields=False 时field是槽的只读视图，
+    需要在 with ParallelRiskRunner(...) as runner 中使用：共享内存在退出with时才释放，
+    但槽会被后续任务复用，视图只在取下一个结果之前有效。
+    """
+
+    def __init__(self, model, n_workers=None, outputs=('summary',), probes=None,
+                 frames_per_task=64, max_inflight=None, mp_context=None,
+                 shared_memory=False, copy_fields=True):
+        """
+        Parameters:
+        model: RiskFieldModel实例，只传递其get_config()给工作进程
+        n_workers: 进程数，默认os.cpu_count()
+        outputs, probes: 每帧的输出（同RiskFieldPipeline）
+        frames_per_task: run_frames中每个任务的帧数
+        max_inflight: 同时在途的任务数，默认 2 × n_workers
+        mp_context: multiprocessing上下文（如 multiprocessing.get_context("spawn")）
+        shared_memory: 坐标网格和输出风险场使用共享内存（run_frames的field输出写入预分配槽）
+        copy_fields: 共享内存模式下是否复制输出槽（默认）；为False时结果中的field是槽的只读视图，
+                     只在取下一个结果之前有效，且只能在with语句中使用
+        """
+        self.model = model
+        self.model_config = model.get_config()
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.outputs = tuple(outputs)
+        self.probes = probes
+        self.frames_per_task = frames_per_task
+        self.max_inflight = max_inflight or 2 * self.n_workers
+        self.mp_context = mp_context
+        self.shared_memory = shared_memory
+        self.copy_fields = copy_fields
+        self._open = False
+        self._buffers = []
+
+    def __enter__(self):
+        self._open = True
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """释放copy_fields=False时保留的共享内存（之后不能再访问此前结果中的field视图）"""
+        self._open = False
+        for buffers in self._buffers:
+            buffers.close()
+        self._buffers = []
+
+    def _executor(self, source=None, source_factory=None, buffers=None):
+        shared_spec = buffers.spec() if buffers is not None else None
+        return ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=self.mp_context,
+            initializer=_init_worker,
+            initargs=(self.model_config, self.outputs, self.probes, source, source_factory,
+                      shared_spec)
+        )
+
+    def _ordered(self, executor, tasks):
+        """提交任务并按顺序生成结果，在途任务数不超过max_inflight"""
+        pending = deque()
+        for fn, args in tasks:
+            pending.append(executor.submit(fn, *args))
+            if len(pending) >= self.max_inflight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def run_frames(self, source=None, frames=None, source_factory=None):
+        """
+        并行处理一个帧源的所有帧，按帧顺序生成结果字典
+
+        Parameters:
+        source: 帧源对象（随进程初始化传给每个进程一次）
+        frames: 要处理的帧号，默认source.frames()
+        source_factory: 可选的无参可调用对象，在每个工作进程中创建帧源
+                        （如 functools.partial(loader.load_recording, 1)），避免传输大数组
+        """
+        if frames is None:
+            if source is None:
+                raise ValueError("使用source_factory时需要显式提供frames")
+            frames = source.frames()
+        frames = list(frames)
+
+        chunks = [frames[i:i + self.frames_per_task]
+                  for i in range(0, len(frames), self.frames_per_task)]
+
+        if not self.shared_memory:
+            with self._executor(source, source_factory) as executor:
+                tasks = ((_run_frame_chunk, (chunk,)) for chunk in chunks)
+                for chunk_results in self._ordered(executor, tasks):
+                    yield from chunk_results
+            return
+
+        # 共享内存模式：每个在途任务占用一组输出槽，按任务序号循环使用
+        # （第i个任务的槽在其结果被取走后才会分配给第 i + max_inflight 个任务）
+        n_slots = self.max_inflight * self.frames_per_task if 'field' in self.outputs else 1
+        views = 'field' in self.outputs and not self.copy_fields
+        if views and not self._open:
+            raise ValueError("copy_fields=False 时需要在 with ParallelRiskRunner(...) 中使用，"
+                             "保证共享内存在结果使用期间有效")
+        buffers = SharedGridBuffers(self.model, n_slots)
+        if not views:
+            with buffers:
+                yield from self._run_shared(buffers, chunks, source, source_factory)
+            return
+        # 视图引用的共享内存保留到runner关闭
+        self._buffers.append(buffers)
+        yield from self._run_shared(buffers, chunks, source, source_factory)
+
+    def _run_shared(self, buffers, chunks, source, source_factory):
+        """共享内存模式的run_frames：F_total写入输出槽，按copy_fields复制或返回只读视图"""
+        with self._executor(source, source_factory, buffers) as executor:
+            tasks = (
+                (_run_frame_chunk,
+                 (chunk, (i % self.max_inflight) * self.frames_per_task
+                  if 'field' in self.outputs else None))
+                for i, chunk in enumerate(chunks)
+            )
+            for chunk_results in self._ordered(executor, tasks):
+                for result in chunk_results:
+                    if 'field' in result:
+                        field = buffers.fields[result['field']]
+                        if self.copy_fields:
+                            field = field.copy()
+                        else:
+                            field = field.view()
+                            field.flags.writeable = False
+                        result['field'] = field
+                    yield result
+
+    def run_recordings(self, loader, recording_ids, frames=None):
+        """
+        并行处理多段录制，按recording_ids顺序生成 (recording_id, 结果列表)
+
+        共享内存模式下只共享坐标网格，每段录制的结果仍按普通方式返回
+
+        Parameters:
+        loader: 可序列化的加载器（如HighDDataLoader），在工作进程中调用load_recording
+        recording_ids: 录制编号列表
+        frames: 每段录制中要处理的帧号，默认全部
+        """
+        recording_ids = list(recording_ids)
+        buffers = SharedGridBuffers(self.model, 1) if self.shared_memory else None
+        try:
+            with self._executor(buffers=buffers) as executor:
+                tasks = ((_run_recording, (loader, rid, frames)) for rid in recording_ids)
+                for rid, results in zip(recording_ids, self._ordered(executor, tasks)):
+                    yield rid, results
+        finally:
+            if buffers is not None:
+                buffers.close()
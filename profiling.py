@@ -0,0 +1,107 @@
+"""
+风险场计算的分阶段计时 - 可选的性能剖析钩子
+Stage Profiler for Risk Field Model
+
+RiskFieldModel.enable_profiling() 之后，模型在各阶段结束时调用 StageProfiler.mark，
+记录累计时间、调用次数和处理的网格点数；每个场景结束时生成一份统计并可回调。
+未启用时模型中的profiler为None，每个阶段只多一次None判断。
+
+阶段名称：
+- arclen_calc / a_calc / sigma_calc / z_calc: gaussian_3d_torus_functions对应的计算
+  （批量核、工作区核和逐车的field_straight/field_turn中都按相同名称计时）
+- nan_scrub: NaN清零
+- accumulate: 多车结果累加
+- fused_kernel / separable_kernel / template_stamp: 融合后端、可分离核、模板叠加（不再细分）
+- scene.static_layers / scene.dynamic / scene.combine: 场景级阶段（包含上面的核阶段）
+- scene: 整个场景
+"""
+
+import threading
+import time
+
+
+class StageProfiler:
+    """
+    分阶段计时器
+
+    tiled引擎中多个线程同时计时，各阶段时间为所有线程之和（可能超过墙钟时间）。
+    """
+
+    def __init__(self, callback=None):
+        """
+        Parameters:
+        callback: 可选，每个场景结束时以该场景的统计字典调用
+        """
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._scene = {}
+        self._totals = {}
+        self.scenes = 0
+        self.last_scene = {}
+
+    @staticmethod
+    def now():
+        return time.perf_counter()
+
+    def mark(self, name, start, cells=0):
+        """记录阶段name从start到现在的时间，返回当前时间（作为下一阶段的起点）"""
+        now = time.perf_counter()
+        with self._lock:
+            entry = self._scene.get(name)
+            if entry is None:
+                entry = self._scene[name] = [0.0, 0, 0]
+            entry[0] += now - start
+            entry[1] += 1
+            entry[2] += int(cells)
+        return now
+
+    @staticmethod
+    def _format(entries):
+        return {
+            name: {
+                'time': seconds,
+                'calls': calls,
+                'cells': cells,
+                'cells_per_s': cells / seconds if seconds > 0 else 0.0
+            }
+            for name, (seconds, calls, cells) in entries.items()
+        }
+
+    def end_scene(self):
+        """结束当前场景：更新累计统计、保存last_scene并调用callback"""
+        with self._lock:
+            scene, self._scene = self._scene, {}
+            for name, (seconds, calls, cells) in scene.items():
+                entry = self._totals.setdefault(name, [0.0, 0, 0])
+                entry[0] += seconds
+                entry[1] += calls
+                entry[2] += cells
+            self.scenes += 1
+        self.last_scene = self._format(scene)
+        if self.callback is not None:
+            self.callback(self.last_scene)
+        return self.last_scene
+
+    def stats(self):
+        """所有已结束场景的累计统计"""
+        with self._lock:
+            return self._format(self._totals)
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._scene = {}
+            self._totals = {}
+            self.scenes = 0
+        self.last_scene = {}
+
+    def report(self, stats=None):
+        """按时间排序的文本报告"""
+        stats = self.stats() if stats is None else stats
+        # 表头的中文字符占两列，宽度相应减小
+        lines = [f"⏱️  分阶段计时（{self.scenes} 个场景）",
+                 f"   {'阶段':<20}{'时间[ms]':>10}{'调用':>7}{'网格点':>11}{'M点/秒':>8}"]
+        for name, entry in sorted(stats.items(), key=lambda item: item[1]['time'], reverse=True):
+            lines.append(f"   {name:<22}{entry['time'] * 1e3:>12.2f}{entry['calls']:>9}"
+                         f"{entry['cells']:>14}{entry['cells_per_s'] / 1e6:>10.1f}")
+        return "\n".join(lines)
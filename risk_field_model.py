@@ -12,7 +12,18 @@ from matplotlib import cm
 import pandas as pd
 from scipy.interpolate import griddata
 from mpl_toolkits.mplot3d import Axes3D
+import os
+import threading
+import tracemalloc
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from numpy.lib.stride_tricks import as_strided
+import kernel_backends
+from field_templates import FieldTemplateBank
+from memory_budget import parse_memory_size, plan_memory
+from profiling import StageProfiler
+from sparse_field import SparseRiskField
+from workspace import Workspace
 warnings.filterwarnings('ignore')
 
 class RiskFieldModel:
@@ -20,7 +31,19 @@ class RiskFieldModel:
     主要的风险场模型类，用于计算和可视化驾驶风险场
     """
     
-    def __init__(self, performance_mode="balanced"):
+    CONFIG_PARAMS = (
+        'X_length', 'Y_length', 'delta_en',
+        'm_obj', 'beta_obj', 'L_obj', 'K_obj', 'delta_max',
+        'Sr', 'par1', 'mcexp', 'cexp', 'kexp1', 'kexp2', 'tla',
+        'engine', 'chunk_size', 'batch_cell_budget', 'window_tol', 'straight_kernel', 'cache_static',
+        'n_threads', 'tile_size', 'dtype', 'dense_grid', 'use_workspace',
+        'backend', 'max_memory'
+    )
+    
+    def __init__(self, performance_mode="balanced", engine="batched", chunk_size=None,
+                 window_tol=1e-6, straight_kernel="arc", cache_static=True,
+                 n_threads=None, tile_size=None, dtype="float64", dense_grid=True,
+                 use_workspace=True, backend="numpy", max_memory=None):
         """
         初始化模型参数
         
@@ -28,6 +51,36 @@ class RiskFieldModel:
         - fast: 适合MacBook Air等轻量级设备，快速预览
         - balanced: 平衡速度和精度（默认）
         - accurate: 高精度，需要较强计算能力
+        
+        engine: 场景风险场的计算引擎
+        - batched: 所有车辆组成 (N, 参数) 数组，分批广播计算（默认）
+        - windowed: 每辆车只在其支撑区域（包围盒）内计算并原地累加
+        - tiled: 网格沿x方向分块，由线程池并行计算（适合高精度、长道路的单个场景）
+        - loop: 逐车调用field_straight/field_turn（参考实现）
+        chunk_size: batched引擎每批同时计算的车辆数，None时按batch_cell_budget自动确定
+        window_tol: windowed引擎的截断阈值，包围盒外单车风险值均小于该值
+        straight_kernel: 直行车辆使用的核
+        - arc: 与field_straight相同的圆弧计算（默认）
+        - separable: 直行极限下的可分离闭式核（field_straight_separable）
+        - template: 按速度分桶预计算的风险场模板平移叠加（FieldTemplateBank）
+        cache_static: 是否缓存固定自车与转弯车辆的背景风险场（loop引擎不使用缓存）
+        n_threads: tiled引擎的线程数，None时使用CPU核数
+        tile_size: tiled引擎每块的列数，None时按tile_cell_budget自动确定
+        dtype: 网格与风险场的浮点类型，"float64"（默认）或 "float32"
+        - float32: 临时数组和输出减半；核改用车辆相对坐标求弧长和环距，
+          避免直行车辆约10^7 m的转弯半径在单精度下相消（误差见precision_report）
+        dense_grid: 是否保存完整的 X_en/Y_en 网格；为False时二者是一维坐标的广播视图，不占网格内存
+        use_workspace: batched/windowed/tiled引擎的核是否把中间结果写入可复用的Workspace
+                       （每个线程一个，稳态下每帧不再分配网格大小的临时数组）
+        backend: 环面核的计算后端（见kernel_backends）
+        - numpy: 逐元素NumPy运算（默认）
+        - numba: 单个网格点上的全部计算和多车累加融合为一个并行循环（需要安装numba）
+        max_memory: 场景计算的内存预算，如 "512MB"、"2GiB" 或字节数；None时不限制
+        - 扣除网格大小的常驻数组后，剩余预算决定核每次计算的网格点数（分批、分块、分列，见memory_budget）
+        - 预算不足以容纳当前网格时抛出ValueError；memory_report() 给出实测峰值
+        
+        省内存模式：dtype="float32", dense_grid=False，并用
+        calculate_scene_risk_field(..., total_only=True) 只返回F_total
         """
         # 空间网格参数 - 根据性能模式调整
         self.X_length = 100.0  # 道路长度 [m]
@@ -57,14 +110,73 @@ class RiskFieldModel:
         self.kexp2 = 2
         self.tla = 2.75
         
+        # 计算引擎参数
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.batch_cell_budget = 2 ** 17  # 每批 (车辆数 × 网格点数) 上限，约1MB/临时数组
+        self.window_tol = window_tol
+        self.straight_kernel = straight_kernel
+        self.cache_static = cache_static
+        self._static_cache = None
+        self._sparse_static = None
+        self._template_bank = None
+        self.n_threads = n_threads
+        self.tile_size = tile_size
+        self.tile_cell_budget = 2 ** 15  # 每块网格点数，约256KB/临时数组，适合L2缓存
+        self._thread_pool = None
+        self._thread_pool_size = 0
+        if dtype not in ("float64", "float32"):
+            raise ValueError(f"不支持的数据类型: {dtype}")
+        self.dtype = dtype
+        self.dense_grid = dense_grid
+        self.use_workspace = use_workspace
+        self._workspaces = threading.local()
+        kernel_backends.check_backend(backend)
+        self.backend = backend
+        self.max_memory = None if max_memory is None else parse_memory_size(max_memory)
+        self.profiler = None  # 分阶段计时（enable_profiling），None时不计时
+        self._relative_form = False  # float64下也使用车辆相对坐标形式的核（precision_report的参考模型）
+        
         # 创建空间网格
         self.create_spatial_grid()
         
+    def get_config(self):
+        """返回重建模型所需的参数字典（不含网格和缓存，便于传给子进程）"""
+        return {name: getattr(self, name) for name in self.CONFIG_PARAMS}
+    
+    @classmethod
+    def from_config(cls, config):
+        """根据get_config的结果重建模型并创建网格"""
+        model = cls()
+        for name, value in config.items():
+            setattr(model, name, value)
+        model.create_spatial_grid()
+        return model
+    
     def create_spatial_grid(self):
-        """创建空间网格"""
-        x = np.arange(0, self.X_length + self.delta_en, self.delta_en)
-        y = np.arange(0, self.Y_length + self.delta_en, self.delta_en)
-        self.X_en, self.Y_en = np.meshgrid(x, y)
+        """创建空间网格（dense_grid为False时X_en/Y_en为一维坐标的只读广播视图）"""
+        x = np.arange(0, self.X_length + self.delta_en, self.delta_en).astype(self.dtype)
+        y = np.arange(0, self.Y_length + self.delta_en, self.delta_en).astype(self.dtype)
+        if self.dense_grid:
+            self.X_en, self.Y_en = np.meshgrid(x, y)
+        else:
+            shape = (len(y), len(x))
+            self.X_en = np.broadcast_to(x[None, :], shape)
+            self.Y_en = np.broadcast_to(y[:, None], shape)
+        self.x_en = x
+        self.y_en = y
+        # 尽早检查内存预算能否容纳新网格
+        self.memory_plan()
+    
+    def use_grid(self, X_en, Y_en):
+        """
+        使用外部提供的网格（如共享内存中的网格）代替create_spatial_grid，不复制数据
+        """
+        self.X_en = X_en
+        self.Y_en = Y_en
+        self.x_en = X_en[0]
+        self.y_en = Y_en[:, 0]
+        self.memory_plan()
         
     def gaussian_3d_torus_functions(self):
         """实现高斯3D环面函数集合（与原MATLAB代码对应）"""
@@ -196,14 +308,7 @@ class RiskFieldModel:
         mexp1 = funcs['mexp_calc'](self.kexp1, self.mcexp, delta, speed)
         mexp2 = funcs['mexp_calc'](self.kexp2, self.mcexp, delta, speed)
         
-        arc_len = funcs['arclen_calc'](self.X_en, self.Y_en, x, y, delta, xc, yc, R)
-        a = funcs['a_calc'](arc_len, self.par1, dla)
-        sigma1 = funcs['sigma_calc'](arc_len, mexp1, self.cexp)
-        sigma2 = funcs['sigma_calc'](arc_len, mexp2, self.cexp)
-        
-        Z = funcs['z_calc'](self.X_en, self.Y_en, xc, yc, R, a, sigma1, sigma2)
-        
-        return Z
+        return self._torus_stages(funcs, x, y, delta, xc, yc, R, dla, mexp1, mexp2)
     
     def field_turn(self, vehicle_params):
         """
@@ -232,24 +337,698 @@ class RiskFieldModel:
         mexp1 = funcs['mexp_calc'](self.kexp1, self.mcexp, delta, speed)
         mexp2 = funcs['mexp_calc'](self.kexp2, self.mcexp, delta, speed)
         
+        return self._torus_stages(funcs, x, y, delta, xc, yc, R, dla, mexp1, mexp2)
+    
+    def _torus_stages(self, funcs, x, y, delta, xc, yc, R, dla, mexp1, mexp2):
+        """field_straight/field_turn共用的弧长、a、sigma、风险值计算（启用profiler时逐阶段计时）"""
+        prof = self.profiler
+        t = prof.now() if prof is not None else 0.0
         arc_len = funcs['arclen_calc'](self.X_en, self.Y_en, x, y, delta, xc, yc, R)
+        if prof is not None:
+            t = prof.mark('arclen_calc', t, arc_len.size)
         a = funcs['a_calc'](arc_len, self.par1, dla)
+        if prof is not None:
+            t = prof.mark('a_calc', t, arc_len.size)
         sigma1 = funcs['sigma_calc'](arc_len, mexp1, self.cexp)
         sigma2 = funcs['sigma_calc'](arc_len, mexp2, self.cexp)
+        if prof is not None:
+            t = prof.mark('sigma_calc', t, arc_len.size)
         
         Z = funcs['z_calc'](self.X_en, self.Y_en, xc, yc, R, a, sigma1, sigma2)
+        if prof is not None:
+            prof.mark('z_calc', t, Z.size)
         
         return Z
     
-    def calculate_scene_risk_field(self, vehicles_data):
+    def vehicle_param_array(self, vehicles, full_params=False):
         """
-        计算整个场景的风险场（复现MATLAB主函数逻辑）
+        将车辆列表转换为 (N, 9) 参数数组，列顺序同field_straight的vehicle_params
+
+        Parameters:
+        vehicles: 车辆列表或数组，每行至少包含 [id, x, y, speed]
+        full_params: 默认只取每行前4列，质量、轴距等用模型默认参数（与loop引擎一致，
+                     数据行中其余的列如车长、车宽等被忽略）；
+                     为True时不少于9列的行使用其第5~9列的参数（scene_static_vehicles的格式）
+        """
+        defaults = [self.m_obj, self.beta_obj, self.L_obj, self.K_obj, self.delta_max]
+        if isinstance(vehicles, np.ndarray) and vehicles.ndim == 2 and vehicles.shape[1] >= 4:
+            params = np.empty((vehicles.shape[0], 9))
+            if full_params and vehicles.shape[1] >= 9:
+                params[:] = vehicles[:, :9]
+            else:
+                params[:, :4] = vehicles[:, :4]
+                params[:, 4:] = defaults
+            return params
+
+        rows = [vehicle for vehicle in vehicles if len(vehicle) >= 4]
+        params = np.empty((len(rows), 9))
+        for i, vehicle in enumerate(rows):
+            if full_params and len(vehicle) >= 9:
+                params[i] = vehicle[:9]
+            else:
+                params[i, :4] = vehicle[:4]
+                params[i, 4:] = defaults
+        return params
+    
+    def _vehicle_terms(self, vehicle_params, steering_angle):
+        """
+        向量化计算每辆车与网格无关的参数（delta, dla, R, 圆心, mexp）
+        
+        与field_straight/field_turn中的标量处理逐项对应，返回长度为N的数组字典
+        """
+        funcs = self.gaussian_3d_torus_functions()
+        params = np.atleast_2d(np.asarray(vehicle_params, dtype=float))
+        n = params.shape[0]
+        
+        x = params[:, 1]
+        y = params[:, 2]
+        speed = params[:, 3]
+        L = params[:, 6]
+        
+        # 转换速度单位 (大于50视为km/h)
+        speed = np.where(speed > 50, speed / 3.6, speed)
+        
+        steering_angle = np.broadcast_to(np.asarray(steering_angle, dtype=float), (n,))
+        delta_fut_h = (np.pi / 180) * steering_angle / self.Sr
+        delta = np.where(np.abs(delta_fut_h) < 1e-8, 1e-8, delta_fut_h)
+        phiv = funcs['phiv_process'](0.0)
+        dla = np.maximum(self.tla * speed, 1)
+        R = funcs['R_calc'](L, delta)
+        phil = np.where(delta > 0, phiv + np.pi / 2, phiv - np.pi / 2)
+        xc = R * np.cos(phil) + x
+        yc = R * np.sin(phil) + y
+        
+        return {
+            'x': x,
+            'y': y,
+            'delta': delta,
+            'dla': dla,
+            'R': R,
+            'xc': xc,
+            'yc': yc,
+            'mexp1': funcs['mexp_calc'](self.kexp1, self.mcexp, delta),
+            'mexp2': funcs['mexp_calc'](self.kexp2, self.mcexp, delta)
+        }
+    
+    def torus_field_batch(self, vehicle_params, X, Y, steering_angle=0.001):
+        """
+        同时计算N辆车在坐标 (X, Y) 处的风险场，返回形状 (N,) + X.shape 的数组
+        
+        X, Y 可以是网格、点列或任意可广播的坐标数组；NaN已置为0。
+        计算精度由self.dtype决定（float32时使用车辆相对坐标的稳定形式）
+        """
+        funcs = self.gaussian_3d_torus_functions()
+        X = np.asarray(X, dtype=self.dtype)
+        Y = np.asarray(Y, dtype=self.dtype)
+        terms = self._vehicle_terms(vehicle_params, steering_angle)
+        # 车辆到圆心的向量在双精度下求出后再转换，避免单精度下大数相减
+        terms['ux'] = terms['x'] - terms['xc']
+        terms['uy'] = terms['y'] - terms['yc']
+        
+        # 每车参数扩展为 (N, 1, ..., 1) 以便与坐标数组广播
+        shape = (-1,) + (1,) * np.broadcast(X, Y).ndim
+        t = {key: value.astype(self.dtype).reshape(shape) for key, value in terms.items()}
+        ux, uy = t['ux'], t['uy']
+        prof = self.profiler
+        start = prof.now() if prof is not None else 0.0
+        
+        if not self._uses_relative_form():
+            # 弧长（arclen_calc），到圆心的距离只计算一次，供弧长和z_calc共用
+            mag_u = np.sqrt(ux ** 2 + uy ** 2)
+            dxc = X - t['xc']
+            dyc = Y - t['yc']
+            dist_R = np.sqrt(dxc ** 2 + dyc ** 2)
+            costheta = (ux * dxc + uy * dyc) / (mag_u * dist_R)
+            theta_abs = np.arccos(np.clip(costheta, -1, 1))
+            sign_theta = np.sign(ux * dyc - dxc * uy)
+            # theta_pos_neg ∈ [-π, π]，remainder(2π + θ, 2π) 等价于负角加2π
+            theta_pos_neg = np.sign(t['delta']) * sign_theta * theta_abs
+            ring = dist_R - t['R']
+        else:
+            # 车辆相对坐标形式（float32）：以车辆为原点 d = (X - x, Y - y)，|u + d|^2 - R^2 = 2 u·d + |d|^2，
+            # 环距和夹角都不再需要相减两个约R大小的数；夹角用arctan2代替arccos
+            dx = X - t['x']
+            dy = Y - t['y']
+            ud = ux * dx + uy * dy
+            q = 2 * ud + dx ** 2 + dy ** 2
+            R2 = t['R'] ** 2
+            ring = q / (np.sqrt(R2 + q) + t['R'])
+            theta_pos_neg = np.arctan2(np.sign(t['delta']) * (ux * dy - dx * uy), R2 + ud)
+        theta = np.where(theta_pos_neg < 0, theta_pos_neg + 2 * np.pi, theta_pos_neg)
+        arc_len = t['R'] * theta
+        if prof is not None:
+            start = prof.mark('arclen_calc', start, arc_len.size)
+        
+        a = funcs['a_calc'](arc_len, self.par1, t['dla'])
+        if prof is not None:
+            start = prof.mark('a_calc', start, arc_len.size)
+        sigma1 = funcs['sigma_calc'](arc_len, t['mexp1'], self.cexp)
+        sigma2 = funcs['sigma_calc'](arc_len, t['mexp2'], self.cexp)
+        if prof is not None:
+            start = prof.mark('sigma_calc', start, arc_len.size)
+        
+        # z_calc：环内用sigma1、环外用sigma2，两者合并为一次exp；
+        # dist_R == R 时两侧各占一半，与原实现一致（此时指数为0）
+        den = np.where(ring < 0, 2 * sigma1 ** 2, 2 * sigma2 ** 2)
+        Z = a * np.exp(-(ring ** 2) / den)
+        if prof is not None:
+            start = prof.mark('z_calc', start, Z.size)
+        Z[np.isnan(Z)] = 0
+        if prof is not None:
+            prof.mark('nan_scrub', start, Z.size)
+        return Z
+    
+    def _torus_accumulate(self, vehicle_params, X, Y, steering_angle, out, workspace):
+        """
+        与torus_field_batch逐元素相同的计算，N辆车之和直接累加到out
+        
+        所有中间结果用 out= 写入workspace的缓冲区，不分配新数组；
+        风险值非负，NaN清零改为原地 fmax(Z, 0)，不再生成NaN掩码并做花式索引。
+        """
+        ws = workspace
+        X = np.asarray(X, dtype=self.dtype)
+        Y = np.asarray(Y, dtype=self.dtype)
+        terms = self._vehicle_terms(vehicle_params, steering_angle)
+        terms['ux'] = terms['x'] - terms['xc']
+        terms['uy'] = terms['y'] - terms['yc']
+        
+        ndim = np.broadcast(X, Y).ndim
+        t = {key: value.astype(self.dtype).reshape((-1,) + (1,) * ndim)
+             for key, value in terms.items()}
+        ux, uy, R = t['ux'], t['uy'], t['R']
+        sign_delta = np.sign(t['delta'])
+        
+        shape = np.broadcast_shapes(R.shape, X.shape, Y.shape)
+        xshape = np.broadcast_shapes(R.shape, X.shape)
+        yshape = np.broadcast_shapes(R.shape, Y.shape)
+        ring = ws.array('ring', shape)
+        theta = ws.array('theta', shape)
+        tmp = ws.array('tmp', shape)
+        Z = ws.array('z', shape)
+        mask = ws.array('mask', shape, bool)
+        sx = ws.array('sx', xshape)
+        sy = ws.array('sy', yshape)
+        prof = self.profiler
+        start = prof.now() if prof is not None else 0.0
+        
+        if not self._uses_relative_form():
+            dxc = np.subtract(X, t['xc'], out=ws.array('dx', xshape))
+            dyc = np.subtract(Y, t['yc'], out=ws.array('dy', yshape))
+            # dist_R（暂存于ring）
+            np.add(np.multiply(dxc, dxc, out=sx), np.multiply(dyc, dyc, out=sy), out=ring)
+            np.sqrt(ring, out=ring)
+            # theta_abs = arccos(u·v / (|u| |v|))
+            np.add(np.multiply(ux, dxc, out=sx), np.multiply(uy, dyc, out=sy), out=theta)
+            mag_u = np.sqrt(ux ** 2 + uy ** 2)
+            np.divide(theta, np.multiply(mag_u, ring, out=tmp), out=theta)
+            np.clip(theta, -1, 1, out=theta)
+            np.arccos(theta, out=theta)
+            # theta_pos_neg = sign(delta) * sign(u × v) * theta_abs
+            np.subtract(np.multiply(ux, dyc, out=sy), np.multiply(dxc, uy, out=sx), out=tmp)
+            np.sign(tmp, out=tmp)
+            np.multiply(sign_delta, tmp, out=tmp)
+            np.multiply(tmp, theta, out=theta)
+            np.subtract(ring, R, out=ring)
+        else:
+            # 车辆相对坐标形式，同torus_field_batch
+            dx = np.subtract(X, t['x'], out=ws.array('dx', xshape))
+            dy = np.subtract(Y, t['y'], out=ws.array('dy', yshape))
+            # u·d（暂存于theta）与 q = 2 u·d + |d|^2（暂存于ring）
+            np.add(np.multiply(ux, dx, out=sx), np.multiply(uy, dy, out=sy), out=theta)
+            np.multiply(2, theta, out=ring)
+            np.add(ring, np.multiply(dx, dx, out=sx), out=ring)
+            np.add(ring, np.multiply(dy, dy, out=sy), out=ring)
+            R2 = R ** 2
+            np.add(R2, ring, out=tmp)
+            np.sqrt(tmp, out=tmp)
+            np.add(tmp, R, out=tmp)
+            np.divide(ring, tmp, out=ring)
+            np.subtract(np.multiply(ux, dy, out=sy), np.multiply(dx, uy, out=sx), out=tmp)
+            np.multiply(sign_delta, tmp, out=tmp)
+            np.add(R2, theta, out=theta)
+            np.arctan2(tmp, theta, out=theta)
+        
+        # 负角加2π后乘R得到弧长
+        np.less(theta, 0, out=mask)
+        np.add(theta, 2 * np.pi, out=theta, where=mask)
+        np.multiply(R, theta, out=theta)
+        arc_len = theta
+        if prof is not None:
+            start = prof.mark('arclen_calc', start, Z.size)
+        
+        # a_calc：弧长超过dla处为0，弧长为0处取一半
+        np.subtract(arc_len, t['dla'], out=Z)
+        np.multiply(Z, Z, out=Z)
+        np.multiply(self.par1, Z, out=Z)
+        np.copyto(Z, 0, where=np.greater_equal(arc_len, t['dla'], out=mask))
+        np.multiply(Z, 0.5, out=Z, where=np.equal(arc_len, 0, out=mask))
+        if prof is not None:
+            start = prof.mark('a_calc', start, Z.size)
+        
+        # 2 * sigma^2：环内用sigma1、环外用sigma2（kexp1 == kexp2时两者相同）
+        den = tmp
+        np.multiply(t['mexp1'], arc_len, out=den)
+        np.add(den, self.cexp, out=den)
+        np.multiply(den, den, out=den)
+        np.multiply(2, den, out=den)
+        if not np.array_equal(t['mexp1'], t['mexp2']):
+            den2 = np.multiply(t['mexp2'], arc_len, out=ws.array('den2', shape))
+            np.add(den2, self.cexp, out=den2)
+            np.multiply(den2, den2, out=den2)
+            np.multiply(2, den2, out=den2)
+            np.less(ring, 0, out=mask)
+            np.logical_not(mask, out=mask)
+            np.copyto(den, den2, where=mask)
+        if prof is not None:
+            start = prof.mark('sigma_calc', start, Z.size)
+        
+        # Z = a * exp(-ring^2 / den)，NaN清零后累加
+        np.multiply(ring, ring, out=ring)
+        np.negative(ring, out=ring)
+        np.divide(ring, den, out=ring)
+        np.exp(ring, out=ring)
+        np.multiply(Z, ring, out=Z)
+        if prof is not None:
+            start = prof.mark('z_calc', start, Z.size)
+        np.fmax(Z, 0, out=Z)
+        if prof is not None:
+            start = prof.mark('nan_scrub', start, Z.size)
+        if Z.shape[0] == 1:
+            np.add(out, Z[0], out=out)
+        else:
+            np.add(out, np.sum(Z, axis=0, out=ws.array('sum', shape[1:])), out=out)
+        if prof is not None:
+            prof.mark('accumulate', start, Z.size)
+        return out
+    
+    def _backend_accumulate(self, vehicle_params, X, Y, steering_angle, out):
+        """
+        用self.backend的融合核把N辆车的风险场累加到out；
+        NumPy后端或坐标形式不受支持时返回False，由调用方使用NumPy核
+        """
+        if self.backend == "numpy":
+            return False
+        terms = self._vehicle_terms(vehicle_params, steering_angle)
+        terms['ux'] = terms['x'] - terms['xc']
+        terms['uy'] = terms['y'] - terms['yc']
+        terms['mag_u'] = np.sqrt(terms['ux'] ** 2 + terms['uy'] ** 2)
+        terms['sign_delta'] = np.sign(terms['delta'])
+        table = np.column_stack([terms[name] for name in kernel_backends.TERM_COLUMNS])
+        prof = self.profiler
+        start = prof.now() if prof is not None else 0.0
+        done = kernel_backends.numba_accumulate(table, X, Y, out, self.par1, self.cexp,
+                                                stable=self._uses_relative_form())
+        if done and prof is not None:
+            prof.mark('fused_kernel', start, len(table) * out.size)
+        return done
+    
+    def _uses_relative_form(self):
+        """
+        核是否使用车辆相对坐标形式（环距由 2 u·d + |d|^2 求得，弧长用arctan2）
+
+        float32必须使用该形式；float64默认使用与原实现相同的arccos形式，
+        两者在arccos饱和条带内不同（见precision_report）
+        """
+        return self.dtype != "float64" or self._relative_form
+    
+    def _batch_chunk_size(self, cells):
+        """根据每批网格点预算（设置max_memory时不超过block_cells）确定一次同时计算的车辆数"""
+        if self.chunk_size:
+            return int(self.chunk_size)
+        budget = self.batch_cell_budget
+        block = self._block_cells()
+        if block is not None:
+            budget = min(budget, block)
+        return max(1, int(budget // max(cells, 1)))
+    
+    def field_batch(self, vehicle_params, steering_angle=0.001, X=None, Y=None,
+                    chunk_size=None, out=None):
+        """
+        批量计算多辆车风险场之和（field_straight/field_turn的向量化版本）
+        
+        车辆按chunk_size分批广播计算，峰值内存约为 chunk_size × 网格大小 × 临时数组个数
         
         Parameters:
-        vehicles_data: 车辆数据列表，每个元素包含 [id, x, y, speed, ...]
+        vehicle_params: (N, 9) 参数数组，可由vehicle_param_array生成
+        steering_angle: 转向角度 [度]，0.001为直行（field_straight），5.0为转弯（field_turn）
+        X, Y: 计算坐标，默认使用X_en/Y_en
+        chunk_size: 每批车辆数，默认由_batch_chunk_size确定
+        out: 可选累加数组，结果原地加到out上
+        """
+        if X is None:
+            # 规则网格：用一维坐标广播，坐标差只需按行、列计算
+            X, Y = self.x_en[None, :], self.y_en[:, None]
+        shape = np.broadcast(np.asarray(X), np.asarray(Y)).shape
+        if out is None:
+            out = np.zeros(shape, dtype=self.dtype)
+        
+        params = np.atleast_2d(np.asarray(vehicle_params, dtype=float))
+        n = params.shape[0] if params.size else 0
+        if n == 0:
+            return out
+        
+        steering = np.broadcast_to(np.asarray(steering_angle, dtype=float), (n,))
+        # 融合核没有临时数组，不需要分批
+        if self._backend_accumulate(params, X, Y, steering, out):
+            return out
+        if chunk_size is None:
+            chunk_size = self._batch_chunk_size(int(np.prod(shape)))
+        
+        workspace = self.workspace if self.use_workspace else None
+        for start in range(0, n, chunk_size):
+            stop = start + chunk_size
+            self._accumulate_window(params[start:stop], X, Y, steering[start:stop], out, workspace)
+        
+        return out
+    
+    def field_straight_separable(self, vehicle_params, out=None):
+        """
+        直行车辆风险场的可分离闭式核（field_straight在直行极限下的形式）
+        
+        field_straight用0.001°转向角模拟直行，转弯半径约10^7 m，弧长由arccos求得，
+        精度受限。直行极限下弧长即纵向偏移 dx = X - x，到环面的距离即横向偏移 dy = Y - y，
+        因此 a、sigma1、sigma2 只需按列计算一次（且只在 0 <= dx <= dla 的列上），
+        横向项按行计算，最后一次广播exp合成。
+        
+        与field_straight的误差：在车辆所在列前后 |dx| < 0.25 m 的条带之外，逐点误差不超过
+        该车峰值 par1 * dla^2 的0.5%（实测约0.2%，来源于原实现arccos在小角度处的舍入）。
+        条带内（车辆前后两侧）原实现的arccos饱和为0，弧长取0，a取峰值的一半：
+        车辆后方本应为0处出现半权重的虚假值，前方本应接近峰值处只有一半；
+        本核给出直行极限下的真实值，两者在条带内相差可达峰值的50%。
+        
+        Parameters:
+        vehicle_params: (N, 9) 参数数组，可由vehicle_param_array生成
+        out: 可选累加数组，结果原地加到out上
+        """
+        if out is None:
+            out = np.zeros_like(self.X_en)
+        
+        params = np.atleast_2d(np.asarray(vehicle_params, dtype=float))
+        n = params.shape[0] if params.size else 0
+        if n == 0:
+            return out
+        
+        funcs = self.gaussian_3d_torus_functions()
+        terms = {key: value.astype(self.dtype)
+                 for key, value in self._vehicle_terms(params, 0.001).items()}
+        workspace = self.workspace if self.use_workspace else None
+        prof = self.profiler
+        start = prof.now() if prof is not None else 0.0
+        cells = 0
+        
+        for i in range(n):
+            x, y, dla = terms['x'][i], terms['y'][i], terms['dla'][i]
+            c0 = np.searchsorted(self.x_en, x, side='left')
+            c1 = np.searchsorted(self.x_en, x + dla, side='right')
+            if c0 >= c1:
+                continue
+            cells += len(self.y_en) * (c1 - c0)
+            
+            # 纵向项（每列一次）
+            dx = self.x_en[c0:c1] - x
+            a = funcs['a_calc'](dx, self.par1, dla)
+            den1 = 2 * funcs['sigma_calc'](dx, terms['mexp1'][i], self.cexp) ** 2
+            den2 = 2 * funcs['sigma_calc'](dx, terms['mexp2'][i], self.cexp) ** 2
+            
+            # 横向项（每行一次）；转向角为正时圆心在左侧，dy > 0 为环内
+            dy = (self.y_en - y)[:, None]
+            if terms['mexp1'][i] == terms['mexp2'][i]:
+                den = den1[None, :]
+            else:
+                den = np.where(dy > 0, den1[None, :], den2[None, :])
+            
+            if workspace is None:
+                out[:, c0:c1] += a * np.exp(-(dy ** 2) / den)
+                continue
+            patch = np.divide(-(dy ** 2), den, out=workspace.array('separable', (len(dy), c1 - c0)))
+            np.exp(patch, out=patch)
+            np.multiply(a, patch, out=patch)
+            np.add(out[:, c0:c1], patch, out=out[:, c0:c1])
+        
+        if prof is not None:
+            prof.mark('separable_kernel', start, cells)
+        return out
+    
+    def support_box(self, vehicle_params, steering_angle=0.001, tol=None):
+        """
+        计算每辆车风险场的支撑包围盒 (x_min, x_max, y_min, y_max)，各为长度N的数组
+        
+        风险场只在弧长 [0, dla] 内非零（a_calc），横向高斯在距环面
+        sigma * sqrt(2 ln(a / tol)) 之外小于tol；沿弧采样环形扇区的内外边界得到包围盒。
+        额外留出arccos在零角附近的饱和宽度 R * sqrt(8 eps)，保证与全网格结果一致。
+        """
+        tol = self.window_tol if tol is None else tol
+        terms = self._vehicle_terms(vehicle_params, steering_angle)
+        funcs = self.gaussian_3d_torus_functions()
+        
+        # 沿弧长采样 (N, S)
+        s = np.linspace(0, 1, 65)[None, :] * terms['dla'][:, None]
+        a = funcs['a_calc'](s, self.par1, terms['dla'][:, None])
+        a[:, 0] = self.par1 * terms['dla'] ** 2
+        sigma = np.maximum(funcs['sigma_calc'](s, terms['mexp1'][:, None], self.cexp),
+                           funcs['sigma_calc'](s, terms['mexp2'][:, None], self.cexp))
+        reach = sigma * np.sqrt(2 * np.log(np.maximum(a, tol) / tol))
+        
+        # 车辆相对圆心的向量绕圆心旋转 s / R（delta > 0 逆时针）
+        R = terms['R'][:, None]
+        ux = (terms['x'] - terms['xc'])[:, None]
+        uy = (terms['y'] - terms['yc'])[:, None]
+        phi = np.sign(terms['delta'])[:, None] * s / R
+        px = ux * np.cos(phi) - uy * np.sin(phi)
+        py = ux * np.sin(phi) + uy * np.cos(phi)
+        
+        # 环形扇区内外边界上的点（半径 R ± reach）
+        xs, ys = [], []
+        for radius in (np.maximum(R - reach, 0), R + reach):
+            xs.append(terms['xc'][:, None] + px * radius / R)
+            ys.append(terms['yc'][:, None] + py * radius / R)
+        xs = np.concatenate(xs, axis=1)
+        ys = np.concatenate(ys, axis=1)
+        
+        margin = terms['R'] * np.sqrt(8 * np.finfo(float).eps) + self.delta_en
+        return (xs.min(axis=1) - margin, xs.max(axis=1) + margin,
+                ys.min(axis=1) - margin, ys.max(axis=1) + margin)
+    
+    def _window_slices(self, x_min, x_max, y_min, y_max):
+        """将世界坐标包围盒转换为网格行、列切片"""
+        c0 = np.searchsorted(self.x_en, x_min, side='left')
+        c1 = np.searchsorted(self.x_en, x_max, side='right')
+        r0 = np.searchsorted(self.y_en, y_min, side='left')
+        r1 = np.searchsorted(self.y_en, y_max, side='right')
+        return slice(r0, r1), slice(c0, c1)
+    
+    def field_windowed(self, vehicle_params, steering_angle=0.001, tol=None, out=None):
+        """
+        逐车只在支撑包围盒对应的子网格上计算风险场，并原地累加到out
+        
+        包围盒外被忽略的单车风险值小于tol（默认self.window_tol）
+        """
+        if out is None:
+            out = np.zeros_like(self.X_en)
+        
+        params = np.atleast_2d(np.asarray(vehicle_params, dtype=float))
+        n = params.shape[0] if params.size else 0
+        if n == 0:
+            return out
+        
+        steering = np.broadcast_to(np.asarray(steering_angle, dtype=float), (n,))
+        boxes = self.support_box(params, steering, tol)
+        
+        workspace = self.workspace if self.use_workspace else None
+        for i in range(n):
+            rows, cols = self._window_slices(*(bound[i] for bound in boxes))
+            if rows.start >= rows.stop or cols.start >= cols.stop:
+                continue
+            self._accumulate_window(params[i:i + 1], self.x_en[None, cols], self.y_en[rows, None],
+                                    steering[i], out[rows, cols], workspace)
+        
+        return out
+    
+    def _accumulate_window(self, vehicle_params, X, Y, steering_angle, out, workspace):
+        """
+        把车辆在子网格 (X, Y) 上的风险场累加到out（融合核后端、工作区核或普通核）
+        
+        设置了max_memory且 车辆数 × 网格点数 超过memory_plan的block_cells时，
+        沿最后一维（x方向或点列）分段计算
+        """
+        if self._backend_accumulate(vehicle_params, X, Y, steering_angle, out):
+            return
+        block = self._block_cells()
+        n = len(vehicle_params)
+        if block is not None and n * out.size > block and out.shape[-1] > 1:
+            width = max(1, block // (n * (out.size // out.shape[-1])))
+            X, Y = np.asarray(X), np.asarray(Y)
+            for c0 in range(0, out.shape[-1], width):
+                cols = slice(c0, c0 + width)
+                X_part = X[..., cols] if X.shape[-1] > 1 else X
+                Y_part = Y[..., cols] if Y.shape[-1] > 1 else Y
+                self._accumulate_window(vehicle_params, X_part, Y_part, steering_angle,
+                                        out[..., cols], workspace)
+            return
+        if workspace is not None:
+            self._torus_accumulate(vehicle_params, X, Y, steering_angle, out, workspace)
+            return
+        Z = self.torus_field_batch(vehicle_params, X, Y, steering_angle)
+        prof = self.profiler
+        start = prof.now() if prof is not None else 0.0
+        out += Z.sum(axis=0)
+        if prof is not None:
+            prof.mark('accumulate', start, Z.size)
+    
+    def window_patch(self, vehicle_row, rows, cols, steering_angle=0.001):
+        """
+        计算单辆车在子网格 [rows, cols] 上的风险场，窗口为空时返回None
+        """
+        if rows.start >= rows.stop or cols.start >= cols.stop:
+            return None
+        X = self.x_en[None, cols]
+        Y = self.y_en[rows, None]
+        return self.torus_field_batch(np.atleast_2d(vehicle_row), X, Y, steering_angle)[0]
+    
+    def _tile_columns(self):
+        """tiled引擎每块的列数"""
+        if self.tile_size:
+            return int(self.tile_size)
+        budget = self.tile_cell_budget
+        block = self._block_cells()
+        if block is not None:
+            budget = min(budget, block)
+        return max(1, budget // len(self.y_en))
+    
+    def memory_plan(self):
+        """
+        max_memory对应的计算计划（见memory_budget.plan_memory），未设置预算时返回None
+        
+        返回 budget、resident_bytes（网格大小的常驻数组）、template_bytes（模板库容量）、threads、
+        kernel_bytes_per_cell、block_cells（每个线程一次核计算的最大 车辆数 × 网格点数）和estimated_peak
         """
+        if self.max_memory is None:
+            return None
+        return plan_memory(self, self.max_memory)
+    
+    def _block_cells(self):
+        """核每次计算的网格点上限，未设置max_memory时为None"""
+        if self.max_memory is None:
+            return None
+        return self.memory_plan()['block_cells']
+    
+    def memory_report(self, vehicles_data, engine=None):
+        """
+        实测一次场景计算的内存峰值
+        
+        清空背景层缓存、模板库和工作区后，用tracemalloc记录calculate_scene_risk_field期间
+        （含背景层和模板重算）分配的数组峰值，再加上坐标网格，得到模型实际达到的峰值（不含Python解释器与库本身的内存）。
+        
+        Returns:
+        dict: budget、estimated_peak（未设置max_memory时为None）、measured_peak、within_budget
+        """
+        self.clear_static_cache()
+        if self._template_bank is not None:
+            self._template_bank.clear()
+        self._workspaces = threading.local()
+        was_tracing = tracemalloc.is_tracing()
+        if was_tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        else:
+            tracemalloc.start()
+            base = 0
+        try:
+            self.calculate_scene_risk_field(vehicles_data, engine=engine)
+            peak = tracemalloc.get_traced_memory()[1] - base
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        
+        grid_bytes = self.x_en.nbytes + self.y_en.nbytes
+        if self.dense_grid:
+            grid_bytes += self.X_en.nbytes + self.Y_en.nbytes
+        measured = int(peak + grid_bytes)
+        plan = self.memory_plan()
+        return {
+            'budget': self.max_memory,
+            'estimated_peak': plan['estimated_peak'] if plan else None,
+            'measured_peak': measured,
+            'within_budget': self.max_memory is None or measured <= self.max_memory
+        }
+    
+    def _thread_executor(self):
+        """tiled引擎使用的线程池（首次使用时创建，线程数变化时重建）"""
+        n_threads = self.n_threads or os.cpu_count() or 1
+        if self._thread_pool is None or self._thread_pool_size != n_threads:
+            if self._thread_pool is not None:
+                self._thread_pool.shutdown(wait=True)
+            self._thread_pool = ThreadPoolExecutor(max_workers=n_threads)
+            self._thread_pool_size = n_threads
+        return self._thread_pool
+    
+    def enable_profiling(self, callback=None):
+        """
+        启用分阶段计时，返回StageProfiler
         
-        # 定义自车位置（对应MATLAB中的ego vehicles）
+        之后每个场景（calculate_scene_risk_field / calculate_sparse_risk_field）结束时，
+        profiler.last_scene 为该场景各阶段的时间、调用次数和网格点数，并以其调用callback；
+        profiler.stats() 为累计统计，profiler.report() 为文本报告。
+        """
+        self.profiler = StageProfiler(callback)
+        return self.profiler
+    
+    def disable_profiling(self):
+        """停止计时，返回此前的StageProfiler（其中的统计仍可读取）"""
+        profiler, self.profiler = self.profiler, None
+        return profiler
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_thread_pool'] = None
+        state['_workspaces'] = None
+        state['profiler'] = None
+        return state
+    
+    def field_tiled(self, vehicle_params, steering_angle=0.001, out=None):
+        """
+        网格沿x方向分块，线程池并行计算多辆车风险场之和
+        
+        每块只计算支撑包围盒（support_box）与该块相交的车辆，结果写入out的对应列（各块互不重叠）。
+        numpy的大数组运算会释放GIL，因此线程即可利用多核。
+        
+        Parameters:
+        vehicle_params: (N, 9) 参数数组，可由vehicle_param_array生成
+        steering_angle: 转向角度 [度]
+        out: 可选累加数组，结果原地加到out上
+        """
+        if out is None:
+            out = np.zeros_like(self.X_en)
+        
+        params = np.atleast_2d(np.asarray(vehicle_params, dtype=float))
+        n = params.shape[0] if params.size else 0
+        if n == 0:
+            return out
+        
+        steering = np.broadcast_to(np.asarray(steering_angle, dtype=float), (n,))
+        if self.backend != "numpy":
+            # 融合核自身按行并行，且numba的默认线程层不能被多个线程同时调用
+            return self.field_batch(params, steering, out=out)
+        x_min, x_max, _, _ = self.support_box(params, steering)
+        
+        nx = len(self.x_en)
+        tile = self._tile_columns()
+        Y = self.y_en[:, None]
+        
+        def run_tile(c0):
+            c1 = min(c0 + tile, nx)
+            selected = (x_max >= self.x_en[c0]) & (x_min <= self.x_en[c1 - 1])
+            if selected.any():
+                self.field_batch(params[selected], steering[selected],
+                                 X=self.x_en[None, c0:c1], Y=Y, out=out[:, c0:c1])
+        
+        list(self._thread_executor().map(run_tile, range(0, nx, tile)))
+        return out
+    
+    def scene_static_vehicles(self):
+        """
+        返回场景中固定的自车与转弯车辆（对应MATLAB中的ego vehicles和转弯车辆）
+        """
         ego_vehicles = [
             [1, 13, 6, 14, self.m_obj, self.beta_obj, self.L_obj, self.K_obj, self.delta_max],
             [1, 22.5, 5.75, 15, self.m_obj, self.beta_obj, self.L_obj, self.K_obj, self.delta_max],
@@ -257,17 +1036,445 @@ class RiskFieldModel:
             [1, 65, 6.5, 21, self.m_obj, self.beta_obj, self.L_obj, self.K_obj, self.delta_max]
         ]
         
-        # 定义转弯车辆
         turn_vehicles = [
             [1, 25, 6, 19.5, self.m_obj, self.beta_obj, self.L_obj, self.K_obj, self.delta_max]
         ]
         
+        return ego_vehicles, turn_vehicles
+    
+    @property
+    def workspace(self):
+        """当前线程的核工作区（首次使用时创建；tiled引擎的每个线程各有一个）"""
+        if self._workspaces is None:
+            self._workspaces = threading.local()
+        workspace = getattr(self._workspaces, 'workspace', None)
+        if workspace is None or workspace.dtype != np.dtype(self.dtype):
+            workspace = Workspace(self.dtype)
+            self._workspaces.workspace = workspace
+        return workspace
+    
+    @property
+    def template_bank(self):
+        """直行车辆风险场模板库（首次使用时创建）"""
+        if self._template_bank is None:
+            self._template_bank = FieldTemplateBank(self)
+        return self._template_bank
+    
+    def _accumulators(self, engine):
+        """返回 (通用累加函数, 直行车辆累加函数)"""
+        if engine == "batched":
+            accumulate = self.field_batch
+        elif engine == "windowed":
+            accumulate = self.field_windowed
+        elif engine == "tiled":
+            accumulate = self.field_tiled
+        else:
+            raise ValueError(f"未知的计算引擎: {engine}")
+        
+        if self.straight_kernel == "separable":
+            accumulate_straight = self.field_straight_separable
+        elif self.straight_kernel == "template":
+            accumulate_straight = self.template_bank.stamp
+        elif self.straight_kernel == "arc":
+            accumulate_straight = accumulate
+        else:
+            raise ValueError(f"未知的直行核: {self.straight_kernel}")
+        
+        return accumulate, accumulate_straight
+    
+    def _field_param_key(self):
+        """网格与风险场参数签名，用于判断缓存结果是否仍然有效"""
+        return (
+            self.X_en.shape, float(self.x_en[0]), float(self.x_en[-1]),
+            float(self.y_en[0]), float(self.y_en[-1]),
+            self.Sr, self.par1, self.mcexp, self.cexp, self.kexp1, self.kexp2, self.tla,
+            self.m_obj, self.beta_obj, self.L_obj, self.K_obj, self.delta_max, self.dtype,
+            self.window_tol
+        )
+    
+    def _static_cache_key(self, engine):
+        """背景层缓存键：网格、风险场参数、计算方式和固定车辆任一变化都会使缓存失效"""
+        ego_vehicles, turn_vehicles = self.scene_static_vehicles()
+        return (
+            engine, self.straight_kernel, self.window_tol, self.backend, self._uses_relative_form(),
+            self._field_param_key(),
+            tuple(tuple(v) for v in ego_vehicles), tuple(tuple(v) for v in turn_vehicles)
+        )
+    
+    def static_risk_layers(self, engine=None):
+        """
+        返回固定自车与转弯车辆的背景风险场 (F_ego_total, F_turn_total)
+        
+        两层只依赖模型参数和网格，计算一次后缓存；参数（如tla、par1、cexp）或网格变化时
+        根据_static_cache_key自动重算。返回的是缓存数组本身（只读）。
+        """
+        engine = engine or self.engine
+        key = self._static_cache_key(engine)
+        if self.cache_static and self._static_cache is not None and self._static_cache[0] == key:
+            return self._static_cache[1]
+        
+        accumulate, accumulate_straight = self._accumulators(engine)
+        ego_vehicles, turn_vehicles = self.scene_static_vehicles()
+        
+        F_ego_total = accumulate_straight(self.vehicle_param_array(ego_vehicles, full_params=True))
+        
+        # 转弯车辆：0.6 × 转弯场 + 0.5 × 直行场
+        turn_params = self.vehicle_param_array(turn_vehicles, full_params=True)
+        F_turn_total = 0.6 * accumulate(turn_params, steering_angle=5.0)
+        F_turn_total += 0.5 * accumulate_straight(turn_params)
+        
+        F_ego_total.setflags(write=False)
+        F_turn_total.setflags(write=False)
+        layers = (F_ego_total, F_turn_total)
+        if self.cache_static:
+            self._static_cache = (key, layers)
+        return layers
+    
+    def clear_static_cache(self):
+        """清除背景风险场缓存"""
+        self._static_cache = None
+    
+    def calculate_scene_risk_field(self, vehicles_data, engine=None, out=None, total_only=False):
+        """
+        计算整个场景的风险场（复现MATLAB主函数逻辑）
+        
+        Parameters:
+        vehicles_data: 车辆数据列表，每个元素包含 [id, x, y, speed, ...]
+        engine: 计算引擎，默认使用self.engine（"batched"、"windowed"、"tiled" 或 "loop"）
+        out: 可选的预分配数组，F_total直接写入其中（如共享内存输出槽）
+        total_only: 只返回F_total；动态车辆直接累加到F_total上，不再分配F_others
+        
+        固定的自车与转弯车辆背景层来自static_risk_layers缓存（只读数组），
+        每帧只计算vehicles_data中的动态车辆。
+        启用profiler（enable_profiling）时，每个场景结束后生成一份分阶段统计。
+        """
+        prof = self.profiler
+        if prof is None:
+            return self._scene_risk_field(vehicles_data, engine, out, total_only)
+        start = prof.now()
+        result = self._scene_risk_field(vehicles_data, engine, out, total_only)
+        prof.mark('scene', start, self.X_en.size)
+        prof.end_scene()
+        return result
+    
+    def _scene_risk_field(self, vehicles_data, engine, out, total_only):
+        """calculate_scene_risk_field的实现"""
+        engine = engine or self.engine
+        if engine == "loop":
+            F_total, F_ego_total, F_others, F_turn_total = self._scene_risk_field_loop(vehicles_data)
+            if out is not None:
+                np.copyto(out, F_total)
+                F_total = out
+            if total_only:
+                return F_total
+            return F_total, F_ego_total, F_others, F_turn_total
+        
+        prof = self.profiler
+        start = prof.now() if prof is not None else 0.0
+        F_ego_total, F_turn_total = self.static_risk_layers(engine)
+        if prof is not None:
+            start = prof.mark('scene.static_layers', start, self.X_en.size)
+        
+        # 每帧只计算动态车辆
+        accumulate, accumulate_straight = self._accumulators(engine)
+        params = self.vehicle_param_array(vehicles_data)
+        if total_only:
+            F_total = np.add(F_ego_total, F_turn_total, out=out)
+            accumulate_straight(params, out=F_total)
+            if prof is not None:
+                start = prof.mark('scene.dynamic', start, len(params) * self.X_en.size)
+            self._apply_threshold(F_total)
+            if prof is not None:
+                prof.mark('scene.combine', start, self.X_en.size)
+            return F_total
+        
+        F_others = accumulate_straight(params)
+        if prof is not None:
+            start = prof.mark('scene.dynamic', start, len(params) * self.X_en.size)
+        
+        F_total = np.add(F_ego_total, F_others, out=out)
+        F_total += F_turn_total
+        self._apply_threshold(F_total)
+        if prof is not None:
+            prof.mark('scene.combine', start, self.X_en.size)
+        
+        return F_total, F_ego_total, F_others, F_turn_total
+    
+    def _window_bounds(self, boxes):
+        """support_box包围盒转换为网格行、列范围数组 (r0, r1, c0, c1)"""
+        x_min, x_max, y_min, y_max = boxes
+        return (np.searchsorted(self.y_en, y_min, side='left'),
+                np.searchsorted(self.y_en, y_max, side='right'),
+                np.searchsorted(self.x_en, x_min, side='left'),
+                np.searchsorted(self.x_en, x_max, side='right'))
+    
+    def _sparse_static_layer(self):
+        """
+        稀疏输出使用的背景层：windowed引擎、圆弧核计算的 F_ego + F_turn（展平）及各车窗口，
+        按_static_cache_key缓存
+        """
+        key = self._static_cache_key("windowed")
+        if self._sparse_static is not None and self._sparse_static[0] == key:
+            return self._sparse_static[1]
+        
+        ego_vehicles, turn_vehicles = self.scene_static_vehicles()
+        ego_params = self.vehicle_param_array(ego_vehicles, full_params=True)
+        turn_params = self.vehicle_param_array(turn_vehicles, full_params=True)
+        F_static = self.field_windowed(ego_params)
+        F_static += 0.6 * self.field_windowed(turn_params, steering_angle=5.0)
+        F_static += 0.5 * self.field_windowed(turn_params)
+        
+        params = np.vstack([ego_params, turn_params, turn_params])
+        steering = np.repeat([0.001, 0.001, 5.0], [len(ego_params), len(turn_params), len(turn_params)])
+        layer = (F_static.ravel(), self._window_bounds(self.support_box(params, steering)))
+        self._sparse_static = (key, layer)
+        return layer
+    
+    def calculate_sparse_risk_field(self, vehicles_data, threshold=0.001):
+        """
+        计算场景总风险场并直接以稀疏（按行区间）形式返回，不生成整张网格
+        
+        所有车辆（含固定自车与转弯车辆）的支撑窗口逐行合并为列区间，
+        各车窗口内的风险值直接累加到这些区间组成的紧凑缓冲区，最后只保留不小于threshold的点。
+        计算量和内存与窗口覆盖面积成正比。结果与 engine="windowed"、straight_kernel="arc"
+        的F_total一致（仅求和顺序不同）。
+        
+        Parameters:
+        vehicles_data: 车辆数据列表，每个元素包含 [id, x, y, speed, ...]
+        threshold: 小于该值的风险视为0（与F_total一致）
+        
+        Returns:
+        SparseRiskField
+        """
+        prof = self.profiler
+        scene_start = prof.now() if prof is not None else 0.0
+        F_static, static_windows = self._sparse_static_layer()
+        params = self.vehicle_param_array(vehicles_data)
+        if len(params):
+            windows = self._window_bounds(self.support_box(params))
+        else:
+            windows = tuple(np.empty(0, dtype=np.int64) for _ in range(4))
+        r0, r1, c0, c1 = (np.concatenate([a, b]) for a, b in zip(static_windows, windows))
+        
+        def concat_ranges(starts, counts):
+            """拼接 [starts[k], starts[k] + counts[k]) 各段整数"""
+            offsets = np.cumsum(counts) - counts
+            return np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+        
+        # 每个窗口的每一行是一个列区间；全局坐标 g = row * (nx + 1) + col 保证不同行的区间不会合并
+        ny, nx = self.X_en.shape
+        stride = nx + 1
+        valid = (r1 > r0) & (c1 > c0)
+        n_rows = np.where(valid, r1 - r0, 0)
+        rows = concat_ranges(r0, n_rows)
+        g0 = rows * stride + np.repeat(c0, n_rows)
+        g1 = rows * stride + np.repeat(c1, n_rows)
+        order = np.argsort(g0, kind='stable')
+        g0, g1 = g0[order], g1[order]
+        
+        # 按起点排序后，起点超过前面所有区间终点的位置开始新的合并区间
+        new = np.ones(len(g0), dtype=bool)
+        new[1:] = g0[1:] > np.maximum.accumulate(g1)[:-1]
+        first = np.flatnonzero(new)
+        span_g0 = g0[first]
+        span_len = (np.maximum.reduceat(g1, first) - span_g0) if len(first) else first
+        span_row = span_g0 // stride
+        span_c0 = span_g0 - span_row * stride
+        span_offset = np.cumsum(span_len) - span_len
+        
+        # 背景层只在区间内取值，动态车辆的窗口逐行映射到所在区间累加
+        cells = concat_ranges(span_row * nx + span_c0, span_len)
+        data = F_static[cells]
+        workspace = self.workspace if self.use_workspace else None
+        for i in range(len(params)):
+            if not valid[len(valid) - len(params) + i]:
+                continue
+            a0, a1, b0, b1 = (int(bound[i]) for bound in windows)
+            X = self.x_en[None, b0:b1]
+            Y = self.y_en[a0:a1, None]
+            k = np.searchsorted(span_g0, np.arange(a0, a1) * stride + b0, side='right') - 1
+            base = span_offset[k] + (b0 - span_c0[k])
+            
+            steps = np.diff(base)
+            if len(steps) == 0 or np.all(steps == steps[0]):
+                # 窗口各行在缓冲区中等间隔（所在区间等宽），直接在跨步视图上原地累加
+                step = int(steps[0]) if len(steps) else 0
+                target = as_strided(data[base[0]:], shape=(a1 - a0, b1 - b0),
+                                    strides=(step * data.itemsize, data.itemsize))
+                self._accumulate_window(params[i:i + 1], X, Y, 0.001, target, workspace)
+                continue
+            if workspace is not None:
+                patch = workspace.array('sparse_patch', (a1 - a0, b1 - b0))
+                patch[...] = 0
+            else:
+                patch = np.zeros((a1 - a0, b1 - b0), dtype=self.dtype)
+            self._accumulate_window(params[i:i + 1], X, Y, 0.001, patch, workspace)
+            data[base[:, None] + np.arange(b1 - b0)] += patch
+        
+        keep = data >= threshold
+        cell_rows = np.repeat(span_row, span_len)[keep]
+        sparse = SparseRiskField.from_mask((ny, nx), cell_rows, cells[keep] - cell_rows * nx, data[keep])
+        if prof is not None:
+            prof.mark('scene', scene_start, len(data))
+            prof.end_scene()
+        return sparse
+    
+    def _apply_threshold(self, F_total, threshold=0.001):
+        """小于threshold的风险值原地置0（使用工作区中的掩码，不分配新数组）"""
+        if self.use_workspace:
+            mask = np.less(F_total, threshold, out=self.workspace.array('threshold', F_total.shape, bool))
+            np.copyto(F_total, 0, where=mask)
+        else:
+            F_total[F_total < threshold] = 0
+        return F_total
+    
+    def precision_report(self, vehicles_data, engine=None, rel_tol=5e-3):
+        """
+        与双精度模型比较当前模型（如float32省内存模式）的场景风险场F_total误差
+
+        float32核使用车辆相对坐标形式（_uses_relative_form），与原实现的arccos形式不是同一公式，
+        因此分两部分报告：
+        - 舍入误差：与同一公式的双精度参考模型（dtype="float64"、dense_grid=True）比较。
+          风险场在每辆车所在列（dx = 0）处不连续（前方为峰值、后方为0），单精度舍入可能使该列
+          的网格点落到另一侧，这些点单独统计；其余位置的相对误差约1e-6
+        - 公式差异（formula_*）：参考模型与原实现arccos形式的双精度结果之差，
+          来自原实现arccos在每辆车前后 |dx| < 0.25 m 内的饱和（见field_straight_separable），
+          演示场景中约为峰值的22%；当前模型使用原实现公式时为0
+
+        Parameters:
+        vehicles_data: 车辆数据列表，每个元素包含 [id, x, y, speed, ...]
+        engine: 计算引擎，默认使用self.engine
+        rel_tol: 统计误差超过 rel_tol × 参考峰值的网格点数
+
+        Returns:
+        误差统计字典：
+        - max_abs_error, max_rel_error, rms_error, cells_over_tol, cells：相对同一公式参考模型
+        - vehicle_column_cells_over_tol：cells_over_tol中位于车辆所在列的点数
+        - max_rel_error_off_vehicle_columns：车辆所在列以外的最大相对误差
+        - formula_max_rel_error, formula_cells_over_tol：参考模型与原实现公式之差
+        - reference_peak, field_bytes, reference_field_bytes
+        """
+        config = self.get_config()
+        config.update(dtype="float64", dense_grid=True)
+        reference = type(self).from_config(config)
+        reference._relative_form = self._uses_relative_form()
+        original = type(self).from_config(config)
+        F_ref = reference.calculate_scene_risk_field(vehicles_data, engine, total_only=True)
+        F_total = self.calculate_scene_risk_field(vehicles_data, engine, total_only=True)
+        if reference._relative_form:
+            F_original = original.calculate_scene_risk_field(vehicles_data, engine, total_only=True)
+        else:
+            F_original = F_ref
+
+        peak = float(F_ref.max())
+        scale = peak if peak > 0 else 1.0
+        error = np.abs(F_total.astype(float) - F_ref)
+        over_tol = error > rel_tol * scale
+        formula_error = np.abs(F_original - F_ref)
+
+        # 车辆（含固定自车与转弯车辆）所在列
+        ego_vehicles, turn_vehicles = self.scene_static_vehicles()
+        xs = np.concatenate([self.vehicle_param_array(vehicles_data)[:, 1],
+                             [vehicle[1] for vehicle in ego_vehicles + turn_vehicles]])
+        x = reference.x_en
+        on_column = np.zeros(len(x), dtype=bool)
+        for xv in xs:
+            on_column |= np.abs(x - xv) < reference.delta_en / 2
+        off_error = error[:, ~on_column]
+        return {
+            'max_abs_error': float(error.max()),
+            'max_rel_error': float(error.max()) / scale,
+            'rms_error': float(np.sqrt(np.mean(error ** 2))),
+            'cells_over_tol': int(np.count_nonzero(over_tol)),
+            'cells': int(error.size),
+            'vehicle_column_cells_over_tol': int(np.count_nonzero(over_tol[:, on_column])),
+            'max_rel_error_off_vehicle_columns': float(off_error.max(initial=0)) / scale,
+            'formula_max_rel_error': float(formula_error.max()) / scale,
+            'formula_cells_over_tol': int(np.count_nonzero(formula_error > rel_tol * scale)),
+            'reference_peak': peak,
+            'field_bytes': int(F_total.nbytes),
+            'reference_field_bytes': int(F_ref.nbytes)
+        }
+    
+    def risk_at_points(self, points, vehicles_data, include_static=True, threshold=0.001):
+        """
+        直接在任意坐标点上计算场景总风险值，不构建整张网格
+        
+        对K个查询点和N辆车做 (N, K) 向量化计算（按batch_cell_budget分批），
+        与calculate_scene_risk_field的F_total组合方式一致，但不受网格离散化影响。
+        
+        Parameters:
+        points: (K, 2) 查询坐标 [[x, y], ...]
+        vehicles_data: 车辆数据列表，每个元素包含 [id, x, y, speed, ...]
+        include_static: 是否叠加固定自车与转弯车辆的风险场
+        threshold: 小于该值的风险置0（与F_total一致），None表示不处理
+        
+        Returns:
+        长度为K的风险值数组
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        X = points[:, 0]
+        Y = points[:, 1]
+        
+        risk = self.field_batch(self.vehicle_param_array(vehicles_data), X=X, Y=Y)
+        if include_static:
+            ego_vehicles, turn_vehicles = self.scene_static_vehicles()
+            ego_params = self.vehicle_param_array(ego_vehicles, full_params=True)
+            self.field_batch(ego_params, X=X, Y=Y, out=risk)
+            turn_params = self.vehicle_param_array(turn_vehicles, full_params=True)
+            risk += 0.6 * self.field_batch(turn_params, steering_angle=5.0, X=X, Y=Y)
+            risk += 0.5 * self.field_batch(turn_params, steering_angle=0.001, X=X, Y=Y)
+        
+        if threshold is not None:
+            risk[risk < threshold] = 0
+        return risk
+    
+    def trajectory_risk(self, trajectories, vehicles_data, dt=1.0, include_static=True,
+                        threshold=0.001):
+        """
+        批量计算M条候选轨迹上的累积风险和峰值风险（供规划器评估轨迹）
+        
+        所有轨迹采样点展平后一次性用risk_at_points求值（M×T×N向量化），
+        再按轨迹用梯形积分得到累积风险。
+        
+        Parameters:
+        trajectories: (M, T, 2) 轨迹采样点 [x, y]，单条轨迹可传 (T, 2)
+        vehicles_data: 车辆数据列表，每个元素包含 [id, x, y, speed, ...]
+        dt: 相邻采样点的时间间隔 [s]
+        include_static: 是否叠加固定自车与转弯车辆的风险场
+        threshold: 小于该值的风险置0（与F_total一致），None表示不处理
+        
+        Returns:
+        (integrated_risk, peak_risk, risk)：前两者形状为 (M,)，risk为各采样点风险 (M, T)
+        """
+        trajectories = np.asarray(trajectories, dtype=float)
+        if trajectories.ndim == 2:
+            trajectories = trajectories[None]
+        M, T = trajectories.shape[:2]
+        
+        risk = self.risk_at_points(trajectories.reshape(-1, 2), vehicles_data,
+                                   include_static=include_static, threshold=threshold)
+        risk = risk.reshape(M, T)
+        
+        if T > 1:
+            integrated_risk = dt * (risk.sum(axis=1) - 0.5 * (risk[:, 0] + risk[:, -1]))
+        else:
+            integrated_risk = np.zeros(M)
+        peak_risk = risk.max(axis=1) if T else np.zeros(M)
+        
+        return integrated_risk, peak_risk, risk
+    
+    def _scene_risk_field_loop(self, vehicles_data):
+        """
+        逐车循环计算场景风险场（原始实现，作为batched引擎的参考）
+        """
+        ego_vehicles, turn_vehicles = self.scene_static_vehicles()
+        
         # 计算自车风险场
         F_ego_total = np.zeros_like(self.X_en)
         for ego_params in ego_vehicles:
             F_ego = self.field_straight(ego_params)
-            F_ego[np.isnan(F_ego)] = 0  # 将NaN值设为0
-            F_ego_total += F_ego
+            self._loop_accumulate(F_ego_total, (1, F_ego))  # 将NaN值设为0后累加
         
         # 计算其他车辆风险场
         F_others = np.zeros_like(self.X_en)
@@ -282,17 +1489,14 @@ class RiskFieldModel:
                     self.m_obj, self.beta_obj, self.L_obj, self.K_obj, self.delta_max
                 ]
                 F_tmp = self.field_straight(vehicle_params)
-                F_tmp[np.isnan(F_tmp)] = 0
-                F_others += F_tmp
+                self._loop_accumulate(F_others, (1, F_tmp))
         
         # 计算转弯风险场
         F_turn_total = np.zeros_like(self.X_en)
         for turn_params in turn_vehicles:
             F_turn = self.field_turn(turn_params)
-            F_turn[np.isnan(F_turn)] = 0
             F_turn_straight = self.field_straight(turn_params)
-            F_turn_straight[np.isnan(F_turn_straight)] = 0
-            F_turn_total += 0.6 * F_turn + 0.5 * F_turn_straight
+            self._loop_accumulate(F_turn_total, (0.6, F_turn), (0.5, F_turn_straight))
         
         # 合成总风险场（对应MATLAB中的组合逻辑）
         F_total = F_ego_total + F_others + F_turn_total
@@ -302,6 +1506,19 @@ class RiskFieldModel:
         
         return F_total, F_ego_total, F_others, F_turn_total
     
+    def _loop_accumulate(self, total, *weighted):
+        """loop引擎：各 (weight, F) 的NaN置0后把 Σ weight * F 累加到total"""
+        prof = self.profiler
+        start = prof.now() if prof is not None else 0.0
+        for _, F in weighted:
+            F[np.isnan(F)] = 0
+        if prof is not None:
+            start = prof.mark('nan_scrub', start, total.size * len(weighted))
+        total += sum(weight * F for weight, F in weighted)
+        if prof is not None:
+            prof.mark('accumulate', start, total.size * len(weighted))
+        return total
+    
     def visualize_risk_field(self, F_total, save_path=None, show_lanes=True):
         """
         可视化风险场（复现MATLAB的3D可视化）
@@ -400,14 +1617,10 @@ def main():
     print("🎨 生成3D可视化图...")
     risk_model.visualize_risk_field(F_total, save_path="risk_field_demo.png")
     
-    # 计算特定位置的风险值（对应MATLAB中的F_f计算）
+    # 计算特定位置的风险值（对应MATLAB中的F_f计算），直接在该点求值而非取网格
     test_x, test_y = 50, 3.5  # 测试位置
-    x_idx = int(test_x / risk_model.delta_en)
-    y_idx = int(test_y / risk_model.delta_en)
-    
-    if 0 <= x_idx < F_total.shape[1] and 0 <= y_idx < F_total.shape[0]:
-        risk_at_point = F_total[y_idx, x_idx]
-        print(f"📍 位置 ({test_x}, {test_y}) 的风险值: {risk_at_point:.4f}")
+    risk_at_point = risk_model.risk_at_points([[test_x, test_y]], vehicles_data)[0]
+    print(f"📍 位置 ({test_x}, {test_y}) 的风险值: {risk_at_point:.4f}")
     
     print("🎉 演示完成！")
     
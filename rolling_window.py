@@ -0,0 +1,174 @@
+"""
+跟随车辆的滚动窗口场景风险场 - 长道路上只计算车辆周围固定大小的网格
+Rolling Window Scene for Risk Field Model
+
+highD路段约420 m，整条道路的网格在高精度下非常大。RollingWindowScene 以选定的跟随车辆（ego）
+为中心取固定长度的窗口（宽度为整个路面），窗口沿x方向按网格间距对齐滑动：
+- 固定自车与转弯车辆的背景层在窗口滑动时平移复用重叠部分，只计算新露出的列
+- 动态车辆只在各自支撑窗口（support_box）与滚动窗口的交集内计算
+每帧的计算量和内存只取决于窗口大小和窗口内的车辆数，与道路长度无关。
+结果与整条道路网格上 engine="windowed" 的风险场在窗口内的部分一致。
+"""
+
+import numpy as np
+
+
+class RollingWindowScene:
+    """
+    以跟随车辆为中心的滚动窗口（有状态，逐帧调用update）
+
+    窗口第k列的x坐标为 (col0 + k) * delta_en，与从原点开始的整条道路网格对齐；
+    y方向使用模型的y_en（整个路面）。
+    """
+
+    def __init__(self, model, window_length=None, ego_id=None, ego_position=None, road_length=None):
+        """
+        Parameters:
+        model: RiskFieldModel实例，提供参数、y方向网格和固定背景车辆
+        window_length: 窗口长度 [m]，默认使用model.X_length
+        ego_id: 跟随车辆的id（update时从vehicles_data中查找其x坐标）
+        ego_position: 跟随车辆在窗口内的x位置 [m]，默认窗口中心
+        road_length: 道路长度 [m]；给定时窗口不会超出 [0, road_length]
+        """
+        self.model = model
+        self.window_length = float(model.X_length if window_length is None else window_length)
+        self.ego_id = ego_id
+        self.ego_position = self.window_length / 2 if ego_position is None else float(ego_position)
+        self.road_length = road_length
+        self.reset()
+
+    def reset(self):
+        """清空窗口（下一帧重新计算全部背景列）"""
+        model = self.model
+        d = model.delta_en
+        self.n_cols = int(round(self.window_length / d)) + 1
+        shape = (len(model.y_en), self.n_cols)
+        self.F_ego_total = np.zeros(shape, dtype=model.dtype)
+        self.F_turn_total = np.zeros(shape, dtype=model.dtype)
+        self.F_others = np.zeros(shape, dtype=model.dtype)
+        self.col0 = None
+        self.x_en = None
+        self._static_key = None
+        self.last_stats = {'shift': 0, 'new_columns': 0, 'vehicles': 0}
+
+    def _column_range(self, ego_x):
+        """跟随车辆位于ego_x时窗口的起始列（按网格间距取整，并限制在道路范围内）"""
+        d = self.model.delta_en
+        col0 = int(round((ego_x - self.ego_position) / d))
+        if self.road_length is not None:
+            last = int(round(self.road_length / d)) + 1 - self.n_cols
+            col0 = min(max(col0, 0), max(last, 0))
+        return col0
+
+    def _accumulate(self, params, steering_angle, out, c_lo, c_hi):
+        """
+        各车在支撑窗口与窗口列 [c_lo, c_hi) 交集内的风险场累加到out（out对应这些列）
+        返回参与计算的车辆数
+        """
+        model = self.model
+        if len(params) == 0:
+            return 0
+        boxes = model.support_box(params, steering_angle)
+        x_min, x_max, y_min, y_max = boxes
+        c0 = np.maximum(np.searchsorted(self.x_en, x_min, side='left'), c_lo)
+        c1 = np.minimum(np.searchsorted(self.x_en, x_max, side='right'), c_hi)
+        r0 = np.searchsorted(model.y_en, y_min, side='left')
+        r1 = np.searchsorted(model.y_en, y_max, side='right')
+        workspace = model.workspace if model.use_workspace else None
+        count = 0
+        for i in np.flatnonzero((c1 > c0) & (r1 > r0)):
+            rows, cols = slice(r0[i], r1[i]), slice(c0[i], c1[i])
+            model._accumulate_window(params[i:i + 1], self.x_en[None, cols], model.y_en[rows, None],
+                                     steering_angle, out[rows, cols.start - c_lo:cols.stop - c_lo],
+                                     workspace)
+            count += 1
+        return count
+
+    def _update_static(self, c_lo, c_hi):
+        """计算背景层的窗口列 [c_lo, c_hi)（与static_risk_layers相同的组合方式）"""
+        model = self.model
+        ego_vehicles, turn_vehicles = model.scene_static_vehicles()
+        turn_params = model.vehicle_param_array(turn_vehicles, full_params=True)
+        width = c_hi - c_lo
+        shape = (len(model.y_en), width)
+
+        F_ego = np.zeros(shape, dtype=model.dtype)
+        ego_params = model.vehicle_param_array(ego_vehicles, full_params=True)
+        self._accumulate(ego_params, 0.001, F_ego, c_lo, c_hi)
+        self.F_ego_total[:, c_lo:c_hi] = F_ego
+
+        F_turn = np.zeros(shape, dtype=model.dtype)
+        self._accumulate(turn_params, 5.0, F_turn, c_lo, c_hi)
+        F_straight = np.zeros(shape, dtype=model.dtype)
+        self._accumulate(turn_params, 0.001, F_straight, c_lo, c_hi)
+        F_turn *= 0.6
+        F_turn += 0.5 * F_straight
+        self.F_turn_total[:, c_lo:c_hi] = F_turn
+
+    def _slide(self, col0):
+        """窗口移动到col0：平移背景层重叠部分，只计算新露出的列（列数记入last_stats）"""
+        model = self.model
+        key = model._static_cache_key("windowed")
+        shift = 0 if self.col0 is None else col0 - self.col0
+        self.x_en = ((col0 + np.arange(self.n_cols)) * model.delta_en).astype(model.dtype)
+
+        if self.col0 is None or key != self._static_key or abs(shift) >= self.n_cols:
+            self._update_static(0, self.n_cols)
+            new_columns = self.n_cols
+        elif shift > 0:
+            for layer in (self.F_ego_total, self.F_turn_total):
+                layer[:, :-shift] = layer[:, shift:]
+            self._update_static(self.n_cols - shift, self.n_cols)
+            new_columns = shift
+        elif shift < 0:
+            for layer in (self.F_ego_total, self.F_turn_total):
+                layer[:, -shift:] = layer[:, :shift]
+            self._update_static(0, -shift)
+            new_columns = -shift
+        else:
+            new_columns = 0
+
+        self.col0 = col0
+        self._static_key = key
+        self.last_stats['shift'] = shift
+        self.last_stats['new_columns'] = new_columns
+
+    def update(self, vehicles_data, ego_x=None):
+        """
+        窗口移动到跟随车辆处并计算当前帧，返回窗口内的
+        (F_total, F_ego_total, F_others, F_turn_total)；窗口的x坐标为self.x_en
+
+        F_ego_total、F_others、F_turn_total 是内部数组，下次update时会被原地修改，需要保留时请复制。
+
+        Parameters:
+        vehicles_data: 车辆列表或 (n, 4) 数组 [id, x, y, speed]
+        ego_x: 跟随车辆的x坐标；为None时按ego_id从vehicles_data中查找
+        """
+        model = self.model
+        prof = model.profiler
+        scene_start = start = prof.now() if prof is not None else 0.0
+        params = model.vehicle_param_array(vehicles_data)
+        if ego_x is None:
+            matches = np.flatnonzero(params[:, 0] == self.ego_id) if len(params) else []
+            if len(matches) == 0:
+                raise ValueError(f"当前帧中没有跟随车辆: {self.ego_id}")
+            ego_x = params[matches[0], 1]
+
+        self._slide(self._column_range(ego_x))
+        if prof is not None:
+            start = prof.mark('scene.static_layers', start, self.last_stats['new_columns'] * len(model.y_en))
+
+        self.F_others[...] = 0
+        self.last_stats['vehicles'] = self._accumulate(params, 0.001, self.F_others, 0, self.n_cols)
+        if prof is not None:
+            start = prof.mark('scene.dynamic', start, self.last_stats['vehicles'] * self.F_others.size)
+
+        F_total = self.F_ego_total + self.F_others
+        F_total += self.F_turn_total
+        model._apply_threshold(F_total)
+        if prof is not None:
+            prof.mark('scene.combine', start, F_total.size)
+            prof.mark('scene', scene_start, F_total.size)
+            prof.end_scene()
+
+        return F_total, self.F_ego_total, self.F_others, self.F_turn_total
@@ -0,0 +1,132 @@
+"""
+稀疏风险场表示 - 按行的连续区间（游程）保存阈值化后的非零网格点
+Sparse Risk Field for Risk Field Model
+
+F_total中小于0.001的点都被置0。SparseRiskField只保存非零点：
+每个区间记录所在行和起止列，所有区间的值依次拼接在data中。
+风险场沿行方向连续，区间数一般与行数同量级，额外开销远小于逐点保存列号的CSR。
+由 RiskFieldModel.calculate_sparse_risk_field 在累加时直接生成，
+存储、热点搜索和传输的开销与非零面积成正比。
+"""
+
+import numpy as np
+
+
+class SparseRiskField:
+    """
+    按行区间表示的风险场
+
+    第k个区间是第rows[k]行的列 [col_start[k], col_stop[k])，
+    值为 data[offsets[k]:offsets[k] + col_stop[k] - col_start[k]]；区间按 (行, 列) 排序且互不重叠
+    """
+
+    def __init__(self, shape, rows, col_start, col_stop, data):
+        """
+        Parameters:
+        shape: 对应的稠密网格形状 (ny, nx)
+        rows, col_start, col_stop: 各区间的行号和起止列
+        data: 所有区间的值按顺序拼接
+        """
+        self.shape = tuple(shape)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.col_start = np.asarray(col_start, dtype=np.int32)
+        self.col_stop = np.asarray(col_stop, dtype=np.int32)
+        self.data = data
+        lengths = self.col_stop.astype(np.int64) - self.col_start
+        self.offsets = np.cumsum(lengths) - lengths
+
+    @classmethod
+    def from_mask(cls, shape, cell_rows, cell_cols, data):
+        """
+        由按 (行, 列) 排序的非零点生成，相邻列的点合并为一个区间
+
+        Parameters:
+        cell_rows, cell_cols: 各点的行号和列号
+        data: 各点的值
+        """
+        if len(data) == 0:
+            empty = np.empty(0, dtype=np.int32)
+            return cls(shape, empty, empty, empty, data)
+        new = np.ones(len(data), dtype=bool)
+        new[1:] = (cell_rows[1:] != cell_rows[:-1]) | (cell_cols[1:] != cell_cols[:-1] + 1)
+        starts = np.flatnonzero(new)
+        lengths = np.diff(np.append(starts, len(data)))
+        return cls(shape, cell_rows[starts], cell_cols[starts], cell_cols[starts] + lengths, data)
+
+    @classmethod
+    def from_dense(cls, F_total, threshold=0.0):
+        """由稠密数组生成（只保留大于等于threshold的非零点）"""
+        F_total = np.asarray(F_total)
+        rows, cols = np.nonzero((F_total >= threshold) & (F_total != 0))
+        return cls.from_mask(F_total.shape, rows, cols, F_total[rows, cols])
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @property
+    def density(self):
+        """非零点占全部网格点的比例"""
+        return self.nnz / max(self.shape[0] * self.shape[1], 1)
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + self.col_start.nbytes + self.col_stop.nbytes + self.data.nbytes
+
+    def _lengths(self):
+        return self.col_stop.astype(np.int64) - self.col_start
+
+    def cell_rows(self):
+        """每个非零点的行号"""
+        return np.repeat(self.rows, self._lengths())
+
+    def cell_cols(self):
+        """每个非零点的列号"""
+        lengths = self._lengths()
+        return np.repeat(self.col_start - self.offsets, lengths) + np.arange(self.nnz)
+
+    def row(self, r):
+        """第r行的 (列号, 风险值)"""
+        selected = np.flatnonzero(self.rows == r)
+        cols = [np.arange(self.col_start[k], self.col_stop[k]) for k in selected]
+        values = [self.data[self.offsets[k]:self.offsets[k] + len(c)] for k, c in zip(selected, cols)]
+        if not cols:
+            return np.empty(0, dtype=np.int64), self.data[:0]
+        return np.concatenate(cols), np.concatenate(values)
+
+    def to_dense(self, out=None):
+        """转换为稠密数组（out不为空时写入out）"""
+        if out is None:
+            out = np.zeros(self.shape, dtype=self.data.dtype)
+        else:
+            out[...] = 0
+        out[self.cell_rows(), self.cell_cols()] = self.data
+        return out
+
+    def to_csr(self):
+        """CSR数组 (indptr, indices, data)"""
+        indptr = np.zeros(self.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.cell_rows(), minlength=self.shape[0]), out=indptr[1:])
+        return indptr, self.cell_cols(), self.data
+
+    def to_scipy(self):
+        """转换为 scipy.sparse.csr_matrix"""
+        from scipy.sparse import csr_matrix
+        indptr, indices, data = self.to_csr()
+        return csr_matrix((data, indices, indptr), shape=self.shape)
+
+    def max(self):
+        return float(self.data.max()) if self.nnz else 0.0
+
+    def top_k(self, k=1):
+        """风险值最大的k个点，返回按风险值降序的 (rows, cols, values)"""
+        k = min(k, self.nnz)
+        if k == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, self.data[:0]
+        selected = np.argpartition(self.data, self.nnz - k)[self.nnz - k:]
+        selected = selected[np.argsort(self.data[selected])[::-1]]
+        # 点所在区间
+        span = np.searchsorted(self.offsets, selected, side='right') - 1
+        cols = self.col_start[span] + (selected - self.offsets[span])
+        return self.rows[span].astype(np.int64), cols.astype(np.int64), self.data[selected]
@@ -0,0 +1,172 @@
+"""
+流式风险场计算管线 - 逐帧惰性生成整段录制的风险场结果
+Streaming Pipeline for Risk Field Model
+
+帧源可以是任何提供 frames() 和 frame_vehicles(frame_id) 的对象，
+例如 DataProcessor（文本数据）或 HighDRecording（highD录制）。
+结果按帧惰性生成，消费者不取下一帧就不会继续计算，内存占用与录制长度无关。
+"""
+
+import queue
+import threading
+
+import numpy as np
+
+from sparse_field import SparseRiskField
+
+
+class RiskFieldPipeline:
+    """
+    逐帧风险场计算管线
+
+    outputs 可选：
+    - field: 完整的 F_total 网格
+    - sparse: 按行区间表示的 F_total（SparseRiskField，不生成整张网格）
+    - summary: 统计量（最大值、均值、非零点数、最大值位置）
+    - probes: 探测点上的风险值（直接用risk_at_points求值，不依赖网格）
+    只请求 probes 或 sparse 时不会计算整张网格。
+
+    max_pending > 0 时在后台线程中预先计算，最多缓存 max_pending 帧（有界队列提供背压）；
+    max_pending = 0 时完全在消费者线程中按需计算。
+    """
+
+    OUTPUTS = ('field', 'summary', 'probes', 'sparse')
+
+    def __init__(self, model, source, outputs=('summary',), probes=None, frames=None,
+                 max_pending=0):
+        """
+        Parameters:
+        model: RiskFieldModel实例
+        source: 帧源（DataProcessor、HighDRecording等）
+        outputs: 需要的输出，OUTPUTS的子集
+        probes: (K, 2) 探测点坐标，outputs包含"probes"时必需
+        frames: 要处理的帧号序列，默认使用source.frames()
+        max_pending: 后台预计算的最大缓存帧数，0表示不使用后台线程
+        """
+        unknown = set(outputs) - set(self.OUTPUTS)
+        if unknown:
+            raise ValueError(f"未知的输出类型: {sorted(unknown)}")
+        if 'probes' in outputs and probes is None:
+            raise ValueError("outputs包含probes时必须提供probes坐标")
+
+        self.model = model
+        self.source = source
+        self.outputs = tuple(outputs)
+        self.probes = None if probes is None else np.asarray(probes, dtype=float).reshape(-1, 2)
+        self.frames = frames
+        self.max_pending = max_pending
+
+    def process_frame(self, frame_id, out=None):
+        """
+        计算单帧，返回结果字典
+
+        out: 可选的预分配数组，F_total直接写入其中
+        """
+        vehicles = self.source.frame_vehicles(frame_id)
+        result = {'frame': frame_id, 'num_vehicles': len(vehicles)}
+
+        # summary优先使用已计算的稀疏结果，只在需要时计算整张网格
+        if 'sparse' in self.outputs:
+            result['sparse'] = self.model.calculate_sparse_risk_field(vehicles)
+        if 'field' in self.outputs or ('summary' in self.outputs and 'sparse' not in self.outputs):
+            F_total = self.model.calculate_scene_risk_field(vehicles, out=out, total_only=True)
+            if 'field' in self.outputs:
+                result['field'] = F_total
+        if 'summary' in self.outputs:
+            result['summary'] = self.summarize(result['sparse'] if 'sparse' in result else F_total)
+
+        if 'probes' in self.outputs:
+            result['probes'] = self.model.risk_at_points(self.probes, vehicles)
+
+        return result
+
+    def summarize(self, F_total):
+        """风险场统计量（F_total为稠密数组或SparseRiskField）"""
+        if isinstance(F_total, SparseRiskField):
+            cells = F_total.shape[0] * F_total.shape[1]
+            if F_total.nnz == 0:
+                row = col = 0
+                peak = total = 0.0
+            else:
+                # 区间按 (行, 列) 排序，argmax与稠密数组一样取第一个最大值
+                k = int(np.argmax(F_total.data))
+                row, col = int(F_total.cell_rows()[k]), int(F_total.cell_cols()[k])
+                peak, total = F_total.data[k], F_total.data.sum()
+            return {
+                'max': float(peak),
+                'mean': float(total / cells),
+                'nonzero': int(np.count_nonzero(F_total.data)),
+                'argmax_xy': (float(self.model.x_en[col]), float(self.model.y_en[row]))
+            }
+        row, col = np.unravel_index(np.argmax(F_total), F_total.shape)
+        return {
+            'max': float(F_total[row, col]),
+            'mean': float(F_total.mean()),
+            'nonzero': int(np.count_nonzero(F_total)),
+            'argmax_xy': (float(self.model.x_en[col]), float(self.model.y_en[row]))
+        }
+
+    def _frame_ids(self):
+        return self.source.frames() if self.frames is None else self.frames
+
+    def __iter__(self):
+        if self.max_pending > 0:
+            return self._iter_prefetch()
+        return (self.process_frame(frame_id) for frame_id in self._frame_ids())
+
+    def _iter_prefetch(self):
+        """后台线程预计算，队列满时计算线程阻塞等待消费者"""
+        results = queue.Queue(maxsize=self.max_pending)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def worker():
+            try:
+                for frame_id in self._frame_ids():
+                    if not put(self.process_frame(frame_id)):
+                        return
+            except Exception as e:
+                put(e)
+                return
+            put(done)
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # 消费者提前结束时通知计算线程退出
+            stop.set()
+            thread.join()
+
+    def run(self, callback=None):
+        """
+        处理全部帧；callback不为空时对每帧结果调用callback，否则只返回处理的帧数
+        """
+        count = 0
+        for result in self:
+            if callback is not None:
+                callback(result)
+            count += 1
+        return count
+
+
+def stream_risk_fields(model, source, outputs=('summary',), probes=None, frames=None,
+                       max_pending=0):
+    """按帧惰性生成风险场结果的便捷函数（参数同RiskFieldPipeline）"""
+    return iter(RiskFieldPipeline(model, source, outputs, probes, frames, max_pending))
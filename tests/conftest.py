@@ -0,0 +1,8 @@
+"""
+测试公共设置：把项目根目录加入模块搜索路径（模块均位于根目录）
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+"""
+batched引擎与loop引擎（原始逐车实现）的一致性测试
+"""
+
+import numpy as np
+import pytest
+
+from risk_field_model import RiskFieldModel
+
+VEHICLES = [[2, 20, 3.5, 15], [3, 45, 6, 18], [5, 70, 2, 20], [6, 52.3, 4.1, 72]]
+
+
+def assert_scene_close(a, b):
+    for F_a, F_b in zip(a, b):
+        np.testing.assert_allclose(F_a, F_b, rtol=0, atol=1e-6 * max(float(F_b.max()), 1.0))
+
+
+def test_batched_matches_loop():
+    model = RiskFieldModel("fast")
+    assert_scene_close(model.calculate_scene_risk_field(VEHICLES, engine="batched"),
+                       model.calculate_scene_risk_field(VEHICLES, engine="loop"))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3])
+def test_batched_chunking_does_not_change_result(chunk_size):
+    model = RiskFieldModel("fast")
+    reference = model.calculate_scene_risk_field(VEHICLES, engine="loop")
+    model.chunk_size = chunk_size
+    assert_scene_close(model.calculate_scene_risk_field(VEHICLES, engine="batched"), reference)
+
+
+def test_multi_column_rows_use_first_four_columns():
+    """数据行多于4列时只取 [id, x, y, speed]，其余参数用模型默认值（与loop引擎一致）"""
+    model = RiskFieldModel("fast")
+    rows = [[1, 30, 4, 20, 1, 0, 0, 0, 0, 0, 7], [2, 60.3, 2.1, 25, 3, 3, 3, 3, 3, 3, 3]]
+    reference = model.calculate_scene_risk_field(rows, engine="loop")
+    assert reference[2].max() > 0
+    assert_scene_close(model.calculate_scene_risk_field(rows, engine="batched"), reference)
+    assert_scene_close(model.calculate_scene_risk_field(np.array(rows, dtype=float), engine="batched"),
+                       reference)
+
+
+def test_vehicle_param_array_full_params_opt_in():
+    model = RiskFieldModel("fast")
+    row = [7, 10, 2, 15, 1000, 0, 3.0, 0.1, 30]
+    defaults = [model.m_obj, model.beta_obj, model.L_obj, model.K_obj, model.delta_max]
+    np.testing.assert_array_equal(model.vehicle_param_array([row])[0], row[:4] + defaults)
+    np.testing.assert_array_equal(model.vehicle_param_array([row], full_params=True)[0], row)
+    np.testing.assert_array_equal(model.vehicle_param_array(np.array([row]), full_params=True)[0], row)
+
+
+def test_short_rows_are_skipped():
+    model = RiskFieldModel("fast")
+    assert model.vehicle_param_array([[1, 2, 3], [1, 20, 3.5, 15]]).shape == (1, 9)
@@ -0,0 +1,67 @@
+"""
+基准测试套件（benchmark_suite）的测试：小规模运行、JSON基线读写与回归比较
+"""
+
+import copy
+
+import pytest
+
+from benchmark_suite import BenchmarkSuite, main
+
+
+def make_suite(**options):
+    return BenchmarkSuite(modes=('fast',), vehicle_counts=(1, 3), road_lengths=(60.0,),
+                          kernels=('a_calc', 'torus_field_batch'), repeats=1, **options)
+
+
+def test_run_reports_scenes_and_kernels():
+    results = make_suite(profile=True).run()
+
+    assert len(results['scenes']) == 2
+    assert len(results['kernels']) == 2
+    for result in results['scenes'] + results['kernels']:
+        assert result['wall_time'] > 0
+        assert result['min_time'] <= result['wall_time']
+        assert result['peak_bytes'] > 0
+        assert result['cells'] == result['grid_shape'][0] * result['grid_shape'][1]
+    scene = results['scenes'][0]
+    assert scene['road_length'] == 60.0
+    assert 'scene' in scene['stages']
+
+
+def test_make_vehicles_is_reproducible():
+    suite = make_suite()
+    vehicles = suite.make_vehicles(5, 60.0)
+    assert (vehicles == suite.make_vehicles(5, 60.0)).all()
+    assert ((vehicles[:, 1] >= 0) & (vehicles[:, 1] <= 60.0)).all()
+
+
+def test_unknown_kernel_rejected():
+    with pytest.raises(ValueError):
+        BenchmarkSuite(kernels=('not_a_kernel',))
+
+
+def test_save_load_and_compare(tmp_path):
+    results = make_suite().run()
+    path = tmp_path / "baseline.json"
+    BenchmarkSuite.save(results, path)
+    baseline = BenchmarkSuite.load(path)
+
+    slower = copy.deepcopy(baseline)
+    slower['scenes'][0]['min_time'] *= 2
+    changes = BenchmarkSuite.compare(baseline, slower, tolerance=0.10)
+    assert len(changes) == 4
+    assert changes[0]['regression'] and changes[0]['ratio'] == pytest.approx(2.0)
+    assert not any(change['regression'] for change in changes[1:])
+
+
+def test_main_returns_nonzero_on_regression(tmp_path):
+    path = tmp_path / "baseline.json"
+    argv = ['--modes', 'fast', '--vehicles', '1', '--road-lengths', '60', '--kernels',
+            '--repeats', '1']
+    assert main(argv + ['--output', str(path)]) == 0
+
+    baseline = BenchmarkSuite.load(path)
+    baseline['scenes'][0]['min_time'] = 1e-12
+    BenchmarkSuite.save(baseline, path)
+    assert main(argv + ['--baseline', str(path)]) == 1
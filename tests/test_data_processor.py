@@ -0,0 +1,103 @@
+"""
+DataProcessor帧索引与MATLAB输入文件缓存的测试
+"""
+
+import os
+
+import numpy as np
+
+from data_processor import DataProcessor
+
+
+def make_rows(n_frames=6, per_frame=4, seed=0):
+    """[id, x, y, vx, speed, width, length, class, time, lane, frame_id] 格式的行（帧号乱序）"""
+    rng = np.random.RandomState(seed)
+    rows = []
+    for frame in range(n_frames):
+        for vid in range(per_frame):
+            rows.append([vid, rng.uniform(0, 100), rng.uniform(0, 8), 15, rng.uniform(40, 90),
+                         1.8, 4.5, 1, 0, 1, frame * 2])
+    rows = np.array(rows)
+    return rows[rng.permutation(len(rows))]
+
+
+def mask_scan(data, frame_id):
+    """原实现：按帧号掩码扫描，速度取第5列"""
+    return [[int(v[0]), float(v[1]), float(v[2]), float(v[4])] for v in data[data[:, -1] == frame_id]]
+
+
+def test_frame_index_matches_mask_scan():
+    processor = DataProcessor()
+    processor.vehicle_data = make_rows()
+    np.testing.assert_array_equal(processor.frames(), np.arange(0, 12, 2))
+    for frame_id in processor.frames():
+        assert processor.extract_vehicles_by_frame(frame_id) == mask_scan(processor.vehicle_data, frame_id)
+        assert processor.frame_vehicles(frame_id).shape == (4, 4)
+
+
+def test_missing_frame_is_empty():
+    processor = DataProcessor()
+    processor.vehicle_data = make_rows()
+    assert processor.frame_vehicles(3).shape == (0, 4)
+    assert processor.extract_vehicles_by_frame(99) == []
+
+
+def test_index_rebuilt_when_data_replaced():
+    processor = DataProcessor()
+    processor.vehicle_data = make_rows(seed=0)
+    processor.frame_vehicles(0)
+    processor.vehicle_data = make_rows(seed=1)
+    assert processor.extract_vehicles_by_frame(0) == mask_scan(processor.vehicle_data, 0)
+
+
+def test_data_without_frame_column_is_one_frame():
+    processor = DataProcessor()
+    processor.vehicle_data = np.array([[1, 10, 2.0, 15], [2, 30, 5.0, 20]])
+    assert processor.extract_vehicles_by_frame(7) == [[1, 10.0, 2.0, 15.0], [2, 30.0, 5.0, 20.0]]
+
+
+def write_input(path, rows):
+    with open(path, 'w') as f:
+        f.write('% id x y vx speed width length class time lane frame\n')
+        for row in rows:
+            f.write(' '.join(f'{value:g}' for value in row) + '\n')
+
+
+def test_matlab_input_parsed_and_cached(tmp_path):
+    path = str(tmp_path / 'input_data.txt')
+    rows = make_rows(n_frames=2)
+    write_input(path, rows)
+
+    data = DataProcessor().load_matlab_input_data(path)
+    np.testing.assert_allclose(data, rows, rtol=1e-5)
+    assert (tmp_path / 'input_data.txt.npy').exists()
+
+    cached = DataProcessor().load_matlab_input_data(path)
+    assert isinstance(cached, np.memmap)
+    np.testing.assert_array_equal(cached, data)
+
+
+def test_cache_reused_after_touch_and_invalidated_on_change(tmp_path):
+    path = str(tmp_path / 'input_data.txt')
+    rows = make_rows(n_frames=2)
+    write_input(path, rows)
+    DataProcessor().load_matlab_input_data(path)
+
+    stat = (tmp_path / 'input_data.txt').stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert isinstance(DataProcessor().load_matlab_input_data(path), np.memmap)
+
+    rows[0, 1] = 12345.0
+    write_input(path, rows)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+    data = DataProcessor().load_matlab_input_data(path)
+    assert not isinstance(data, np.memmap)
+    assert data[0, 1] == 12345.0
+
+
+def test_cache_disabled(tmp_path):
+    path = str(tmp_path / 'input_data.txt')
+    write_input(path, make_rows(n_frames=1))
+    data = DataProcessor().load_matlab_input_data(path, use_cache=False)
+    assert data.shape == (4, 11)
+    assert not (tmp_path / 'input_data.txt.npy').exists()
@@ -0,0 +1,105 @@
+"""
+量化归档（FieldArchiveWriter、FieldArchive）的测试：重建误差不超过max_error、随机读取与顺序读取一致
+"""
+
+import numpy as np
+import pytest
+
+from field_archive import FieldArchive, FieldArchiveWriter, decode_block, encode_block, quantize
+from risk_field_model import RiskFieldModel
+
+
+@pytest.fixture(scope="module")
+def model():
+    return RiskFieldModel("fast")
+
+
+@pytest.fixture(scope="module")
+def fields(model):
+    frames = []
+    for t in range(7):
+        vehicles = [[1, 10 + 1.2 * t, 2.0, 20], [2, 40 + 0.8 * t, 5.5, 15], [3, 70 - 0.5 * t, 2.0, 25]]
+        frames.append(model.calculate_scene_risk_field(vehicles)[0].copy())
+    return np.stack(frames)
+
+
+@pytest.mark.parametrize("delta", ["none", "time", "x", "time+x"])
+def test_encode_decode_is_lossless(delta):
+    rng = np.random.default_rng(0)
+    Q = rng.integers(0, 65536, size=(3, 4, 5), dtype=np.uint16)
+    np.testing.assert_array_equal(decode_block(encode_block(Q, delta), Q.shape, delta), Q)
+
+
+def test_quantize_error_bound():
+    F = np.array([[0.0, 0.25, 1.0], [3.0, 0.0012, 2.5]])
+    q, scale, error = quantize(F)
+    assert q.dtype == np.uint16 and q.max() == 65535
+    assert error <= scale / 2
+    np.testing.assert_allclose(q * scale, F, rtol=0, atol=scale / 2)
+    assert (q[F == 0] == 0).all()
+
+
+@pytest.mark.parametrize("codec,delta", [("zlib", "time+x"), ("lzma", "time"), ("zlib", "none")])
+def test_round_trip_within_max_error(tmp_path, model, fields, codec, delta):
+    path = str(tmp_path / "fields.rfqa")
+    frame_ids = np.arange(len(fields)) * 3
+    with FieldArchiveWriter(path, model, block_frames=3, delta=delta, codec=codec) as writer:
+        for frame_id, field in zip(frame_ids, fields):
+            writer.append("a", frame_id, field)
+    report = writer.close()
+    assert report['frames'] == len(fields)
+    assert report['ratio'] > 1
+    assert report['max_rel_error'] <= 0.5 / 65535
+
+    archive = FieldArchive(path)
+    assert archive.recordings() == ["a"]
+    assert archive.model_config == model.get_config()
+    np.testing.assert_array_equal(archive.frames("a"), frame_ids)
+    frames, data = archive.read("a")
+    np.testing.assert_array_equal(frames, frame_ids)
+    assert np.abs(data - fields).max() <= archive.max_error() * (1 + 1e-9)
+    assert archive.max_error() == report['max_abs_error']
+    # 阈值以下的0仍为0
+    assert (data[fields == 0] == 0).all()
+
+
+def test_random_access_matches_sequential_read(tmp_path, model, fields):
+    path = str(tmp_path / "fields.rfqa")
+    with FieldArchiveWriter(path, model, block_frames=3) as writer:
+        for frame_id, field in enumerate(fields):
+            writer.append(1, frame_id, field)
+            writer.append(2, frame_id, fields[-1 - frame_id])
+
+    archive = FieldArchive(path)
+    _, data = archive.read(1)
+    rows, cols = slice(3, 12), slice(40, 90)
+    for frame_id in (6, 0, 4, 3, 5, 1, 2):
+        np.testing.assert_array_equal(archive.read_frame(1, frame_id), data[frame_id])
+        np.testing.assert_array_equal(archive.read_frame(1, frame_id, rows, cols), data[frame_id][rows, cols])
+    np.testing.assert_array_equal(archive.read(1, start=2, stop=5)[1], data[2:5])
+    np.testing.assert_array_equal(archive.read(2)[1][::-1], data)
+
+    with pytest.raises(KeyError):
+        archive.read_frame(1, 7)
+    with pytest.raises(KeyError):
+        archive.frames(3)
+    frames, empty = archive.read(1, start=10)
+    assert len(frames) == 0 and empty.shape == (0,) + fields.shape[1:]
+
+
+def test_writer_rejects_invalid_input(tmp_path, model):
+    path = str(tmp_path / "fields.rfqa")
+    with pytest.raises(ValueError):
+        FieldArchiveWriter(path, model, delta="y")
+    with pytest.raises(ValueError):
+        FieldArchiveWriter(path, model, codec="zstd")
+    with FieldArchiveWriter(path, model) as writer:
+        writer.append(1, 2, model.X_en)
+        with pytest.raises(ValueError):
+            writer.append(1, 2, model.X_en)
+        with pytest.raises(ValueError):
+            writer.append(1, 3, model.X_en[:-1])
+    with open(tmp_path / "other.bin", 'wb') as f:
+        f.write(b"not an archive" + bytes(8))
+    with pytest.raises(ValueError):
+        FieldArchive(str(tmp_path / "other.bin"))
@@ -0,0 +1,102 @@
+"""
+风险场存储（FieldStoreWriter、FieldStore）的测试：写入读取、重新打开后追加、窗口读取
+"""
+
+import numpy as np
+import pytest
+
+from field_store import FieldStore, FieldStoreWriter
+from risk_field_model import RiskFieldModel
+
+
+@pytest.fixture(scope="module")
+def model():
+    return RiskFieldModel("fast")
+
+
+def make_fields(model, n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.random((n,) + model.X_en.shape).astype(model.dtype)
+
+
+def test_round_trip_with_append_on_reopen(tmp_path, model):
+    path = str(tmp_path / "store")
+    fields = make_fields(model, 9)
+    frame_ids = np.arange(9) * 2 + 1
+    with FieldStoreWriter(path, model, chunk_frames=4, chunk_cols=70) as writer:
+        for frame_id, field in zip(frame_ids[:5], fields[:5]):
+            writer.append(7, frame_id, field)
+    # 重新打开后续写：最后一个截断的分块恢复为完整大小
+    with FieldStoreWriter(path, model) as writer:
+        for frame_id, field in zip(frame_ids[5:], fields[5:]):
+            writer.append(7, frame_id, field)
+        writer.append("other", 0, fields[0])
+
+    store = FieldStore(path)
+    assert sorted(store.recordings()) == ["7", "other"]
+    assert store.chunk_frames == 4
+    np.testing.assert_array_equal(store.frames(7), frame_ids)
+    frames, data = store.read(7)
+    np.testing.assert_array_equal(frames, frame_ids)
+    np.testing.assert_array_equal(data, fields)
+
+    frames, data = store.read(7, start=4, stop=14)
+    np.testing.assert_array_equal(frames, [5, 7, 9, 11, 13])
+    np.testing.assert_array_equal(data, fields[2:7])
+    np.testing.assert_array_equal(store.read_frame(7, 11), fields[5])
+    with pytest.raises(KeyError):
+        store.read_frame(7, 2)
+    with pytest.raises(KeyError):
+        store.frames(8)
+
+    iterated = list(store.iter_frames(7, start=3))
+    assert [frame for frame, _ in iterated] == list(frame_ids[1:])
+    np.testing.assert_array_equal(np.stack([field for _, field in iterated]), fields[1:])
+    assert store.model_config == model.get_config()
+
+
+def test_window_reads_only_requested_cells(tmp_path, model):
+    path = str(tmp_path / "store")
+    fields = make_fields(model, 3)
+    with FieldStoreWriter(path, model, chunk_frames=2, chunk_cols=40) as writer:
+        for frame_id, field in enumerate(fields):
+            writer.append(1, frame_id, field)
+
+    store = FieldStore(path)
+    np.testing.assert_array_equal(store.x_en, model.x_en)
+    np.testing.assert_array_equal(store.y_en, model.y_en)
+    rows, cols = store.window(30.0, 55.0, 1.0, 4.0)
+    expected_cols = (model.x_en >= 30.0) & (model.x_en <= 55.0)
+    expected_rows = (model.y_en >= 1.0) & (model.y_en <= 4.0)
+    _, data = store.read(1, rows=rows, cols=cols)
+    np.testing.assert_array_equal(data, fields[:, expected_rows][:, :, expected_cols])
+    np.testing.assert_array_equal(store.read_frame(1, 2, rows=rows, cols=cols),
+                                  fields[2][expected_rows][:, expected_cols])
+
+
+def test_writer_rejects_invalid_frames(tmp_path, model):
+    path = str(tmp_path / "store")
+    with FieldStoreWriter(path, model, dtype="float32") as writer:
+        writer.append(1, 5, model.X_en)
+        with pytest.raises(ValueError):
+            writer.append(1, 5, model.X_en)
+        with pytest.raises(ValueError):
+            writer.append(1, 6, model.X_en[:, :-1])
+    assert FieldStore(path).dtype == np.float32
+
+    other = RiskFieldModel("balanced")
+    with pytest.raises(ValueError):
+        FieldStoreWriter(path, other)
+    FieldStoreWriter(path, other, overwrite=True).close()
+    assert FieldStore(path).shape == other.X_en.shape
+
+
+def test_append_results_from_pipeline_outputs(tmp_path, model):
+    path = str(tmp_path / "store")
+    fields = make_fields(model, 2)
+    results = [{'frame': 3, 'field': fields[0]}, {'frame': 4, 'field': fields[1]}]
+    with FieldStoreWriter(path, model) as writer:
+        assert writer.append_results(2, results) == 2
+        with pytest.raises(ValueError):
+            writer.append_results(2, [{'frame': 5}])
+    np.testing.assert_array_equal(FieldStore(path).read(2)[1], fields)
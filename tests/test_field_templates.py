@@ -0,0 +1,82 @@
+"""
+速度分桶模板库（FieldTemplateBank）的测试
+"""
+
+import numpy as np
+
+from field_templates import FieldTemplateBank
+from risk_field_model import RiskFieldModel
+
+
+def peak(model, speed):
+    return model.par1 * max(model.tla * speed, 1) ** 2
+
+
+def test_stamp_matches_arc_kernel_on_grid_points():
+    """车辆位于网格点、速度位于桶中心时，饱和条带外只差原实现arccos的舍入误差"""
+    model = RiskFieldModel("fast")
+    vehicles = [[1, 30.0, 3.4, 20.0], [2, 61.2, 6.0, 15.5]]
+    params = model.vehicle_param_array(vehicles)
+    error = np.abs(model.template_bank.stamp(params) - model.field_batch(params))
+    band = np.zeros(model.X_en.shape, dtype=bool)
+    for vehicle in vehicles:
+        band |= np.abs(model.X_en - vehicle[1]) < 0.25
+    assert error[~band].max() <= 5e-3 * peak(model, 20.0)
+
+
+def test_off_grid_error_within_documented_bound():
+    model = RiskFieldModel("balanced")
+    vehicle = [1, 40.037, 3.71, 21.3]
+    params = model.vehicle_param_array([vehicle])
+    error = np.abs(model.template_bank.stamp(params) - model.field_batch(params))
+    outside_band = np.abs(model.X_en - vehicle[1]) >= 0.25
+    assert error[outside_band].max() <= 0.02 * peak(model, vehicle[3])
+
+
+def test_custom_wheelbase_uses_arc_kernel():
+    model = RiskFieldModel("fast")
+    row = [1, 30.03, 3.4, 20.0, model.m_obj, model.beta_obj, 4.0, model.K_obj, model.delta_max]
+    params = model.vehicle_param_array([row], full_params=True)
+    np.testing.assert_array_equal(model.template_bank.stamp(params), model.field_batch(params))
+    assert model.template_bank.stats()['misses'] == 0
+
+
+def test_each_bucket_fetched_once_per_stamp():
+    model = RiskFieldModel("fast")
+    bank = FieldTemplateBank(model, interpolate=False)
+    params = model.vehicle_param_array([[i, 10.0 + 8 * i, 3.5, 20.0] for i in range(8)])
+    bank.stamp(params)
+    assert bank.stats()['misses'] == 1
+    bank.stamp(params)
+    assert bank.stats()['hits'] == 1
+
+
+def test_small_capacity_falls_back_to_arc_without_exceeding_it():
+    model = RiskFieldModel("fast")
+    reference = RiskFieldModel("fast")
+    bank = FieldTemplateBank(model, max_bytes=1, interpolate=False)
+    params = model.vehicle_param_array([[1, 30.0, 3.4, 20.0], [2, 60.0, 6.0, 25.0]])
+    np.testing.assert_allclose(bank.stamp(params), reference.field_batch(params), rtol=0, atol=1e-9)
+    assert bank.nbytes == 0 and bank.stats()['templates'] == 0
+
+
+def test_templates_kept_when_capacity_holds_working_set():
+    model = RiskFieldModel("fast")
+    speeds = [14.2, 18.7, 22.1, 27.4, 31.9]
+    params = model.vehicle_param_array([[i, 10.0 + 15 * i, 3.5, s] for i, s in enumerate(speeds)])
+    bank = model.template_bank
+    bank.stamp(params)
+    misses = bank.stats()['misses']
+    bank.stamp(params)
+    assert bank.stats()['misses'] == misses
+    assert bank.stats()['evictions'] == 0
+    assert bank.nbytes <= bank.capacity()
+
+
+def test_window_tol_change_rebuilds_templates():
+    model = RiskFieldModel("fast")
+    params = model.vehicle_param_array([[1, 30.0, 3.4, 20.0]])
+    model.template_bank.stamp(params)
+    model.window_tol = 1e-3
+    model.template_bank.stamp(params)
+    assert model.template_bank.stats()['hits'] == 0
@@ -0,0 +1,45 @@
+"""
+float32省内存模式与precision_report的测试
+"""
+
+import numpy as np
+
+from risk_field_model import RiskFieldModel
+
+VEHICLES = [[4, 6.5, 1.7, 17], [2, 20, 3.5, 15], [3, 45, 6, 18], [5, 70, 2, 20]]
+
+
+def test_precision_report_separates_rounding_from_formula():
+    model = RiskFieldModel("balanced", dtype="float32", dense_grid=False)
+    report = model.precision_report(VEHICLES)
+    # 与同一公式的双精度结果相比只有舍入误差（车辆所在列的不连续处除外）
+    assert report['max_rel_error_off_vehicle_columns'] < 1e-5
+    assert report['cells_over_tol'] == report['vehicle_column_cells_over_tol']
+    # 与原实现公式的差异单独报告
+    assert report['formula_cells_over_tol'] > 0
+    assert report['field_bytes'] * 2 == report['reference_field_bytes']
+
+
+def test_precision_report_of_float64_model_is_exact():
+    report = RiskFieldModel("fast").precision_report(VEHICLES)
+    assert report['max_abs_error'] == 0 and report['formula_max_rel_error'] == 0
+
+
+def test_float32_relative_form_matches_float64_relative_form():
+    model = RiskFieldModel("fast", dtype="float32")
+    reference = RiskFieldModel("fast")
+    reference._relative_form = True
+    params = model.vehicle_param_array(VEHICLES)
+    F = model.field_batch(params).astype(float)
+    F_ref = reference.field_batch(params)
+    on_column = np.zeros(model.X_en.shape, dtype=bool)
+    for vehicle in VEHICLES:
+        on_column |= np.abs(reference.X_en - vehicle[1]) < reference.delta_en / 2
+    np.testing.assert_allclose(F[~on_column], F_ref[~on_column], rtol=0, atol=1e-5 * F_ref.max())
+
+
+def test_float32_outputs_and_lean_mode():
+    model = RiskFieldModel("fast", dtype="float32", dense_grid=False)
+    F_total = model.calculate_scene_risk_field(VEHICLES, total_only=True)
+    assert F_total.dtype == np.float32
+    assert model.X_en.strides[0] == 0
@@ -0,0 +1,66 @@
+"""
+highD流式加载器（HighDDataLoader）的测试，使用 tests/data/highd 中的小型CSV样例
+"""
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from highd_loader import HighDDataLoader
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data', 'highd')
+
+
+def test_recording_sorted_by_frame_with_vehicle_centres():
+    loader = HighDDataLoader(DATA_DIR, chunksize=4)
+    assert loader.recording_ids() == [1]
+    recording = loader.load_recording(1)
+    np.testing.assert_array_equal(recording.frames(), [1, 2, 3, 4, 5])
+    assert len(recording.vehicles) == 11
+
+    frame2 = recording.frame_vehicles(2)
+    np.testing.assert_array_equal(frame2[:, 0], [1, 2, 3])
+    # 包围盒左上角转换为中心，速度为合速度
+    np.testing.assert_allclose(frame2[0], [1, 11.2 + 4.5 / 2, 20.5 + 1.9 / 2, np.hypot(30, 0.4)])
+    assert recording.frame_vehicles(9).shape == (0, 4)
+
+
+def test_chunk_size_does_not_change_result():
+    a = HighDDataLoader(DATA_DIR, chunksize=3).load_recording(1)
+    b = HighDDataLoader(DATA_DIR, chunksize=100000).load_recording(1)
+    np.testing.assert_array_equal(a.vehicles, b.vehicles)
+    np.testing.assert_array_equal(a.offsets, b.offsets)
+
+
+def test_driving_direction_filter():
+    recording = HighDDataLoader(DATA_DIR).load_recording(1, driving_direction=1)
+    assert set(recording.vehicles[:, 0]) == {3}
+    assert [frame for frame, _ in recording.iter_frames()] == [1, 2, 3]
+
+
+def test_column_cache_round_trip(tmp_path):
+    data_dir = tmp_path / 'data'
+    shutil.copytree(DATA_DIR, data_dir)
+    loader = HighDDataLoader(str(tmp_path), cache_dir=str(tmp_path / 'cache'))
+    fresh = loader.load_recording(1)
+    cached = loader.load_recording(1)
+    assert isinstance(cached.vehicles, np.memmap)
+    np.testing.assert_array_equal(cached.vehicles, fresh.vehicles)
+    np.testing.assert_array_equal(cached.frame_ids, fresh.frame_ids)
+
+    # 源文件变化后重新解析
+    with open(data_dir / '01_tracks.csv', 'a') as f:
+        f.write('6,2,60,24,12,2.5,25,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,3\n')
+    reloaded = loader.load_recording(1)
+    assert not isinstance(reloaded.vehicles, np.memmap)
+    assert reloaded.frames()[-1] == 6
+
+
+def test_extract_scenarios():
+    loader = HighDDataLoader(DATA_DIR)
+    assert loader.extract_scenarios(1, "lane_change") == [{'id': 1, 'initial_frame': 1, 'final_frame': 4}]
+    assert [s['id'] for s in loader.extract_scenarios(1, "close_following")] == [1]
+    with pytest.raises(ValueError):
+        loader.extract_scenarios(1, "cut_in")
@@ -0,0 +1,61 @@
+"""
+帧间增量更新（IncrementalScene）的测试
+"""
+
+import numpy as np
+import pytest
+
+from incremental_scene import IncrementalScene
+from risk_field_model import RiskFieldModel
+
+
+def frames(n=8):
+    """车辆逐帧前进；第3帧加入一辆车，第5帧一辆车离开"""
+    for f in range(n):
+        vehicles = [[1, 10 + 0.8 * f, 2.0, 20], [2, 40 + 0.6 * f, 5.5, 15], [3, 60.0, 3.5, 18]]
+        if f >= 3:
+            vehicles.append([4, 5 + 0.7 * f, 7.0, 25])
+        if f >= 5:
+            vehicles = [v for v in vehicles if v[0] != 2]
+        yield vehicles
+
+
+def test_incremental_matches_full_recompute():
+    model = RiskFieldModel("fast", engine="windowed")
+    scene = IncrementalScene(model, rebuild_interval=3)
+    for vehicles in frames():
+        F_total, _, F_others, _ = scene.update(vehicles)
+        reference = model.calculate_scene_risk_field(vehicles)
+        np.testing.assert_allclose(F_others, reference[2], rtol=0, atol=1e-9)
+        np.testing.assert_allclose(F_total, reference[0], rtol=0, atol=1e-9)
+
+
+def test_update_statistics():
+    model = RiskFieldModel("fast", engine="windowed")
+    scene = IncrementalScene(model)
+    sequence = list(frames(6))
+    scene.update(sequence[2])
+    scene.update(sequence[3])
+    assert scene.last_stats == {'added': 1, 'removed': 0, 'moved': 2, 'unchanged': 1}
+    scene.update(sequence[5])
+    assert scene.last_stats['removed'] == 1
+
+
+def test_duplicate_ids_rejected_without_changing_state():
+    model = RiskFieldModel("fast", engine="windowed")
+    scene = IncrementalScene(model)
+    scene.update([[1, 10, 2.0, 20]])
+    F_others = scene.F_others.copy()
+    with pytest.raises(ValueError):
+        scene.update([[1, 10, 2.0, 20], [1, 50, 5.5, 15]])
+    np.testing.assert_array_equal(scene.F_others, F_others)
+
+
+def test_parameter_change_recomputes_contributions():
+    model = RiskFieldModel("fast", engine="windowed")
+    scene = IncrementalScene(model)
+    vehicles = [[1, 10, 2.0, 20], [2, 40, 5.5, 15]]
+    scene.update(vehicles)
+    model.tla = 3.0
+    F_others = scene.update(vehicles)[2]
+    np.testing.assert_allclose(F_others, model.calculate_scene_risk_field(vehicles)[2], rtol=0, atol=1e-9)
@@ -0,0 +1,46 @@
+"""
+计算后端（kernel_backends）的测试：后端检查，以及Numba融合核与NumPy后端一致
+"""
+
+import numpy as np
+import pytest
+
+import kernel_backends
+from risk_field_model import RiskFieldModel
+
+VEHICLES = [[4, 6.5, 1.7, 17], [2, 20, 3.5, 15], [3, 45, 6, 18]]
+
+
+def test_check_backend_rejects_unknown_name():
+    with pytest.raises(ValueError):
+        kernel_backends.check_backend("cuda")
+    with pytest.raises(ValueError):
+        RiskFieldModel("fast", backend="cuda")
+
+
+def test_available_backends():
+    backends = kernel_backends.available_backends()
+    assert "numpy" in backends
+    assert ("numba" in backends) == kernel_backends.NUMBA_AVAILABLE
+
+
+@pytest.mark.skipif(kernel_backends.NUMBA_AVAILABLE, reason="numba已安装")
+def test_numba_backend_requires_numba():
+    with pytest.raises(ImportError):
+        RiskFieldModel("fast", backend="numba")
+
+
+@pytest.mark.skipif(not kernel_backends.NUMBA_AVAILABLE, reason="numba未安装")
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_numba_matches_numpy(dtype):
+    reference = RiskFieldModel("fast", dtype=dtype)
+    fused = RiskFieldModel("fast", dtype=dtype, backend="numba")
+    expected = reference.calculate_scene_risk_field(VEHICLES)[0]
+    actual = fused.calculate_scene_risk_field(VEHICLES)[0]
+    atol = 1e-9 if dtype == "float64" else 1e-4 * expected.max()
+    np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=atol)
+
+    points = np.column_stack([np.linspace(0, 60, 50), np.full(50, 3.5)])
+    np.testing.assert_allclose(fused.risk_at_points(points, VEHICLES),
+                               reference.risk_at_points(points, VEHICLES),
+                               rtol=1e-5, atol=atol)
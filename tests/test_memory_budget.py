@@ -0,0 +1,64 @@
+"""
+内存预算（memory_budget、max_memory）的测试：大小解析、预算不足时报错，以及实测峰值不超过预算
+"""
+
+import numpy as np
+import pytest
+
+from memory_budget import parse_memory_size
+from risk_field_model import RiskFieldModel
+
+VEHICLES = [[i, 4.0 * i + 1.5, 2.0 if i % 2 else 5.5, 12.0 + i % 7 * 3.0] for i in range(24)]
+
+
+def test_parse_memory_size():
+    assert parse_memory_size("512MB") == 512 * 10 ** 6
+    assert parse_memory_size("1.5GiB") == int(1.5 * 2 ** 30)
+    assert parse_memory_size(" 64 k ") == 64000
+    assert parse_memory_size(4096) == 4096
+    for value in ("12 parsecs", "-1MB", 0, "MB"):
+        with pytest.raises(ValueError):
+            parse_memory_size(value)
+
+
+def test_budget_too_small_rejected():
+    with pytest.raises(ValueError):
+        RiskFieldModel("balanced", max_memory="100KB")
+
+
+@pytest.mark.parametrize("engine,straight_kernel", [
+    ("batched", "arc"), ("windowed", "arc"), ("tiled", "arc"),
+    ("batched", "template"), ("tiled", "template")])
+def test_measured_peak_within_budget(engine, straight_kernel):
+    model = RiskFieldModel("balanced", engine=engine, straight_kernel=straight_kernel,
+                           max_memory="12MiB", n_threads=2)
+    report = model.memory_report(VEHICLES)
+    assert report['within_budget'], report
+    plan = model.memory_plan()
+    assert plan['estimated_peak'] <= plan['budget']
+
+
+def test_budget_does_not_change_results():
+    expected = RiskFieldModel("balanced").calculate_scene_risk_field(VEHICLES)[0]
+    model = RiskFieldModel("balanced", max_memory="12MiB")
+    assert model.memory_plan()['block_cells'] < len(VEHICLES) * model.X_en.size
+    np.testing.assert_allclose(model.calculate_scene_risk_field(VEHICLES)[0], expected,
+                               rtol=1e-10, atol=1e-12)
+
+
+def test_template_bank_counted_against_budget():
+    unlimited = RiskFieldModel("balanced", straight_kernel="template")
+    requested = unlimited.template_bank.requested_bytes()
+    model = RiskFieldModel("balanced", straight_kernel="template", max_memory="12MiB")
+    plan = model.memory_plan()
+
+    assert 0 < plan['template_bytes'] < requested
+    assert model.template_bank.capacity() == plan['template_bytes']
+    assert RiskFieldModel("balanced", max_memory="12MiB").memory_plan()['template_bytes'] == 0
+
+    model.calculate_scene_risk_field(VEHICLES)
+    assert model.template_bank.nbytes <= plan['template_bytes']
+    # 放不下的速度桶由圆弧核计算，结果与不限预算时一致
+    np.testing.assert_allclose(model.calculate_scene_risk_field(VEHICLES)[0],
+                               unlimited.calculate_scene_risk_field(VEHICLES)[0],
+                               rtol=1e-10, atol=1e-9)
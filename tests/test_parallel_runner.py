@@ -0,0 +1,93 @@
+"""
+进程池并行执行器（ParallelRiskRunner）的测试
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from data_processor import DataProcessor
+from highd_loader import HighDDataLoader
+from parallel_runner import ParallelRiskRunner
+from risk_field_model import RiskFieldModel
+from streaming_pipeline import stream_risk_fields
+
+HIGHD_DIR = os.path.join(os.path.dirname(__file__), 'data', 'highd')
+
+
+def make_source(n_frames=12):
+    rows = [[v, 10 + 25 * v + 0.6 * f, 2 + 2 * v, 15, 60 + v, 1.8, 4.5, 1, 0, 1, f]
+            for f in range(n_frames) for v in range(3)]
+    processor = DataProcessor()
+    processor.vehicle_data = np.array(rows, dtype=float)
+    return processor
+
+
+def test_run_frames_matches_serial_pipeline():
+    model = RiskFieldModel("fast")
+    source = make_source()
+    serial = list(stream_risk_fields(model, source, outputs=('summary',)))
+    runner = ParallelRiskRunner(model, n_workers=2, frames_per_task=5, max_inflight=2)
+    parallel = list(runner.run_frames(source))
+    assert [r['frame'] for r in parallel] == [r['frame'] for r in serial]
+    assert [r['summary'] for r in parallel] == [r['summary'] for r in serial]
+
+
+def test_run_frames_requires_frames_with_factory():
+    runner = ParallelRiskRunner(RiskFieldModel("fast"), n_workers=1)
+    with pytest.raises(ValueError):
+        next(runner.run_frames(source_factory=make_source))
+
+
+def test_run_recordings_in_order():
+    model = RiskFieldModel("fast")
+    loader = HighDDataLoader(HIGHD_DIR)
+    runner = ParallelRiskRunner(model, n_workers=2)
+    results = list(runner.run_recordings(loader, [1, 1]))
+    assert [rid for rid, _ in results] == [1, 1]
+    frames = [r['frame'] for r in results[0][1]]
+    assert frames == [1, 2, 3, 4, 5]
+    assert all(r['recording'] == 1 for r in results[0][1])
+
+
+def direct_fields(model, source, frames):
+    return [model.calculate_scene_risk_field(source.frame_vehicles(f), total_only=True) for f in frames]
+
+
+def test_shared_memory_fields_are_independent_copies():
+    """槽被后续任务复用、共享内存在生成器结束时释放后，已取得的field仍然有效"""
+    model = RiskFieldModel("fast")
+    source = make_source()
+    runner = ParallelRiskRunner(model, n_workers=2, outputs=('field', 'summary'),
+                                frames_per_task=2, max_inflight=2, shared_memory=True)
+    results = list(runner.run_frames(source))
+    expected = direct_fields(model, source, source.frames())
+    for result, F_total in zip(results, expected):
+        np.testing.assert_array_equal(result['field'], F_total)
+
+
+def test_shared_memory_views_require_context_manager():
+    runner = ParallelRiskRunner(RiskFieldModel("fast"), n_workers=1, outputs=('field',),
+                                shared_memory=True, copy_fields=False)
+    with pytest.raises(ValueError):
+        next(runner.run_frames(make_source()))
+
+
+def test_shared_memory_views_valid_until_next_result():
+    model = RiskFieldModel("fast")
+    source = make_source()
+    expected = direct_fields(model, source, source.frames())
+    with ParallelRiskRunner(model, n_workers=2, outputs=('field',), frames_per_task=2,
+                            max_inflight=2, shared_memory=True, copy_fields=False) as runner:
+        for result, F_total in zip(runner.run_frames(source), expected):
+            assert not result['field'].flags.writeable
+            np.testing.assert_array_equal(result['field'], F_total)
+
+
+def test_shared_memory_run_recordings():
+    model = RiskFieldModel("fast")
+    runner = ParallelRiskRunner(model, n_workers=1, outputs=('summary',), shared_memory=True)
+    plain = ParallelRiskRunner(model, n_workers=1, outputs=('summary',))
+    loader = HighDDataLoader(HIGHD_DIR)
+    assert list(runner.run_recordings(loader, [1])) == list(plain.run_recordings(loader, [1]))
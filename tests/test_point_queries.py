@@ -0,0 +1,56 @@
+"""
+任意坐标点风险值（risk_at_points）与轨迹风险（trajectory_risk）的测试
+"""
+
+import numpy as np
+
+from risk_field_model import RiskFieldModel
+
+VEHICLES = [[2, 20, 3.5, 15], [3, 45, 6, 18], [5, 70, 2, 20]]
+
+
+def grid_points(model, rows, cols):
+    return np.column_stack([model.X_en[rows, cols], model.Y_en[rows, cols]])
+
+
+def test_points_match_grid_values():
+    model = RiskFieldModel("fast")
+    F_total = model.calculate_scene_risk_field(VEHICLES, total_only=True)
+    rng = np.random.RandomState(0)
+    rows = rng.randint(0, model.X_en.shape[0], 200)
+    cols = rng.randint(0, model.X_en.shape[1], 200)
+    risk = model.risk_at_points(grid_points(model, rows, cols), VEHICLES)
+    np.testing.assert_allclose(risk, F_total[rows, cols], rtol=0, atol=1e-6 * F_total.max())
+
+
+def test_without_static_vehicles_matches_dynamic_layer():
+    model = RiskFieldModel("fast")
+    _, _, F_others, _ = model.calculate_scene_risk_field(VEHICLES)
+    rows, cols = np.nonzero(F_others > 1.0)
+    risk = model.risk_at_points(grid_points(model, rows, cols), VEHICLES,
+                                include_static=False, threshold=None)
+    np.testing.assert_allclose(risk, F_others[rows, cols], rtol=1e-9)
+
+
+def test_threshold_and_empty_scene():
+    model = RiskFieldModel("fast")
+    far = [[200.0, 50.0]]
+    assert model.risk_at_points(far, VEHICLES)[0] == 0
+    assert model.risk_at_points([[30.0, 4.0]], [], include_static=False).tolist() == [0.0]
+
+
+def test_trajectory_risk_integrates_point_risk():
+    model = RiskFieldModel("fast")
+    trajectories = np.stack([np.column_stack([np.linspace(0, 90, 31), np.full(31, y)])
+                             for y in (2.0, 5.5)])
+    integrated, peak, risk = model.trajectory_risk(trajectories, VEHICLES, dt=0.1)
+    assert risk.shape == (2, 31)
+    np.testing.assert_allclose(risk[1], model.risk_at_points(trajectories[1], VEHICLES))
+    np.testing.assert_allclose(integrated, 0.1 * np.trapezoid(risk, axis=1))
+    np.testing.assert_array_equal(peak, risk.max(axis=1))
+
+
+def test_single_trajectory_accepted():
+    model = RiskFieldModel("fast")
+    integrated, peak, risk = model.trajectory_risk([[10.0, 3.5]], VEHICLES)
+    assert risk.shape == (1, 1) and integrated.tolist() == [0.0]
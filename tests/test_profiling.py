@@ -0,0 +1,67 @@
+"""
+分阶段计时（StageProfiler、enable_profiling）的测试
+"""
+
+import pickle
+
+import numpy as np
+
+from profiling import StageProfiler
+from risk_field_model import RiskFieldModel
+
+VEHICLES = [[4, 6.5, 1.7, 17], [2, 20, 3.5, 15], [3, 45, 6, 18]]
+
+
+def test_mark_and_end_scene():
+    scenes = []
+    profiler = StageProfiler(callback=scenes.append)
+    start = profiler.now()
+    profiler.mark('a_calc', start, cells=10)
+    profiler.mark('a_calc', start, cells=5)
+    last = profiler.end_scene()
+
+    assert last['a_calc']['calls'] == 2
+    assert last['a_calc']['cells'] == 15
+    assert scenes == [last]
+    profiler.mark('z_calc', profiler.now())
+    profiler.end_scene()
+    assert profiler.scenes == 2
+    assert profiler.stats()['a_calc']['cells'] == 15
+    assert 'z_calc' in profiler.report()
+
+    profiler.reset()
+    assert profiler.scenes == 0 and profiler.stats() == {} and profiler.last_scene == {}
+
+
+def test_scene_records_stages():
+    model = RiskFieldModel("fast")
+    scenes = []
+    profiler = model.enable_profiling(callback=scenes.append)
+    model.calculate_scene_risk_field(VEHICLES)
+    model.calculate_scene_risk_field(VEHICLES)
+
+    assert profiler.scenes == 2 and len(scenes) == 2
+    stages = profiler.last_scene
+    for name in ('scene', 'scene.static_layers', 'scene.dynamic', 'scene.combine'):
+        assert name in stages
+    assert stages['scene']['calls'] == 1
+    assert stages['scene']['time'] >= stages['scene.dynamic']['time']
+    assert profiler.stats()['scene']['calls'] == 2
+
+
+def test_profiling_does_not_change_results():
+    model = RiskFieldModel("fast")
+    expected = model.calculate_scene_risk_field(VEHICLES)[0]
+    model.enable_profiling()
+    np.testing.assert_array_equal(model.calculate_scene_risk_field(VEHICLES)[0], expected)
+
+    profiler = model.disable_profiling()
+    assert model.profiler is None
+    model.calculate_scene_risk_field(VEHICLES)
+    assert profiler.scenes == 1
+
+
+def test_profiler_not_pickled():
+    model = RiskFieldModel("fast")
+    model.enable_profiling()
+    assert pickle.loads(pickle.dumps(model)).profiler is None
@@ -0,0 +1,58 @@
+"""
+滚动窗口（RollingWindowScene）的测试：与整条道路上windowed引擎的风险场逐位一致
+"""
+
+import numpy as np
+import pytest
+
+from risk_field_model import RiskFieldModel
+from rolling_window import RollingWindowScene
+
+ROAD_LENGTH = 200.0
+
+
+def make_frame(ego_x):
+    return [[1, ego_x, 2.0, 20], [2, ego_x + 12, 5.5, 15], [3, ego_x + 40, 2.0, 25], [4, 10, 5.5, 12]]
+
+
+@pytest.fixture(scope="module")
+def full_road():
+    model = RiskFieldModel("fast", engine="windowed")
+    model.X_length = ROAD_LENGTH
+    model.create_spatial_grid()
+    return model
+
+
+def check_window(scene, full_road, vehicles):
+    F_total = scene.update(vehicles)[0]
+    cols = slice(scene.col0, scene.col0 + scene.n_cols)
+    np.testing.assert_array_equal(scene.x_en, full_road.x_en[cols].astype(scene.x_en.dtype))
+    np.testing.assert_array_equal(F_total, full_road.calculate_scene_risk_field(vehicles)[0][:, cols])
+
+
+def test_window_matches_full_road_slice(full_road):
+    scene = RollingWindowScene(RiskFieldModel("fast", engine="windowed"), window_length=60.0,
+                               ego_id=1, road_length=ROAD_LENGTH)
+    # 向前滑动、原地、后退与超过窗口长度的跳跃
+    for ego_x in (30.0, 39.3, 48.6, 48.6, 44.0, 150.0, 195.0):
+        check_window(scene, full_road, make_frame(ego_x))
+    # 窗口不超出道路末端
+    assert scene.col0 + scene.n_cols == len(full_road.x_en)
+
+
+def test_only_new_columns_recomputed(full_road):
+    scene = RollingWindowScene(RiskFieldModel("fast", engine="windowed"), window_length=60.0,
+                               ego_id=1, road_length=ROAD_LENGTH)
+    scene.update(make_frame(60.0))
+    assert scene.last_stats['new_columns'] == scene.n_cols
+    scene.update(make_frame(62.0))
+    assert scene.last_stats['shift'] == 10
+    assert scene.last_stats['new_columns'] == 10
+    scene.update(make_frame(62.0))
+    assert scene.last_stats['new_columns'] == 0
+
+
+def test_missing_ego_rejected():
+    scene = RollingWindowScene(RiskFieldModel("fast"), ego_id=99)
+    with pytest.raises(ValueError):
+        scene.update(make_frame(30.0))
@@ -0,0 +1,52 @@
+"""
+直行车辆可分离闭式核（field_straight_separable）与圆弧核的误差测试
+"""
+
+import numpy as np
+import pytest
+
+from risk_field_model import RiskFieldModel
+
+VEHICLES = [[1, 40.03, 3.7, 20], [2, 20, 5, 14], [3, 60.017, 2.2, 31], [4, 50, 4, 80]]
+
+
+def vehicle_peak(model, speed):
+    speed = speed / 3.6 if speed > 50 else speed
+    return model.par1 * max(model.tla * speed, 1) ** 2
+
+
+@pytest.mark.parametrize("mode", ["fast", "balanced"])
+@pytest.mark.parametrize("vehicle", VEHICLES)
+def test_error_outside_saturation_band(mode, vehicle):
+    """车辆所在列前后 |dx| < 0.25 m 的条带之外误差不超过峰值的0.5%"""
+    model = RiskFieldModel(mode)
+    params = model.vehicle_param_array([vehicle])
+    error = np.abs(model.field_straight_separable(params) - model.field_batch(params))
+    error /= vehicle_peak(model, vehicle[3])
+    outside = np.abs(model.X_en - vehicle[1]) >= 0.25
+    assert error[outside].max() <= 5e-3
+
+
+def test_saturation_band_is_on_both_sides():
+    """条带内的差异来自原实现arccos饱和，车辆前后两侧都有"""
+    model = RiskFieldModel("balanced")
+    vehicle = [2, 20, 5, 14]
+    params = model.vehicle_param_array([vehicle])
+    error = np.abs(model.field_straight_separable(params) - model.field_batch(params))
+    dx = (model.X_en - vehicle[1])[error > 5e-3 * vehicle_peak(model, vehicle[3])]
+    assert dx.min() < 0 < dx.max()
+    assert np.abs(dx).max() < 0.25
+
+
+def test_separable_scene_matches_arc_scene_outside_band():
+    model = RiskFieldModel("fast")
+    vehicles = [[2, 20.1, 3.5, 15], [3, 45.1, 6, 18]]
+    arc = model.calculate_scene_risk_field(vehicles, total_only=True).copy()
+    model.straight_kernel = "separable"
+    separable = model.calculate_scene_risk_field(vehicles, total_only=True)
+    # 场景中所有直行车辆（含固定自车和转弯车辆的直行部分）所在列附近的条带
+    xs = [v[1] for v in vehicles] + [v[1] for group in model.scene_static_vehicles() for v in group]
+    band = np.zeros(model.X_en.shape, dtype=bool)
+    for x in xs:
+        band |= np.abs(model.X_en - x) < 0.25
+    np.testing.assert_allclose(separable[~band], arc[~band], rtol=0, atol=5e-3 * arc.max())
@@ -0,0 +1,54 @@
+"""
+稀疏风险场（SparseRiskField、calculate_sparse_risk_field）的测试
+"""
+
+import numpy as np
+
+from risk_field_model import RiskFieldModel
+from sparse_field import SparseRiskField
+
+VEHICLES = [[4, 6.5, 1.7, 17], [2, 20, 3.5, 15], [3, 45, 6, 18], [5, 70, 2, 20]]
+
+
+def test_sparse_matches_dense_windowed_field():
+    model = RiskFieldModel("balanced", engine="windowed")
+    F_total = model.calculate_scene_risk_field(VEHICLES)[0]
+    sparse = model.calculate_sparse_risk_field(VEHICLES)
+
+    assert sparse.shape == F_total.shape
+    dense = sparse.to_dense()
+    np.testing.assert_allclose(dense, F_total, rtol=1e-12, atol=1e-12)
+    assert sparse.nnz == np.count_nonzero(F_total)
+    assert sparse.max() == F_total.max()
+
+
+def test_sparse_field_without_vehicles_is_static_layer():
+    model = RiskFieldModel("fast", engine="windowed")
+    F_total = model.calculate_scene_risk_field([])[0]
+    np.testing.assert_allclose(model.calculate_sparse_risk_field([]).to_dense(), F_total,
+                               rtol=1e-12, atol=1e-12)
+
+
+def test_from_dense_round_trip():
+    rng = np.random.default_rng(0)
+    field = rng.random((6, 9))
+    field[field < 0.6] = 0
+    sparse = SparseRiskField.from_dense(field)
+
+    np.testing.assert_array_equal(sparse.to_dense(), field)
+    assert sparse.nnz == np.count_nonzero(field)
+    # 同一行中相邻的非零点合并为一个区间，区间数不超过点数
+    assert len(sparse.rows) <= sparse.nnz
+    cols, values = sparse.row(2)
+    np.testing.assert_array_equal(cols, np.flatnonzero(field[2]))
+    np.testing.assert_array_equal(values, field[2][cols])
+
+    indptr, indices, data = sparse.to_csr()
+    assert indptr[-1] == sparse.nnz
+    np.testing.assert_array_equal(data, field[field != 0])
+
+
+def test_from_dense_threshold():
+    field = np.array([[0.0, 0.0005, 0.002], [0.01, 0.0, 0.0009]])
+    sparse = SparseRiskField.from_dense(field, threshold=0.001)
+    np.testing.assert_array_equal(sparse.to_dense(), np.where(field >= 0.001, field, 0))
@@ -0,0 +1,48 @@
+"""
+固定自车与转弯车辆背景层缓存（static_risk_layers）的测试
+"""
+
+import numpy as np
+import pytest
+
+from risk_field_model import RiskFieldModel
+
+
+def test_layers_are_cached_and_read_only():
+    model = RiskFieldModel("fast")
+    F_ego, F_turn = model.static_risk_layers()
+    assert model.static_risk_layers()[0] is F_ego
+    with pytest.raises(ValueError):
+        F_ego[0, 0] = 1.0
+
+
+def test_layers_match_loop_engine():
+    model = RiskFieldModel("fast")
+    _, F_ego_ref, _, F_turn_ref = model.calculate_scene_risk_field([], engine="loop")
+    F_ego, F_turn = model.static_risk_layers()
+    np.testing.assert_allclose(F_ego, F_ego_ref, rtol=0, atol=1e-6 * F_ego_ref.max())
+    np.testing.assert_allclose(F_turn, F_turn_ref, rtol=0, atol=1e-6 * F_turn_ref.max())
+
+
+def test_parameter_change_invalidates_cache():
+    model = RiskFieldModel("fast")
+    before = model.static_risk_layers()[0]
+    model.tla = 3.0
+    after = model.static_risk_layers()[0]
+    assert after is not before
+    fresh = RiskFieldModel("fast")
+    fresh.tla = 3.0
+    np.testing.assert_array_equal(after, fresh.static_risk_layers()[0])
+
+
+def test_cache_disabled_recomputes():
+    model = RiskFieldModel("fast", cache_static=False)
+    assert model.static_risk_layers()[0] is not model.static_risk_layers()[0]
+
+
+def test_scene_results_do_not_modify_cache():
+    model = RiskFieldModel("fast")
+    F_ego = model.static_risk_layers()[0].copy()
+    F_total = model.calculate_scene_risk_field([[2, 20, 3.5, 15]], total_only=True)
+    F_total[...] = 0
+    np.testing.assert_array_equal(model.static_risk_layers()[0], F_ego)
@@ -0,0 +1,101 @@
+"""
+逐帧流式管线（RiskFieldPipeline）的测试
+"""
+
+import numpy as np
+import pytest
+
+from data_processor import DataProcessor
+from risk_field_model import RiskFieldModel
+from streaming_pipeline import RiskFieldPipeline, stream_risk_fields
+
+
+def make_source(n_frames=5):
+    rows = []
+    for frame in range(n_frames):
+        for vid, (x, y, speed) in enumerate([(15, 2.0, 54), (40, 5.5, 65), (70, 3.5, 72)]):
+            rows.append([vid, x + 0.8 * frame, y, 15, speed, 1.8, 4.5, 1, 0, 1, frame])
+    processor = DataProcessor()
+    processor.vehicle_data = np.array(rows)
+    return processor
+
+
+def test_field_and_summary_match_direct_calculation():
+    model = RiskFieldModel("fast")
+    source = make_source()
+    results = list(stream_risk_fields(model, source, outputs=('field', 'summary')))
+    assert [r['frame'] for r in results] == [0, 1, 2, 3, 4]
+    for result in results:
+        F_total = model.calculate_scene_risk_field(source.frame_vehicles(result['frame']),
+                                                  total_only=True)
+        np.testing.assert_array_equal(result['field'], F_total)
+        assert result['summary']['max'] == F_total.max()
+        assert result['summary']['nonzero'] == np.count_nonzero(F_total)
+
+
+def test_probes_and_sparse_outputs():
+    model = RiskFieldModel("fast")
+    source = make_source(2)
+    probes = [[20.0, 2.0], [50.0, 5.5]]
+    for result in stream_risk_fields(model, source, outputs=('probes', 'sparse'), probes=probes):
+        vehicles = source.frame_vehicles(result['frame'])
+        np.testing.assert_allclose(result['probes'], model.risk_at_points(probes, vehicles))
+        assert 'field' not in result
+        assert result['sparse'].shape == model.X_en.shape
+
+
+def test_prefetch_gives_same_results_and_stops_early():
+    model = RiskFieldModel("fast")
+    source = make_source()
+    direct = [r['summary'] for r in stream_risk_fields(model, source)]
+    prefetched = [r['summary'] for r in stream_risk_fields(model, source, max_pending=2)]
+    assert prefetched == direct
+
+    iterator = stream_risk_fields(model, source, max_pending=1)
+    assert next(iterator)['frame'] == 0
+    iterator.close()
+
+
+def test_frame_subset_and_run_count():
+    pipeline = RiskFieldPipeline(RiskFieldModel("fast"), make_source(), frames=[1, 3])
+    seen = []
+    assert pipeline.run(lambda result: seen.append(result['frame'])) == 2
+    assert seen == [1, 3]
+
+
+def test_invalid_outputs():
+    model = RiskFieldModel("fast")
+    with pytest.raises(ValueError):
+        RiskFieldPipeline(model, make_source(), outputs=('grid',))
+    with pytest.raises(ValueError):
+        RiskFieldPipeline(model, make_source(), outputs=('probes',))
+
+
+def test_summary_from_sparse_matches_dense_summary():
+    model = RiskFieldModel("fast", engine="windowed")
+    source = make_source(3)
+    dense = [r['summary'] for r in stream_risk_fields(model, source, outputs=('summary',))]
+    sparse = [r['summary'] for r in stream_risk_fields(model, source, outputs=('summary', 'sparse'))]
+    for a, b in zip(dense, sparse):
+        assert a['max'] == pytest.approx(b['max'], rel=1e-12)
+        assert a['mean'] == pytest.approx(b['mean'], rel=1e-12)
+        assert a['nonzero'] == b['nonzero']
+        assert a['argmax_xy'] == b['argmax_xy']
+
+
+def test_process_frame_into_out_allocates_no_grid():
+    import tracemalloc
+
+    model = RiskFieldModel("balanced")
+    pipeline = RiskFieldPipeline(model, make_source(2), outputs=('field',))
+    out = np.zeros_like(model.X_en)
+    pipeline.process_frame(0, out=out)
+
+    tracemalloc.start()
+    try:
+        result = pipeline.process_frame(1, out=out)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert result['field'] is out
+    assert peak < out.nbytes / 2
@@ -0,0 +1,33 @@
+"""
+tiled引擎（x方向分块、线程池并行）的测试
+"""
+
+import numpy as np
+import pytest
+
+from risk_field_model import RiskFieldModel
+
+VEHICLES = [[2, 20, 3.5, 15], [3, 45, 6, 18], [5, 70, 2, 20], [6, 98, 7.5, 30]]
+
+
+@pytest.mark.parametrize("n_threads, tile_size", [(1, None), (4, None), (3, 17)])
+def test_tiled_matches_batched(n_threads, tile_size):
+    model = RiskFieldModel("fast", n_threads=n_threads, tile_size=tile_size)
+    reference = model.calculate_scene_risk_field(VEHICLES, engine="batched")
+    result = model.calculate_scene_risk_field(VEHICLES, engine="tiled")
+    for F, F_ref in zip(result, reference):
+        np.testing.assert_allclose(F, F_ref, rtol=1e-12, atol=1e-9)
+
+
+def test_tiled_matches_loop():
+    model = RiskFieldModel("fast", engine="tiled", n_threads=2)
+    reference = model.calculate_scene_risk_field(VEHICLES, engine="loop")[0]
+    F_total = model.calculate_scene_risk_field(VEHICLES, total_only=True)
+    np.testing.assert_allclose(F_total, reference, rtol=0, atol=1e-6 * reference.max())
+
+
+def test_tile_columns_follow_budget():
+    model = RiskFieldModel("fast")
+    assert model._tile_columns() == model.tile_cell_budget // len(model.y_en)
+    model.tile_size = 10
+    assert model._tile_columns() == 10
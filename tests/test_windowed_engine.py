@@ -0,0 +1,36 @@
+"""
+windowed引擎（只在支撑包围盒内计算）的测试
+"""
+
+import numpy as np
+
+from risk_field_model import RiskFieldModel
+
+VEHICLES = [[2, 20, 3.5, 15], [3, 45, 6, 18], [5, 70, 2, 20], [6, 98, 7.5, 30]]
+
+
+def test_windowed_matches_loop():
+    model = RiskFieldModel("fast")
+    reference = model.calculate_scene_risk_field(VEHICLES, engine="loop")
+    result = model.calculate_scene_risk_field(VEHICLES, engine="windowed")
+    for F, F_ref in zip(result, reference):
+        # 每辆车在包围盒外被忽略的值小于window_tol
+        np.testing.assert_allclose(F, F_ref, rtol=0, atol=1e-5 * max(float(F_ref.max()), 1.0))
+
+
+def test_support_box_contains_field_above_tol():
+    model = RiskFieldModel("fast")
+    params = model.vehicle_param_array(VEHICLES)
+    for steering in (0.001, 5.0):
+        x_min, x_max, y_min, y_max = model.support_box(params, steering)
+        for i in range(len(params)):
+            F = model.field_batch(params[i:i + 1], steering_angle=steering)
+            inside = ((model.X_en >= x_min[i]) & (model.X_en <= x_max[i])
+                      & (model.Y_en >= y_min[i]) & (model.Y_en <= y_max[i]))
+            assert F[~inside].max(initial=0) < model.window_tol
+
+
+def test_vehicle_outside_grid_contributes_nothing():
+    model = RiskFieldModel("fast")
+    F = model.field_windowed(model.vehicle_param_array([[1, -500, 3, 20]]))
+    assert not F.any()
@@ -0,0 +1,50 @@
+"""
+核工作区（Workspace）的测试：稳态下每帧不再分配网格大小的临时数组
+"""
+
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from risk_field_model import RiskFieldModel
+from workspace import Workspace
+
+VEHICLES = [[4, 6.5, 1.7, 17], [2, 20, 3.5, 15], [3, 45, 6, 18], [5, 70, 2, 20]]
+
+
+def test_workspace_reuses_buffers():
+    ws = Workspace()
+    a = ws.array('z', (3, 5))
+    b = ws.array('z', (2, 7))
+    assert np.shares_memory(a, b)
+    ws.array('z', (5, 5))
+    assert ws.allocations == 2
+    assert ws.array('mask', (4,), bool).dtype == bool
+
+
+@pytest.mark.parametrize("engine", ["batched", "windowed", "tiled"])
+def test_steady_state_scene_allocates_no_grid_arrays(engine):
+    model = RiskFieldModel("balanced", engine=engine, n_threads=2)
+    out = np.zeros_like(model.X_en)
+    for _ in range(2):
+        model.calculate_scene_risk_field(VEHICLES, out=out, total_only=True)
+    allocations = model.workspace.allocations
+
+    tracemalloc.start()
+    try:
+        model.calculate_scene_risk_field(VEHICLES, out=out, total_only=True)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert model.workspace.allocations == allocations
+    # 只剩NumPy ufunc的固定大小迭代缓冲区，与网格大小无关
+    assert peak < model.X_en.nbytes / 2
+
+
+def test_workspace_result_matches_plain_kernel():
+    with_ws = RiskFieldModel("fast")
+    without = RiskFieldModel("fast", use_workspace=False)
+    for a, b in zip(with_ws.calculate_scene_risk_field(VEHICLES),
+                    without.calculate_scene_risk_field(VEHICLES)):
+        np.testing.assert_allclose(a, b, rtol=1e-12, atol=1e-9)
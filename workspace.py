@@ -0,0 +1,58 @@
+"""
+可复用的临时数组工作区 - 风险场核的中间结果写入预分配缓冲区
+Workspace for Risk Field Model
+
+风险场核由十几个逐元素运算组成，每个运算默认都会分配一个网格大小的临时数组。
+Workspace 按名称保存缓冲区，核的每一步都用 out= 写入其中；
+网格和批大小不变时，缓冲区在第一帧分配后一直复用，稳态下每帧不再分配网格大小的数组。
+"""
+
+import numpy as np
+
+
+class Workspace:
+    """
+    按名称缓存的临时数组池
+
+    - 每个名称对应一块一维缓冲区，array() 返回所需形状的视图
+    - 容量不足时才重新分配（按2的幂增长，只增不减），allocations 记录分配次数
+    - 同一名称的视图在下一次请求该名称前有效；不同线程需使用各自的Workspace
+    """
+
+    def __init__(self, dtype="float64"):
+        """
+        Parameters:
+        dtype: 默认的缓冲区类型（一般与模型的dtype一致）
+        """
+        self.dtype = np.dtype(dtype)
+        self._buffers = {}
+        self.allocations = 0
+
+    def array(self, name, shape, dtype=None):
+        """返回名称为name、形状为shape的缓冲区视图（内容未初始化）"""
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.dtype != dtype or buffer.size < size:
+            # 容量取不小于size的2的幂，窗口大小逐帧变化时只需少数几次重新分配
+            capacity = 1 << max(size - 1, 0).bit_length()
+            buffer = np.empty(capacity, dtype=dtype)
+            self._buffers[name] = buffer
+            self.allocations += 1
+        return buffer[:size].reshape(shape)
+
+    def clear(self):
+        """释放所有缓冲区"""
+        self._buffers.clear()
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def stats(self):
+        """返回缓冲区数量、总字节数和累计分配次数"""
+        return {
+            'buffers': len(self._buffers),
+            'nbytes': self.nbytes,
+            'allocations': self.allocations
+        }